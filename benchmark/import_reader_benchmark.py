@@ -0,0 +1,97 @@
+"""
+Compares lines per second read from an import file by the single-stream reader and the ranged reader:
+
+    python3 -m benchmark.import_reader_benchmark [line count]
+
+By default a generated file is read from moto's in-process fake S3, which shows the cost of realigning ranges and
+decompressing but none of the network parallelism or transfer saved, so the object sizes are printed alongside. Set
+BENCHMARK_BUCKET and BENCHMARK_KEY to read an existing object from real S3; a .gz or .zst key is read with the
+decompressing reader.
+"""
+import gzip
+import json
+import os
+import sys
+import time
+import uuid
+
+import boto3
+import zstandard
+from moto import mock_s3
+
+from src.ranged_reader import fetch_import_file_in_ranges, fetch_compressed_import_file, compression_of, \
+    DEFAULT_WORKERS
+from src.s3 import fetch_import_file
+
+DEFAULT_LINE_COUNT = 200000
+FAKE_BUCKET = 'benchmark-import-bucket'
+FAKE_KEY = 'benchmark/events.json'
+# Small enough that the generated file is split into several ranges
+FAKE_RANGE_SIZE = 1024 * 1024
+
+
+def generate_import_file(line_count):
+    lines = []
+    for _ in range(line_count):
+        event_id = str(uuid.uuid4())
+        lines.append(json.dumps({
+            '_id': {'$oid': event_id},
+            'document': {
+                'eventId': event_id,
+                'eventType': 'session_event',
+                'timestamp': '2018-02-10T12:00:00Z',
+                'originatingService': 'benchmark',
+                'sessionId': str(uuid.uuid4()),
+                'details': {'session_event_type': 'idp_authn_succeeded', 'pid': str(uuid.uuid4())}
+            }
+        }))
+    return '\n'.join(lines).encode()
+
+
+def time_reader(name, read_lines):
+    start = time.perf_counter()
+    line_count = sum(1 for _ in read_lines())
+    seconds = time.perf_counter() - start
+    print('{0}: {1} lines in {2:.2f}s, {3:.0f} lines/s'.format(name, line_count, seconds, line_count / seconds))
+
+
+def compare_readers(bucket, key, range_size):
+    compression = compression_of(key)
+    if compression:
+        time_reader(compression, lambda: fetch_compressed_import_file(bucket, key, compression))
+        return
+    time_reader('iter_lines', lambda: fetch_import_file(bucket, key))
+    time_reader('ranged, in order', lambda: fetch_import_file_in_ranges(bucket, key, range_size=range_size))
+    time_reader('ranged, out of order',
+                lambda: fetch_import_file_in_ranges(bucket, key, range_size=range_size, ordered=False))
+
+
+def main(line_count):
+    if 'BENCHMARK_BUCKET' in os.environ:
+        compare_readers(os.environ['BENCHMARK_BUCKET'], os.environ['BENCHMARK_KEY'],
+                        int(os.environ.get('BENCHMARK_RANGE_SIZE', 8 * 1024 * 1024)))
+        return
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-2')
+    with mock_s3():
+        s3_client = boto3.client('s3')
+        s3_client.create_bucket(Bucket=FAKE_BUCKET)
+        content = generate_import_file(line_count)
+        compressed = [
+            (FAKE_KEY + '.gz', gzip.compress(content)),
+            (FAKE_KEY + '.zst', zstandard.ZstdCompressor().compress(content)),
+        ]
+        s3_client.put_object(Bucket=FAKE_BUCKET, Key=FAKE_KEY, Body=content)
+        for key, body in compressed:
+            s3_client.put_object(Bucket=FAKE_BUCKET, Key=key, Body=body)
+
+        print('{0} workers, {1} byte ranges, {2} bytes uncompressed'.format(
+            DEFAULT_WORKERS, FAKE_RANGE_SIZE, len(content)))
+        compare_readers(FAKE_BUCKET, FAKE_KEY, FAKE_RANGE_SIZE)
+        for key, body in compressed:
+            print('{0} bytes ({1:.1%}) to transfer:'.format(len(body), len(body) / len(content)))
+            compare_readers(FAKE_BUCKET, key, FAKE_RANGE_SIZE)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LINE_COUNT)
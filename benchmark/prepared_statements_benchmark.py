@@ -0,0 +1,84 @@
+"""
+Compares the prepared and unprepared paths for the single-statement event writes that write_events_to_database
+executes, against the docker-compose database:
+
+    docker-compose run --rm --entrypoint "python3 -m benchmark.prepared_statements_benchmark" tests
+"""
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import psycopg2
+
+from src.database import RunInTransaction, INSERT_AUDIT_EVENT_IF_NEW, INSERT_AUDIT_AND_BILLING_EVENT_IF_NEW, \
+    INSERT_AUDIT_AND_FRAUD_EVENT_IF_NEW
+
+DEFAULT_DB_CONNECTION_STRING = "host='event-store' dbname='events' user='postgres'"
+DEFAULT_ROW_COUNT = 2000
+
+
+def audit_parameters(event_id):
+    return [event_id, 'session_event', datetime.now(), 'benchmark', 'benchmark-session',
+            json.dumps({'session_event_type': 'idp_authn_succeeded'})]
+
+
+def audit_and_billing_parameters(event_id):
+    return audit_parameters(event_id) + [
+        datetime.now(), 'benchmark-session', 'pid', 'request-id', 'idp-entity-id', 'LEVEL_2', 'LEVEL_2', 'LEVEL_2',
+        event_id, 'transaction-entity-id'
+    ]
+
+
+def audit_and_fraud_parameters(event_id):
+    return audit_parameters(event_id) + [
+        event_id, datetime.now(), 'benchmark-session', 'pid', 'request-id', 'idp-entity-id', 'fraud-event-id', 'AA01',
+        'transaction-entity-id'
+    ]
+
+
+def time_inserts(db_connection, statement, parameter_factory, row_count, prepared):
+    event_ids = [str(uuid.uuid4()) for _ in range(row_count)]
+    start = time.perf_counter()
+    for event_id in event_ids:
+        with RunInTransaction(db_connection) as cursor:
+            if prepared:
+                statement.execute(cursor, parameter_factory(event_id))
+            else:
+                statement.execute_unprepared(cursor, parameter_factory(event_id))
+    return time.perf_counter() - start
+
+
+def clean_up(db_connection):
+    with RunInTransaction(db_connection) as cursor:
+        cursor.execute("DELETE FROM billing.fraud_events WHERE session_id = 'benchmark-session'")
+        cursor.execute("DELETE FROM billing.billing_events WHERE session_id = 'benchmark-session'")
+        cursor.execute("DELETE FROM audit.audit_events WHERE session_id = 'benchmark-session'")
+
+
+def main(row_count):
+    db_connection = psycopg2.connect(os.environ.get('DB_CONNECTION_STRING', DEFAULT_DB_CONNECTION_STRING))
+    statements = [
+        (INSERT_AUDIT_EVENT_IF_NEW, audit_parameters),
+        (INSERT_AUDIT_AND_BILLING_EVENT_IF_NEW, audit_and_billing_parameters),
+        (INSERT_AUDIT_AND_FRAUD_EVENT_IF_NEW, audit_and_fraud_parameters),
+    ]
+    try:
+        for statement, parameter_factory in statements:
+            unprepared = time_inserts(db_connection, statement, parameter_factory, row_count, prepared=False)
+            prepared = time_inserts(db_connection, statement, parameter_factory, row_count, prepared=True)
+            print('{0}: unprepared {1:.0f} rows/s, prepared {2:.0f} rows/s ({3:+.1f}%)'.format(
+                statement.name,
+                row_count / unprepared,
+                row_count / prepared,
+                (unprepared / prepared - 1) * 100
+            ))
+    finally:
+        clean_up(db_connection)
+        db_connection.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROW_COUNT)
@@ -0,0 +1,201 @@
+"""
+An asyncio alternative to src.database, built on asyncpg, used by the import handler when DB_BACKEND is asyncpg.
+asyncpg prepares statements natively and pipelines executemany, so a batch of INSERTs is in flight on one connection
+instead of waiting a round trip per statement.
+"""
+import asyncio
+import time
+from logging import getLogger
+
+import asyncpg
+from psycopg2.extensions import parse_dsn
+
+from src.database import plan_event_write, event_write_outcome
+from src.event_write_outcome import EventWriteOutcome, AUDIT_EVENTS_TABLE, BILLING_EVENTS_TABLE, \
+    FRAUD_EVENTS_TABLE, FAILED, STORED
+from src.retry_policy import RetryPolicy, TRANSIENT_SQLSTATE_CLASSES, TRANSIENT_SQLSTATES, CONNECTION_SQLSTATES
+from src.transaction_metrics import get_transaction_metrics
+
+# executemany discards the counts each statement returns, so a batch finds the rows it inserted afterwards: those whose
+# xmin is the batch's own transaction. txid_current() carries an epoch that xmin does not.
+INSERTED_ROWS = """
+    SELECT '{audit}', event_id FROM {audit}
+    WHERE event_id = ANY($1::text[]) AND xmin::text::bigint = txid_current() % 4294967296
+    UNION ALL
+    SELECT '{billing}', event_id FROM {billing}
+    WHERE event_id = ANY($1::text[]) AND xmin::text::bigint = txid_current() % 4294967296
+    UNION ALL
+    SELECT '{fraud}', event_id FROM {fraud}
+    WHERE event_id = ANY($1::text[]) AND xmin::text::bigint = txid_current() % 4294967296
+""".format(audit=AUDIT_EVENTS_TABLE, billing=BILLING_EVENTS_TABLE, fraud=FRAUD_EVENTS_TABLE)
+
+
+async def create_db_connection(dsn, database_password):
+    # asyncpg does not understand libpq keyword/value connection strings, so pass the components individually
+    dsn_components = parse_dsn(dsn)
+    if 'dbname' in dsn_components:
+        dsn_components['database'] = dsn_components.pop('dbname')
+    if database_password:
+        dsn_components['password'] = database_password
+    return await asyncpg.connect(**dsn_components)
+
+
+def is_transient(error):
+    """
+    The asyncpg counterpart of src.retry_policy.is_transient.
+    """
+    if isinstance(error, (asyncpg.InterfaceError, ConnectionError)):
+        return True
+    if not isinstance(error, asyncpg.PostgresError):
+        return False
+    return error.sqlstate[:2] in TRANSIENT_SQLSTATE_CLASSES or error.sqlstate in TRANSIENT_SQLSTATES
+
+
+def needs_reconnect(error):
+    if not isinstance(error, asyncpg.PostgresError):
+        return True
+    return error.sqlstate[:2] in TRANSIENT_SQLSTATE_CLASSES or error.sqlstate in CONNECTION_SQLSTATES
+
+
+async def write_event_to_database(event, connection, metrics):
+    statement, parameters, derived_table, error = plan_event_write(event)
+    async with connection.transaction():
+        start = time.monotonic()
+        counts = await connection.fetchrow(statement.positional_sql, *parameters)
+        metrics.record_execute('write_event.' + statement.name, time.monotonic() - start, sum(counts))
+    return event_write_outcome(event, derived_table, error, counts)
+
+
+async def write_events_to_database(events, connection, metrics=None):
+    """
+    Pipelines a batch of events through one executemany per statement, in a single transaction. executemany does not
+    report per-row results, so stored tables are reported as STORED rather than INSERTED or DUPLICATE, and the rows
+    each statement inserted are found with INSERTED_ROWS before the commit. If the batch fails, each event is retried
+    in its own transaction so that only the bad rows fail. Statement and commit times are recorded in metrics as
+    InstrumentedTransaction records them for the psycopg2 backend.
+    """
+    metrics = metrics if metrics else get_transaction_metrics()
+    outcomes = []
+    rows_by_statement = {}
+    for event in events:
+        try:
+            statement, parameters, derived_table, error = plan_event_write(event)
+        except Exception as exception:
+            outcomes.append(EventWriteOutcome(event, {AUDIT_EVENTS_TABLE: FAILED}, exception))
+            continue
+
+        tables = {AUDIT_EVENTS_TABLE: STORED}
+        if derived_table:
+            tables[derived_table] = FAILED if error else STORED
+        outcomes.append(EventWriteOutcome(event, tables, error))
+        rows_by_statement.setdefault(statement, []).append((parameters, [(table, event.event_id) for table in tables]))
+
+    transaction = connection.transaction()
+    await transaction.start()
+    try:
+        execute_seconds = {}
+        for statement, rows in rows_by_statement.items():
+            start = time.monotonic()
+            await connection.executemany(statement.positional_sql, [parameters for parameters, _ in rows])
+            execute_seconds[statement] = time.monotonic() - start
+        inserted = await __inserted_rows(outcomes, connection, metrics)
+        for statement, rows in rows_by_statement.items():
+            statement_rows = set(table_row for _, table_rows in rows for table_row in table_rows)
+            metrics.record_execute('write_events.' + statement.name, execute_seconds[statement],
+                                   len(statement_rows & inserted))
+        start = time.monotonic()
+        await transaction.commit()
+        metrics.record_commit('write_events', time.monotonic() - start)
+    except (asyncpg.PostgresConnectionError, asyncpg.InterfaceError):
+        raise
+    except Exception:
+        await transaction.rollback()
+        metrics.record_rollback('write_events')
+        return [await __write_event_in_isolation(outcome, connection, metrics) for outcome in outcomes]
+
+    return outcomes
+
+
+async def __inserted_rows(outcomes, connection, metrics):
+    """
+    Returns the (table, event_id) of every row the current transaction inserted for the outcomes' events.
+    """
+    start = time.monotonic()
+    rows = await connection.fetch(INSERTED_ROWS, [outcome.event.event_id for outcome in outcomes])
+    metrics.record_execute('write_events.inserted_rows', time.monotonic() - start, len(rows))
+    return set((row[0], row[1]) for row in rows)
+
+
+async def __write_event_in_isolation(outcome, connection, metrics):
+    if outcome.tables.get(AUDIT_EVENTS_TABLE) == FAILED:
+        return outcome
+    try:
+        return await write_event_to_database(outcome.event, connection, metrics)
+    except (asyncpg.PostgresConnectionError, asyncpg.InterfaceError):
+        raise
+    except Exception as exception:
+        return EventWriteOutcome(outcome.event, {AUDIT_EVENTS_TABLE: FAILED}, exception)
+
+
+async def existing_event_ids(event_ids, connection):
+    if not event_ids:
+        return set()
+    rows = await connection.fetch('SELECT event_id FROM audit.audit_events WHERE event_id = ANY($1::text[])',
+                                  list(event_ids))
+    return set(row['event_id'] for row in rows)
+
+
+class AsyncEventWriter:
+    """
+    Lets synchronous handlers write batches of events through the asyncpg backend on a private event loop. Like
+    ConnectionPool.run, each operation is retried under a RetryPolicy if it fails with a transient error, on a new
+    connection if the old one has gone away, and counted in the shared TransactionMetrics.
+    """
+
+    def __init__(self, dsn, database_password, retry_policy=None):
+        self.__dsn = dsn
+        self.__database_password = database_password
+        self.__retry_policy = retry_policy if retry_policy else RetryPolicy(is_transient=is_transient)
+        self.__loop = asyncio.new_event_loop()
+        self.__connection = self.__connect()
+
+    def write_events(self, events):
+        return self.__run(lambda: write_events_to_database(events, self.__connection))
+
+    def existing_event_ids(self, event_ids):
+        return self.__run(lambda: existing_event_ids(event_ids, self.__connection))
+
+    def close(self):
+        self.__close_connection()
+        self.__loop.close()
+
+    def __run(self, operation, label='database'):
+        metrics = get_transaction_metrics()
+
+        def attempt(_):
+            metrics.record_attempt(label)
+            if self.__connection is None:
+                self.__connection = self.__connect()
+            return self.__loop.run_until_complete(operation())
+
+        def on_retry(error, delay):
+            metrics.record_retry(label)
+            reconnect = needs_reconnect(error)
+            if reconnect:
+                self.__close_connection()
+            getLogger('event-recorder').warning('Transient DB error ({0}) - retrying in {1:.2f}s{2}'.format(
+                str(error).strip(), delay, ' on a new connection' if reconnect else ''))
+
+        return self.__retry_policy.run(attempt, on_retry)
+
+    def __connect(self):
+        return self.__loop.run_until_complete(create_db_connection(self.__dsn, self.__database_password))
+
+    def __close_connection(self):
+        connection, self.__connection = self.__connection, None
+        if connection is None:
+            return
+        try:
+            self.__loop.run_until_complete(connection.close())
+        except Exception:
+            pass
@@ -0,0 +1,17 @@
+import threading
+
+import boto3
+
+__sessions = threading.local()
+
+
+def aws_client(service_name):
+    """
+    Creates a boto3 client from a session belonging to the calling thread. boto3.client uses the shared default
+    session, which is not thread safe, and files are imported on worker threads.
+    """
+    session = getattr(__sessions, 'session', None)
+    if session is None:
+        session = boto3.session.Session()
+        __sessions.session = session
+    return session.client(service_name)
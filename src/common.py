@@ -1,14 +1,70 @@
 import os
-import boto3
+import time
 
+from src.aws_client import aws_client
 from src.kms import decrypt
 from psycopg2.extensions import parse_dsn
 
+# RDS IAM auth tokens are valid for 15 minutes; refresh a minute early so a token is never used as it expires
+IAM_TOKEN_LIFETIME_SECONDS = 15 * 60
+IAM_TOKEN_REFRESH_MARGIN_SECONDS = 60
+
+# DB_BACKEND chooses the driver used to write events: the default psycopg2 backend or the asyncpg backend
+PSYCOPG2_BACKEND = 'psycopg2'
+ASYNCPG_BACKEND = 'asyncpg'
+
+__iam_tokens = {}
+
 
 def get_database_password(dsn):
     if 'ENCRYPTED_DATABASE_PASSWORD' in os.environ:
         # boto returns decrypted as b'bytes' so decode to convert to password string
         return decrypt(os.environ['ENCRYPTED_DATABASE_PASSWORD']).decode()
     else:
-        dsn_components = parse_dsn(dsn)
-        return boto3.client('rds').generate_db_auth_token(dsn_components['host'], 5432, dsn_components['user'])
+        return __get_iam_token(dsn)
+
+
+def get_database_backend():
+    backend = os.environ.get('DB_BACKEND', PSYCOPG2_BACKEND)
+    if backend not in [PSYCOPG2_BACKEND, ASYNCPG_BACKEND]:
+        raise ValueError('Unknown DB_BACKEND "{0}"'.format(backend))
+    return backend
+
+
+def is_set(flag, default=False):
+    """
+    Whether an environment variable or tag value turns a setting on, or default if it is not given.
+    """
+    if flag is None:
+        return default
+    return flag.lower() in ['true', '1', 'y', 'yes']
+
+
+def get_slow_statement_seconds():
+    if 'SLOW_STATEMENT_SECONDS' in os.environ:
+        return float(os.environ['SLOW_STATEMENT_SECONDS'])
+    return None
+
+
+def __get_iam_token(dsn):
+    # Tokens expire by the wall clock
+    now = time.time()
+    cached = __iam_tokens.get(dsn)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    dsn_components = parse_dsn(dsn)
+    token = aws_client('rds').generate_db_auth_token(dsn_components['host'], 5432, dsn_components['user'])
+    __iam_tokens[dsn] = (token, now + IAM_TOKEN_LIFETIME_SECONDS - IAM_TOKEN_REFRESH_MARGIN_SECONDS)
+    return token
+
+
+def forget_iam_token(dsn):
+    """
+    Drops dsn's cached IAM token, for when the database has rejected it before its expected expiry.
+    """
+    __iam_tokens.pop(dsn, None)
+
+
+def clear_iam_token_cache():
+    __iam_tokens.clear()
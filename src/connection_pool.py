@@ -0,0 +1,132 @@
+import threading
+import time
+from logging import getLogger
+
+from psycopg2 import OperationalError, InterfaceError
+
+from src.common import get_database_password, forget_iam_token
+from src.database import create_db_connection
+from src.retry_policy import RetryPolicy, needs_reconnect, is_authentication_failure
+from src.transaction_metrics import get_transaction_metrics
+
+# Connections idle for longer than this are checked with a trivial query before being handed out
+DEFAULT_IDLE_CHECK_SECONDS = 30
+
+__pools = {}
+__pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Hands each worker thread its own connection to the database, reconnecting (with a fresh password or IAM token)
+    whenever a connection has been closed, fails its idle health check or is lost during an operation.
+    """
+
+    def __init__(self, dsn, idle_check_seconds=DEFAULT_IDLE_CHECK_SECONDS, retry_policy=None):
+        self.__dsn = dsn
+        self.__idle_check_seconds = idle_check_seconds
+        self.__retry_policy = retry_policy if retry_policy else RetryPolicy()
+        self.__local = threading.local()
+        self.__connections = []
+        self.__lock = threading.Lock()
+
+    def get_connection(self):
+        connection = getattr(self.__local, 'connection', None)
+        if connection is None or connection.closed:
+            connection = self.reconnect()
+        elif self.__has_been_idle() and not self.__is_healthy(connection):
+            connection = self.reconnect()
+
+        self.__local.last_used = time.monotonic()
+        return connection
+
+    def reconnect(self):
+        self.__discard(getattr(self.__local, 'connection', None))
+        try:
+            connection = create_db_connection(self.__dsn, get_database_password(self.__dsn))
+        except OperationalError as error:
+            # So that a retry connects with a fresh token rather than the one just rejected
+            if is_authentication_failure(error):
+                forget_iam_token(self.__dsn)
+            raise
+        with self.__lock:
+            self.__connections.append(connection)
+        self.__local.connection = connection
+        self.__local.last_used = time.monotonic()
+        return connection
+
+    def run(self, operation, label='database'):
+        """
+        Calls operation with this thread's connection, retrying under the pool's RetryPolicy if it fails with a
+        transient error. The connection is replaced before retrying if the error means it has gone away. Attempts and
+        retries are counted under label in the shared TransactionMetrics.
+        """
+        metrics = get_transaction_metrics()
+        reconnect = [False]
+
+        def attempt(_):
+            metrics.record_attempt(label)
+            if reconnect[0]:
+                reconnect[0] = False
+                return operation(self.reconnect())
+            return operation(self.get_connection())
+
+        def on_retry(error, delay):
+            metrics.record_retry(label)
+            reconnect[0] = needs_reconnect(error)
+            getLogger('event-recorder').warning('Transient DB error ({0}) - retrying in {1:.2f}s{2}'.format(
+                str(error).strip(), delay, ' on a new connection' if reconnect[0] else ''))
+
+        return self.__retry_policy.run(attempt, on_retry)
+
+    def release(self):
+        """
+        Closes this thread's connection, for worker threads that will not be used again.
+        """
+        self.__discard(getattr(self.__local, 'connection', None))
+        self.__local.connection = None
+
+    def close_all(self):
+        with self.__lock:
+            connections, self.__connections = self.__connections, []
+        for connection in connections:
+            self.__close(connection)
+        self.__local = threading.local()
+
+    def __has_been_idle(self):
+        return time.monotonic() - self.__local.last_used > self.__idle_check_seconds
+
+    def __discard(self, connection):
+        if connection is None:
+            return
+        with self.__lock:
+            if connection in self.__connections:
+                self.__connections.remove(connection)
+        self.__close(connection)
+
+    @staticmethod
+    def __close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def __is_healthy(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+            return True
+        except (OperationalError, InterfaceError):
+            return False
+
+
+def get_connection_pool(dsn):
+    """
+    Pools are kept for the life of the process so that warm Lambda invocations reuse their connections.
+    """
+    with __pools_lock:
+        if dsn not in __pools:
+            __pools[dsn] = ConnectionPool(dsn)
+        return __pools[dsn]
@@ -1,11 +1,100 @@
+import io
 import json
+import time
 import psycopg2
+import psycopg2.extensions
+from collections import Counter
 from datetime import datetime
 
+from psycopg2 import OperationalError, InterfaceError
 from psycopg2._psycopg import IntegrityError
-from psycopg2.errorcodes import UNIQUE_VIOLATION
+from psycopg2.extras import execute_values
 from logging import getLogger
 
+from src.event_write_outcome import EventWriteOutcome, AUDIT_EVENTS_TABLE, BILLING_EVENTS_TABLE, \
+    FRAUD_EVENTS_TABLE, INSERTED, DUPLICATE, FAILED
+from src.prepared_statements import PreparedStatement
+from src.transaction_metrics import get_transaction_metrics
+
+# The single-statement event writes insert the audit row and any derived row in one round trip. The derived row
+# is inserted even when the audit row already exists, so that redelivering an event stored half-way by an older
+# writer fills in the missing row, and conflicts are reported as duplicates rather than raised.
+INSERT_AUDIT_EVENT_IF_NEW = PreparedStatement('insert_audit_event_if_new', """
+    WITH audit_row AS (
+        INSERT INTO audit.audit_events
+        (event_id, event_type, time_stamp, originating_service, session_id, details)
+        VALUES
+        (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT DO NOTHING
+        RETURNING event_id
+    )
+    SELECT (SELECT count(*) FROM audit_row);
+""")
+
+INSERT_AUDIT_AND_BILLING_EVENT_IF_NEW = PreparedStatement('insert_audit_and_billing_event_if_new', """
+    WITH audit_row AS (
+        INSERT INTO audit.audit_events
+        (event_id, event_type, time_stamp, originating_service, session_id, details)
+        VALUES
+        (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT DO NOTHING
+        RETURNING event_id
+    ), billing_row AS (
+        INSERT INTO billing.billing_events
+        (
+            time_stamp,
+            session_id,
+            hashed_persistent_id,
+            request_id,
+            idp_entity_id,
+            minimum_level_of_assurance,
+            preferred_level_of_assurance,
+            provided_level_of_assurance,
+            event_id,
+            transaction_entity_id
+        )
+        VALUES
+        (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT DO NOTHING
+        RETURNING event_id
+    )
+    SELECT (SELECT count(*) FROM audit_row), (SELECT count(*) FROM billing_row);
+""")
+
+INSERT_AUDIT_AND_FRAUD_EVENT_IF_NEW = PreparedStatement('insert_audit_and_fraud_event_if_new', """
+    WITH audit_row AS (
+        INSERT INTO audit.audit_events
+        (event_id, event_type, time_stamp, originating_service, session_id, details)
+        VALUES
+        (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT DO NOTHING
+        RETURNING event_id
+    ), fraud_row AS (
+        INSERT INTO billing.fraud_events
+        (
+            event_id,
+            time_stamp,
+            session_id,
+            hashed_persistent_id,
+            request_id,
+            entity_id,
+            fraud_event_id,
+            fraud_indicator,
+            transaction_entity_id
+        )
+        VALUES
+        (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT DO NOTHING
+        RETURNING event_id
+    )
+    SELECT (SELECT count(*) FROM audit_row), (SELECT count(*) FROM fraud_row);
+""")
+
+__DERIVED_EVENT_DESCRIPTIONS = {
+    BILLING_EVENTS_TABLE: 'a billing event',
+    FRAUD_EVENTS_TABLE: 'a fraud event',
+}
+
 
 def create_db_connection(dsn, database_password):
     if database_password:
@@ -28,129 +117,207 @@ class RunInTransaction:
             self.__connection.rollback()
 
 
-def write_audit_event_to_database(event, db_connection):
-    try:
-        with RunInTransaction(db_connection) as cursor:
-            cursor.execute("""
-                INSERT INTO audit.audit_events
-                (event_id, event_type, time_stamp, originating_service, session_id, details)
-                VALUES
-                (%s, %s, %s, %s, %s, %s);
-            """, [
-                event.event_id,
-                event.event_type,
-                datetime.fromtimestamp(int(event.timestamp) / 1e3),
-                event.originating_service,
-                event.session_id,
-                json.dumps(event.details)
-            ])
-    except IntegrityError as integrityError:
-        if integrityError.pgcode == UNIQUE_VIOLATION:
-            # The event has already been recorded - don't throw an exception (no need to retry this message), just
-            # log a notification and move on.
-            getLogger('event-recorder').warning(
-                'Failed to store an audit event. The Event ID {0} already exists in the database'.format(
-                    event.event_id))
-            return False
-        else:
-            raise integrityError
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """
+    Times each statement into the cursor's TransactionMetrics, labelled with the transaction label and the
+    statement's leading keyword, e.g. write_events.SAVEPOINT. A prepared statement is labelled with its name instead,
+    e.g. write_events.insert_audit_event_if_new, so that each one's latency can be told apart.
+    """
+    label = None
+    metrics = None
 
-    return True
+    def execute(self, query, vars=None):
+        start = time.monotonic()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self.metrics.record_execute(self.__statement_label(query), time.monotonic() - start, self.rowcount)
 
+    def copy_expert(self, sql, file, size=8192):
+        start = time.monotonic()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self.metrics.record_execute(self.__statement_label(sql), time.monotonic() - start, self.rowcount)
 
-def write_billing_event_to_database(event, db_connection):
-    try:
-        preferred_LOA = event.details['preferred_level_of_assurance'] if 'preferred_level_of_assurance' in event.details else None
+    def __statement_label(self, query):
+        if isinstance(query, bytes):
+            query = query[:32].decode(errors='replace')
+        words = str(query).split(None, 2)
+        keyword = words[0].upper() if words else ''
+        if keyword == 'EXECUTE' and len(words) > 1:
+            return '{}.{}'.format(self.label, words[1].split('(', 1)[0])
+        return '{}.{}'.format(self.label, keyword)
 
-        with RunInTransaction(db_connection) as cursor:
-            cursor.execute("""
-                INSERT INTO billing.billing_events
-                (
-                    time_stamp,
-                    session_id,
-                    hashed_persistent_id,
-                    request_id,
-                    idp_entity_id,
-                    minimum_level_of_assurance,
-                    preferred_level_of_assurance,
-                    provided_level_of_assurance,
-                    event_id,
-                    transaction_entity_id
-                )
-                VALUES
-                (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-            """, [
-                datetime.fromtimestamp(int(event.timestamp) / 1e3),
-                event.session_id,
-                event.details['pid'],
-                event.details['request_id'],
-                event.details['idp_entity_id'],
-                event.details['minimum_level_of_assurance'],
-                preferred_LOA,
-                event.details['provided_level_of_assurance'],
-                event.event_id,
-                event.details['transaction_entity_id']
-            ])
-    except KeyError as keyError:
-        getLogger('event-recorder').warning(
-            'Failed to store a billing event [Event ID {0}] due to key error'.format(event.event_id))
-        raise keyError
-    except IntegrityError as integrityError:
-        if integrityError.pgcode == UNIQUE_VIOLATION:
-            # The event has already been recorded - don't throw an exception (no need to retry this message), just
-            # log a notification and move on.
-            getLogger('event-recorder').warning(
-                'Failed to store a billing event. The Event ID {0} already exists in the database'.format(
-                    event.event_id))
+
+class InstrumentedTransaction:
+    """
+    A RunInTransaction that records statement times, commit time and rollbacks under label in a TransactionMetrics,
+    the shared one from get_transaction_metrics by default.
+    """
+
+    def __init__(self, connection, label, metrics=None):
+        self.__connection = connection
+        self.__label = label
+        self.__metrics = metrics if metrics else get_transaction_metrics()
+
+    def __enter__(self):
+        cursor = self.__connection.cursor(cursor_factory=InstrumentedCursor)
+        cursor.label = self.__label
+        cursor.metrics = self.__metrics
+        return cursor
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            start = time.monotonic()
+            self.__connection.commit()
+            self.__metrics.record_commit(self.__label, time.monotonic() - start)
         else:
-            getLogger('event-recorder').warning(
-                'Failed to store a billing event [Event ID {0}] due to integrity error'.format(event.event_id))
-            raise integrityError
+            self.__connection.rollback()
+            self.__metrics.record_rollback(self.__label)
+
+
+def is_billing_event(event):
+    return event.event_type == 'session_event' and event.details.get('session_event_type') == 'idp_authn_succeeded'
+
+
+def is_fraud_event(event):
+    return event.event_type == 'session_event' and event.details.get('session_event_type') == 'fraud_detected'
+
+
+def write_events_to_database(events, db_connection, synchronous_commit=True):
+    """
+    Stores a batch of events in one transaction. Each event is written inside its own savepoint so that a bad row
+    is rolled back and recorded in its outcome without aborting the rest of the batch.
+
+    With synchronous_commit=False the commit returns before the WAL is flushed to disk, so a database crash can lose
+    the batch after it has been reported as stored.
+    """
+    outcomes = []
+    with InstrumentedTransaction(db_connection, 'write_events') as cursor:
+        if not synchronous_commit:
+            cursor.execute('SET LOCAL synchronous_commit = off')
+        for event in events:
+            cursor.execute('SAVEPOINT event_write')
+            try:
+                outcome = insert_event(event, cursor)
+            except (OperationalError, InterfaceError):
+                raise
+            except Exception as exception:
+                cursor.execute('ROLLBACK TO SAVEPOINT event_write')
+                outcome = EventWriteOutcome(event, {AUDIT_EVENTS_TABLE: FAILED}, exception)
+            else:
+                cursor.execute('RELEASE SAVEPOINT event_write')
+            outcomes.append(outcome)
+    return outcomes
 
 
-def write_fraud_event_to_database(event, db_connection):
+def existing_event_ids(event_ids, db_connection):
+    """
+    Returns the subset of event_ids already stored in audit.audit_events, with one query for the whole list.
+    """
+    if not event_ids:
+        return set()
+    with RunInTransaction(db_connection) as cursor:
+        cursor.execute('SELECT event_id FROM audit.audit_events WHERE event_id = ANY(%s)', [list(event_ids)])
+        return set(row[0] for row in cursor.fetchall())
+
+
+def insert_event(event, cursor):
+    statement, parameters, derived_table, error = plan_event_write(event)
+    statement.execute(cursor, parameters)
+    return event_write_outcome(event, derived_table, error, cursor.fetchone())
+
+
+def plan_event_write(event):
+    """
+    Works out the single statement that stores an event, returning it with its parameters, the derived table it
+    writes to (if any) and any error that means the derived row cannot be written. In that case the plan falls back
+    to storing the audit row alone, as it is still worth keeping.
+    """
+    if is_billing_event(event):
+        derived_table, derived_statement, derived_parameters = \
+            BILLING_EVENTS_TABLE, INSERT_AUDIT_AND_BILLING_EVENT_IF_NEW, billing_event_parameters
+    elif is_fraud_event(event):
+        derived_table, derived_statement, derived_parameters = \
+            FRAUD_EVENTS_TABLE, INSERT_AUDIT_AND_FRAUD_EVENT_IF_NEW, fraud_event_parameters
+    else:
+        return INSERT_AUDIT_EVENT_IF_NEW, audit_event_parameters(event), None, None
+
     try:
-        with RunInTransaction(db_connection) as cursor:
-            cursor.execute("""
-                INSERT INTO billing.fraud_events
-                (
-                    event_id,
-                    time_stamp,
-                    session_id,
-                    hashed_persistent_id,
-                    request_id,
-                    entity_id,
-                    fraud_event_id,
-                    fraud_indicator,
-                    transaction_entity_id
-                )
-                VALUES
-                (%s, %s, %s, %s, %s, %s, %s, %s, %s);
-            """, [
-                event.event_id,
-                datetime.fromtimestamp(int(event.timestamp) / 1e3),
-                event.session_id,
-                event.details['pid'],
-                event.details['request_id'],
-                event.details['idp_entity_id'],
-                event.details['idp_fraud_event_id'],
-                event.details['gpg45_status'],
-                event.details['transaction_entity_id']
-            ])
+        return derived_statement, audit_event_parameters(event) + derived_parameters(event), derived_table, None
     except KeyError as keyError:
+        getLogger('event-recorder').warning('Failed to store {0} [Event ID {1}] due to key error'.format(
+            __DERIVED_EVENT_DESCRIPTIONS[derived_table], event.event_id))
+        return INSERT_AUDIT_EVENT_IF_NEW, audit_event_parameters(event), derived_table, keyError
+
+
+def event_write_outcome(event, derived_table, error, counts):
+    """
+    Builds the outcome of a planned event write from the row counts its statement returned.
+    """
+    tables = {AUDIT_EVENTS_TABLE: __inserted_or_duplicate(counts[0], event)}
+    if derived_table is None:
+        pass
+    elif error:
+        tables[derived_table] = FAILED
+    elif not counts[1]:
         getLogger('event-recorder').warning(
-            'Failed to store a fraud event [Event ID {0}] due to key error'.format(event.event_id))
-        raise keyError
-    except IntegrityError as integrityError:
-        if integrityError.pgcode == UNIQUE_VIOLATION:
-            # The event has already been recorded - don't throw an exception (no need to retry this message), just
-            # log a notification and move on.
-            getLogger('event-recorder').warning(
-                'Failed to store a fraud event. The Event ID {0} already exists in the database'.format(event.event_id))
-        else:
-            getLogger('event-recorder').warning(
-                'Failed to store a fraud event [Event ID {0}] due to integrity error'.format(event.event_id))
-            raise integrityError
+            'Failed to store {0}. The Event ID {1} already exists in the database'.format(
+                __DERIVED_EVENT_DESCRIPTIONS[derived_table], event.event_id))
+        tables[derived_table] = DUPLICATE
+    else:
+        tables[derived_table] = INSERTED
+    return EventWriteOutcome(event, tables, error)
+
+
+def __inserted_or_duplicate(count, event):
+    if count:
+        return INSERTED
+    getLogger('event-recorder').warning(
+        'Failed to store an audit event. The Event ID {0} already exists in the database'.format(event.event_id))
+    return DUPLICATE
+
+
+def audit_event_parameters(event):
+    return [
+        event.event_id,
+        event.event_type,
+        datetime.fromtimestamp(int(event.timestamp) / 1e3),
+        event.originating_service,
+        event.session_id,
+        json.dumps(event.details)
+    ]
+
+
+def billing_event_parameters(event):
+    preferred_LOA = event.details['preferred_level_of_assurance'] if 'preferred_level_of_assurance' in event.details else None
+    return [
+        datetime.fromtimestamp(int(event.timestamp) / 1e3),
+        event.session_id,
+        event.details['pid'],
+        event.details['request_id'],
+        event.details['idp_entity_id'],
+        event.details['minimum_level_of_assurance'],
+        preferred_LOA,
+        event.details['provided_level_of_assurance'],
+        event.event_id,
+        event.details['transaction_entity_id']
+    ]
+
+
+def fraud_event_parameters(event):
+    return [
+        event.event_id,
+        datetime.fromtimestamp(int(event.timestamp) / 1e3),
+        event.session_id,
+        event.details['pid'],
+        event.details['request_id'],
+        event.details['idp_entity_id'],
+        event.details['idp_fraud_event_id'],
+        event.details['gpg45_status'],
+        event.details['transaction_entity_id']
+    ]
 
 
 def write_import_session(upload_session, db_connection, logger):
@@ -197,7 +364,12 @@ def write_import_session(upload_session, db_connection, logger):
         raise integrityError
 
 
-def write_idp_fraud_event_to_database(upload_session, idp_fraud_event, cursor, logger):
+def write_idp_fraud_event_to_database(upload_session, idp_fraud_event, cursor, logger, contraindicator_rows=None):
+    """
+    Inserts an IDP fraud event, then upserts all of its contraindicator counts with a second, multi-row statement. If
+    contraindicator_rows is given, the counts are appended to it instead, to be written for a whole batch of events
+    with write_idp_fraud_event_contraindicators.
+    """
     try:
         cursor.execute("""
              INSERT INTO idp_data.idp_fraud_events
@@ -241,21 +413,11 @@ def write_idp_fraud_event_to_database(upload_session, idp_fraud_event, cursor, l
         result = cursor.fetchone()
         id = result[0]
 
-        for contra_indicator in idp_fraud_event.contra_indicators:
-            cursor.execute("""
-                INSERT INTO idp_data.idp_fraud_event_contraindicators
-                (
-                    idp_fraud_events_id,
-                    contraindicator_code
-                )
-                VALUES
-                (
-                    %s,
-                    %s
-                )
-                ON CONFLICT (idp_fraud_events_id, contraindicator_code)
-                DO UPDATE SET count = idp_fraud_event_contraindicators.count + 1
-            """, [id, contra_indicator])
+        rows = contraindicator_count_rows(id, idp_fraud_event)
+        if contraindicator_rows is None:
+            write_idp_fraud_event_contraindicators(rows, cursor)
+        else:
+            contraindicator_rows.extend(rows)
         return result[0]
 
     except KeyError as keyError:
@@ -271,6 +433,148 @@ def write_idp_fraud_event_to_database(upload_session, idp_fraud_event, cursor, l
         raise integrityError
 
 
+def contraindicator_count_rows(idp_fraud_events_id, idp_fraud_event):
+    counts = Counter(idp_fraud_event.contra_indicators)
+    return [(idp_fraud_events_id, code, count) for code, count in counts.items()]
+
+
+def write_idp_fraud_event_contraindicators(rows, cursor):
+    """
+    Upserts (idp_fraud_events_id, contraindicator_code, count) rows in a single statement, adding each count to any
+    existing one. Each (idp_fraud_events_id, contraindicator_code) pair may only appear once.
+    """
+    if not rows:
+        return
+    execute_values(cursor, """
+        INSERT INTO idp_data.idp_fraud_event_contraindicators
+        (
+            idp_fraud_events_id,
+            contraindicator_code,
+            count
+        )
+        VALUES %s
+        ON CONFLICT (idp_fraud_events_id, contraindicator_code)
+        DO UPDATE SET count = idp_fraud_event_contraindicators.count + EXCLUDED.count
+    """, rows, page_size=len(rows))
+
+
+def bulk_load_idp_fraud_events(upload_session, numbered_events, cursor):
+    """
+    Writes (row_number, IdpFraudEvent) pairs set-based: the events and their contraindicator counts are COPYed into
+    temporary staging tables, ids are drawn from the idp_fraud_events sequence in row order while staging, and both
+    tables are then filled with one INSERT ... SELECT each, joined on row_number. Must be run inside a transaction.
+    Returns the number of contraindicator count rows written.
+    """
+    cursor.execute("""
+        CREATE TEMPORARY TABLE idp_fraud_event_staging
+        (
+            row_number integer PRIMARY KEY,
+            id bigint NOT NULL DEFAULT nextval(pg_get_serial_sequence('idp_data.idp_fraud_events', 'id')),
+            idp_entity_id text,
+            idp_event_id text,
+            time_stamp timestamptz,
+            fid_code text,
+            request_id text,
+            pid text,
+            client_ip_address text,
+            contra_score integer
+        ) ON COMMIT DROP;
+
+        CREATE TEMPORARY TABLE idp_fraud_event_contraindicator_staging
+        (
+            row_number integer,
+            contraindicator_code text,
+            count integer
+        ) ON COMMIT DROP;
+    """)
+
+    events = io.StringIO()
+    contraindicators = io.StringIO()
+    contraindicator_count = 0
+    for row_number, idp_fraud_event in numbered_events:
+        __write_copy_row(events, [
+            row_number,
+            idp_fraud_event.idp_entity_id,
+            idp_fraud_event.idp_event_id,
+            idp_fraud_event.timestamp,
+            idp_fraud_event.fid_code,
+            idp_fraud_event.request_id,
+            idp_fraud_event.pid,
+            idp_fraud_event.client_ip_address,
+            idp_fraud_event.contra_score
+        ])
+        for _, code, count in contraindicator_count_rows(row_number, idp_fraud_event):
+            __write_copy_row(contraindicators, [row_number, code, count])
+            contraindicator_count += 1
+    events.seek(0)
+    contraindicators.seek(0)
+
+    cursor.copy_expert("""
+        COPY idp_fraud_event_staging
+        (
+            row_number,
+            idp_entity_id,
+            idp_event_id,
+            time_stamp,
+            fid_code,
+            request_id,
+            pid,
+            client_ip_address,
+            contra_score
+        )
+        FROM STDIN
+    """, events)
+    cursor.copy_expert("""
+        COPY idp_fraud_event_contraindicator_staging (row_number, contraindicator_code, count) FROM STDIN
+    """, contraindicators)
+
+    cursor.execute("""
+        INSERT INTO idp_data.idp_fraud_events
+        (
+            id,
+            idp_entity_id,
+            idp_event_id,
+            time_stamp,
+            fid_code,
+            request_id,
+            pid,
+            client_ip_address,
+            contra_score,
+            upload_session_id
+        )
+        SELECT id, idp_entity_id, idp_event_id, time_stamp, fid_code, request_id, pid, client_ip_address,
+               contra_score, %s
+          FROM idp_fraud_event_staging
+         ORDER BY row_number;
+
+        INSERT INTO idp_data.idp_fraud_event_contraindicators
+        (
+            idp_fraud_events_id,
+            contraindicator_code,
+            count
+        )
+        SELECT e.id, c.contraindicator_code, c.count
+          FROM idp_fraud_event_contraindicator_staging c
+         INNER JOIN idp_fraud_event_staging e ON e.row_number = c.row_number;
+    """, [upload_session.id])
+    return contraindicator_count
+
+
+def __write_copy_row(buffer, values):
+    buffer.write('\t'.join(__copy_value(value) for value in values))
+    buffer.write('\n')
+
+
+def __copy_value(value):
+    # COPY's text format: \N is NULL, and backslashes, tabs and line breaks inside a value must be escaped
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t') \
+        .replace('\n', '\\n').replace('\r', '\\r')
+
+
 def update_session_as_validated(upload_session, db_connection):
     with RunInTransaction(db_connection) as cursor:
         cursor.execute("""
@@ -280,9 +584,49 @@ def update_session_as_validated(upload_session, db_connection):
         """, [upload_session.id])
 
 
-def write_upload_error(upload_session, row, field, message, db_connection):
+def write_upload_summary(upload_session, summary, db_connection):
     with RunInTransaction(db_connection) as cursor:
         cursor.execute("""
+            UPDATE idp_data.upload_sessions
+               SET processing_summary = %s
+             WHERE id = %s
+        """, [json.dumps(summary), upload_session.id])
+
+
+def delete_upload_session_events(upload_session, db_connection):
+    with RunInTransaction(db_connection) as cursor:
+        cursor.execute("""
+            DELETE FROM idp_data.idp_fraud_event_contraindicators c
+             USING idp_data.idp_fraud_events e
+             WHERE c.idp_fraud_events_id = e.id
+               AND e.upload_session_id = %(session_id)s;
+
+            DELETE FROM idp_data.idp_fraud_events
+             WHERE upload_session_id = %(session_id)s;
+        """, {'session_id': upload_session.id})
+
+
+def stored_idp_event_ids(upload_session, db_connection):
+    """
+    Returns the event id of every IDP fraud event stored for the upload session, once for each time it is stored.
+    """
+    with RunInTransaction(db_connection) as cursor:
+        cursor.execute("""
+            SELECT idp_event_id
+              FROM idp_data.idp_fraud_events
+             WHERE upload_session_id = %s
+        """, [upload_session.id])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def write_upload_errors(rows, db_connection):
+    """
+    Writes (upload_session_id, row, field, message) rows in a single statement.
+    """
+    if not rows:
+        return
+    with RunInTransaction(db_connection) as cursor:
+        execute_values(cursor, """
             INSERT INTO idp_data.upload_session_validation_failures
             (
                 upload_session_id,
@@ -290,11 +634,5 @@ def write_upload_error(upload_session, row, field, message, db_connection):
                 field,
                 message
             )
-            VALUES
-            (
-                %s,
-                %s,
-                %s,
-                %s
-            )
-        """, [upload_session.id, row, field, message])
+            VALUES %s
+        """, rows, page_size=len(rows))
@@ -0,0 +1,98 @@
+from hashlib import blake2b
+from struct import Struct
+
+from src.idp_fraud_validation import COLUMN_COUNT
+
+# Repeated rows are written as they always have been
+OFF = 'off'
+# Every row repeating an earlier row's event id is a validation error
+REJECT = 'reject'
+# Rows identical to an earlier row are dropped; rows that only share its event id are still validation errors
+MERGE = 'merge'
+DUPLICATE_POLICIES = [OFF, REJECT, MERGE]
+
+EVENT_ID_FIELD = 'Event ID'
+# Unlikely to appear in a CSV field, so that rows only join to the same value if their fields are the same
+FIELD_SEPARATOR = '\x1f'
+# Bits in the filter that screens an upload's event ids for repeats: 16 MiB however large the upload, giving under 0.5%
+# false positives for ten million rows. Must be a power of two, up to 2 ** 32
+DEFAULT_FILTER_BITS = 2 ** 27
+FILTER_HASH_COUNT = 4
+FILTER_POSITIONS = Struct('<{}I'.format(FILTER_HASH_COUNT))
+
+
+class DuplicateRowError(ValueError):
+
+    def __init__(self, message, row_number):
+        super(DuplicateRowError, self).__init__(message)
+        self.row_number = row_number
+
+
+def repeated_event_ids(numbered_rows, filter_bits=DEFAULT_FILTER_BITS):
+    """
+    Returns every event id found on more than one of the (row_number, row) pairs, along with a few false positives,
+    from a Bloom filter of filter_bits bits. The filter stays the same size however many rows there are, so memory only
+    grows with the ids it returns, for a DuplicateDetector to check exactly.
+    """
+    seen = bytearray(filter_bits // 8)
+    position_mask = filter_bits - 1
+    repeated = set()
+    for _, row in numbered_rows:
+        if len(row) < COLUMN_COUNT:
+            continue
+        found = True
+        for position in FILTER_POSITIONS.unpack(blake2b(row[1].encode(), digest_size=FILTER_POSITIONS.size).digest()):
+            position &= position_mask
+            bit = 1 << (position & 7)
+            if not seen[position >> 3] & bit:
+                seen[position >> 3] |= bit
+                found = False
+        if found:
+            repeated.add(row[1])
+    return repeated
+
+
+class DuplicateDetector(object):
+    """
+    Spots rows of one upload that repeat an earlier row's event id in a single pass. Only a 64 bit digest of each
+    event id and row is kept, not the rows themselves. Given the repeated_event_ids of the upload, only rows with one of
+    those ids are tracked at all, so memory grows with the repeats rather than with the upload.
+    """
+
+    def __init__(self, policy=OFF, repeated_event_ids=None):
+        if policy not in DUPLICATE_POLICIES:
+            raise ValueError('Unknown duplicate policy "{0}"'.format(policy))
+        self.__policy = policy
+        self.__repeated_event_ids = repeated_event_ids
+        self.__first_seen = {}
+        self.merged_count = 0
+
+    def check(self, row_number, row):
+        """
+        Returns True to keep the row, or False to drop it as merged into an earlier one. Raises DuplicateRowError if
+        it repeats an earlier row's event id and cannot be merged.
+        """
+        if self.__policy == OFF or len(row) < COLUMN_COUNT:
+            return True
+        if self.__repeated_event_ids is not None and row[1] not in self.__repeated_event_ids:
+            return True
+
+        event_id_digest = self.__digest(row[1])
+        row_digest = self.__digest(FIELD_SEPARATOR.join(row))
+        first_seen = self.__first_seen.get(event_id_digest)
+        if first_seen is None:
+            self.__first_seen[event_id_digest] = (row_number, row_digest)
+            return True
+
+        first_row_number, first_row_digest = first_seen
+        if row_digest == first_row_digest:
+            if self.__policy == MERGE:
+                self.merged_count += 1
+                return False
+            raise DuplicateRowError('Row repeats line {}'.format(first_row_number), row_number)
+        raise DuplicateRowError('Event ID "{}" is also used on line {}'.format(row[1], first_row_number),
+                                row_number)
+
+    @staticmethod
+    def __digest(value):
+        return int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), 'big')
@@ -1,21 +1,24 @@
 import logging
 import os
+from functools import partial
 
-import boto3
-
-from src.common import get_database_password
-from src.database import create_db_connection, write_audit_event_to_database, \
-    write_billing_event_to_database, write_fraud_event_to_database
+from src.aws_client import aws_client
+from src.common import get_slow_statement_seconds
+from src.connection_pool import get_connection_pool
+from src.database import write_events_to_database
 from src.decryption import decrypt_message
 from src.event_mapper import event_from_json
+from src.event_write_outcome import AUDIT_EVENTS_TABLE, BILLING_EVENTS_TABLE, FRAUD_EVENTS_TABLE
 from src.kms import decrypt
 from src.s3 import fetch_decryption_key
-from src.sqs import fetch_single_message, delete_message
+from src.sqs import fetch_messages, delete_message
+from src.transaction_metrics import get_transaction_metrics
+from src.write_behind_buffer import WriteBehindBuffer, DEFAULT_MAX_SIZE, DEFAULT_MAX_AGE_SECONDS, DURABLE
 
 
 # noinspection PyUnusedLocal
 def store_queued_events(_, __):
-    sqs_client = boto3.client('sqs')
+    sqs_client = aws_client('sqs')
     queue_url = os.environ['QUEUE_URL']
 
     logger = logging.getLogger('event-recorder')
@@ -31,47 +34,73 @@ def store_queued_events(_, __):
     logger.info('Decrypted key successfully')
 
     dsn = os.environ['DB_CONNECTION_STRING']
+    metrics = get_transaction_metrics()
+    metrics.slow_statement_seconds = get_slow_statement_seconds()
 
-    db_connection = create_db_connection(dsn, get_database_password(dsn))
+    pool = get_connection_pool(dsn)
+    pool.get_connection()
     logger.info('Created connection to DB')
 
+    buffer = WriteBehindBuffer(
+        lambda events, synchronous_commit: pool.run(
+            lambda db_connection: write_events_to_database(events, db_connection, synchronous_commit)),
+        max_size=int(os.environ.get('WRITE_BUFFER_SIZE', DEFAULT_MAX_SIZE)),
+        max_age_seconds=float(os.environ.get('WRITE_BUFFER_MAX_AGE_SECONDS', DEFAULT_MAX_AGE_SECONDS)),
+        durability=os.environ.get('WRITE_DURABILITY', DURABLE)
+    )
+
     event_count = 0
     while True:
-        message = fetch_single_message(sqs_client, queue_url)
-        if message is None:
+        messages = fetch_messages(sqs_client, queue_url)
+        if not messages:
+            buffer.flush()
             logger.info('Queue is empty - finishing after {0} events'.format(event_count))
             break
 
-        event_count += 1
+        event_count += len(messages)
 
-        # noinspection PyBroadException
-        # catch all errors and log them - we never want a single failing message to kill the process.
-        event = None
-        try:
-            decrypted_message = decrypt_message(message['Body'], decryption_key)
-            event = event_from_json(decrypted_message)
+        for message in messages:
+            # noinspection PyBroadException
+            # catch all errors and log them - we never want a single failing message to kill the process.
+            try:
+                decrypted_message = decrypt_message(message['Body'], decryption_key)
+                event = event_from_json(decrypted_message)
 
-            # Send audit events to this lambda function's CloudWatch log group.
-            # This is the raw JSON event on a line by its self so Splunk can
-            # parse it as JSON.
-            print(decrypted_message)
+                # Send audit events to this lambda function's CloudWatch log group.
+                # This is the raw JSON event on a line by its self so Splunk can
+                # parse it as JSON.
+                print(decrypted_message)
 
-            logger.info('Decrypted event with ID: {0}'.format(event.event_id))
-            write_audit_event_to_database(event, db_connection)
-            logger.info('Stored audit event: {0}'.format(event.event_id))
-            if event.event_type == 'session_event' and event.details.get('session_event_type') == 'idp_authn_succeeded':
-                write_billing_event_to_database(event, db_connection)
-                logger.info('Stored billing event: {0}'.format(event.event_id))
-            if event.event_type == 'session_event' and event.details.get('session_event_type') == 'fraud_detected':
-                write_fraud_event_to_database(event, db_connection)
-                logger.info('Stored fraud event: {0}'.format(event.event_id))
-            delete_message(sqs_client, queue_url, message)
-            logger.info('Deleted event from queue with ID: {0}'.format(event.event_id))
-        except Exception:
-            if event:
-                logger.exception(
-                    'Failed to store event {0}, event type "{1}" from SQS message ID {2}'.format(event.event_id,
-                                                                                                 event.event_type,
-                                                                                                 message['MessageId']))
-            else:
+                logger.info('Decrypted event with ID: {0}'.format(event.event_id))
+            except Exception:
                 logger.exception('Failed to decrypt message, SQS ID = {0}'.format(message['MessageId']))
+                continue
+
+            # The message is only deleted from the queue once the flush containing its event has committed
+            buffer.add(event, partial(__record_outcome, sqs_client, queue_url, message, logger=logger))
+
+        buffer.flush_if_due()
+
+    metrics.log_summary()
+    metrics.clear()
+
+
+def __record_outcome(sqs_client, queue_url, message, outcome, logger):
+    event = outcome.event
+    # noinspection PyBroadException
+    try:
+        if outcome.stored(AUDIT_EVENTS_TABLE):
+            logger.info('Stored audit event: {0}'.format(event.event_id))
+        if outcome.stored(BILLING_EVENTS_TABLE):
+            logger.info('Stored billing event: {0}'.format(event.event_id))
+        if outcome.stored(FRAUD_EVENTS_TABLE):
+            logger.info('Stored fraud event: {0}'.format(event.event_id))
+        if not outcome.succeeded:
+            raise outcome.error
+        delete_message(sqs_client, queue_url, message)
+        logger.info('Deleted event from queue with ID: {0}'.format(event.event_id))
+    except Exception:
+        logger.exception(
+            'Failed to store event {0}, event type "{1}" from SQS message ID {2}'.format(event.event_id,
+                                                                                         event.event_type,
+                                                                                         message['MessageId']))
@@ -0,0 +1,23 @@
+AUDIT_EVENTS_TABLE = 'audit.audit_events'
+BILLING_EVENTS_TABLE = 'billing.billing_events'
+FRAUD_EVENTS_TABLE = 'billing.fraud_events'
+
+INSERTED = 'inserted'
+DUPLICATE = 'duplicate'
+# Inserted or already present - for writers that cannot tell which
+STORED = 'stored'
+FAILED = 'failed'
+
+
+class EventWriteOutcome(object):
+    def __init__(self, event, tables=None, error=None):
+        self.event = event
+        self.tables = tables if tables else {}
+        self.error = error
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+    def stored(self, table):
+        return self.tables.get(table) in [INSERTED, DUPLICATE, STORED]
@@ -0,0 +1,183 @@
+from itertools import islice
+
+from src.idp_fraud_event import IdpFraudEvent
+from src.idp_fraud_validation import COLUMN_COUNT
+from src.timestamp_parser import STRPTIME_FORMATS
+
+# The width of each strptime field when zero padded
+FIELD_WIDTHS = {'%Y': 4, '%m': 2, '%d': 2, '%H': 2, '%M': 2, '%S': 2}
+SECONDS_IN = {'%d': 86400, '%H': 3600, '%M': 60, '%S': 1}
+
+
+def parse_columns(rows, idp_entity_id, timestamp_parser):
+    """
+    Parses a whole upload's rows a column at a time with NumPy: zero padded timestamps in the upload's strptime format
+    are converted for the whole column at once, any others are parsed once for each distinct value, and
+    contraindicators are split once for each distinct value. Returns, for each row, the IdpFraudEvent parse_line would
+    build for it or the exception parse_line would raise, or None for a row with fewer than COLUMN_COUNT fields, which
+    is not parsed. timestamp_parser sees the timestamps of the other rows as if parse_line had been called for each in
+    turn.
+    """
+    # Only needed for columnar parsing
+    import numpy
+
+    results = [None] * len(rows)
+    positions = [position for position, row in enumerate(rows) if len(row) >= COLUMN_COUNT]
+    full_rows = [rows[position] for position in positions]
+    if not full_rows:
+        return results
+
+    (time_stamps, idp_event_ids, fid_codes, contra_indicators, contra_scores, request_ids, client_ip_addresses,
+     pids) = islice(zip(*full_rows), COLUMN_COUNT)
+    parsed_time_stamps = __parse_time_stamps(numpy, time_stamps, timestamp_parser)
+    split_contra_indicators = __split_contra_indicators(numpy, contra_indicators)
+    defaulted_contra_scores = __default_contra_scores(numpy, contra_scores)
+
+    for position, timestamp, idp_event_id, fid_code, contra_indicator_list, contra_score, request_id, \
+            client_ip_address, pid in zip(positions, parsed_time_stamps, idp_event_ids, fid_codes,
+                                          split_contra_indicators, defaulted_contra_scores, request_ids,
+                                          client_ip_addresses, pids):
+        if isinstance(timestamp, Exception):
+            results[position] = timestamp
+            continue
+        results[position] = IdpFraudEvent(
+            idp_entity_id=idp_entity_id,
+            timestamp=timestamp,
+            idp_event_id=idp_event_id,
+            fid_code=fid_code,
+            contra_indicators=contra_indicator_list,
+            contra_score=contra_score,
+            request_id=request_id,
+            client_ip_address=client_ip_address,
+            pid=pid
+        )
+    return results
+
+
+def __parse_or_exception(parse, *args):
+    try:
+        return parse(*args)
+    except Exception as exception:
+        return exception
+
+
+def __parse_time_stamps(numpy, time_stamps, timestamp_parser):
+    # The parser chooses the upload's format from its first values, which must be seen in file order and with repeats
+    detected = []
+    for value in time_stamps:
+        if timestamp_parser.format is not None:
+            break
+        detected.append(__parse_or_exception(timestamp_parser.parse, value))
+    if len(detected) == len(time_stamps):
+        return detected
+
+    distinct, first_positions, inverse, counts = numpy.unique(
+        numpy.array(time_stamps[len(detected):], dtype=str), return_index=True, return_inverse=True,
+        return_counts=True)
+    parsed, converted = __convert_strptime_column(numpy, distinct, timestamp_parser.format)
+    timestamp_parser.parsed_count += int(counts[converted].sum())
+    for index in numpy.argsort(first_positions, kind='stable'):
+        if not converted[index]:
+            parsed[index] = __parse_or_exception(timestamp_parser.parse_repeated, str(distinct[index]),
+                                                 int(counts[index]))
+    return detected + parsed[inverse.ravel()].tolist()
+
+
+def __convert_strptime_column(numpy, values, timestamp_format):
+    """
+    Converts the values the upload's strptime format parses when zero padded, trying its formats in order as the
+    parser does. Returns an object array of the datetimes, and a mask of the values converted.
+    """
+    parsed = numpy.empty(len(values), dtype=object)
+    converted = numpy.zeros(len(values), dtype=bool)
+    date_formats = next((formats for formats in STRPTIME_FORMATS if ' or '.join(formats) == timestamp_format), None)
+    if date_formats is None:
+        return parsed, converted
+
+    literals, fields = __layout(date_formats[0])
+    width = len(literals) + sum(FIELD_WIDTHS[directive] for directive in fields)
+    candidates = numpy.flatnonzero(numpy.char.str_len(values) == width)
+    if not len(candidates):
+        return parsed, converted
+    codes = values[candidates].astype('<U{}'.format(width)).view(numpy.uint32).reshape(-1, width).astype(numpy.int64)
+    digits = codes - ord('0')
+    padded = numpy.ones(len(candidates), dtype=bool)
+    for index, character in literals.items():
+        padded &= codes[:, index] == ord(character)
+    for index in set(range(width)) - set(literals):
+        padded &= (digits[:, index] >= 0) & (digits[:, index] <= 9)
+
+    for date_format in date_formats:
+        field_values = {
+            directive: __field_value(digits, start, FIELD_WIDTHS[directive])
+            for directive, start in __layout(date_format)[1].items()
+        }
+        matches, seconds = __valid_date_times(numpy, field_values)
+        matches &= padded & ~converted[candidates]
+        parsed[candidates[matches]] = seconds[matches].astype(object)
+        converted[candidates[matches]] = True
+    return parsed, converted
+
+
+def __layout(date_format):
+    """
+    Returns the literal characters of a zero padded value of date_format by position, and the start of each field.
+    """
+    literals = {}
+    fields = {}
+    position = 0
+    index = 0
+    while index < len(date_format):
+        directive = date_format[index:index + 2]
+        if directive in FIELD_WIDTHS:
+            fields[directive] = position
+            position += FIELD_WIDTHS[directive]
+            index += 2
+        else:
+            literals[position] = date_format[index]
+            position += 1
+            index += 1
+    return literals, fields
+
+
+def __field_value(digits, start, width):
+    value = digits[:, start]
+    for index in range(start + 1, start + width):
+        value = value * 10 + digits[:, index]
+    return value
+
+
+def __valid_date_times(numpy, field_values):
+    """
+    Returns a mask of the fields strptime accepts and datetime can hold, and the datetime64 they give.
+    """
+    year = field_values['%Y']
+    month = field_values['%m']
+    day = field_values['%d']
+    hour = field_values.get('%H', numpy.zeros_like(year))
+    minute = field_values.get('%M', numpy.zeros_like(year))
+    second = field_values.get('%S', numpy.zeros_like(year))
+
+    month_start = ((year.clip(1, 9999) - 1970) * 12 + month.clip(1, 12) - 1).astype('datetime64[M]')
+    days_in_month = ((month_start + 1).astype('datetime64[D]') - month_start.astype('datetime64[D]')).astype(int)
+    valid = ((year >= 1) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= days_in_month) & (hour <= 23)
+             & (minute <= 59) & (second <= 59))
+    offsets = ((day - 1) * SECONDS_IN['%d'] + hour * SECONDS_IN['%H'] + minute * SECONDS_IN['%M']
+               + second * SECONDS_IN['%S'])
+    return valid, month_start.astype('datetime64[s]') + offsets.astype('timedelta64[s]')
+
+
+def __split_contra_indicators(numpy, contra_indicators):
+    # As CONTRA_INDICATOR_SEPARATOR splits them, on commas and line breaks; uploads repeat a few combinations
+    distinct, inverse = numpy.unique(numpy.array(contra_indicators, dtype=str), return_inverse=True)
+    split = [
+        value.replace('\r\n', ',').replace('\n', ',').split(',') if value.strip() else []
+        for value in distinct.tolist()
+    ]
+    return [list(split[index]) for index in inverse.ravel().tolist()]
+
+
+def __default_contra_scores(numpy, contra_scores):
+    defaulted = numpy.array(contra_scores, dtype=object)
+    defaulted[numpy.char.strip(numpy.array(contra_scores, dtype=str)) == ''] = 0
+    return defaulted.tolist()
@@ -1,26 +1,101 @@
 import csv
+import io
 import logging
 import os
 import re
+from collections import Counter
+from copy import copy
+from functools import partial
+from itertools import islice
 
 import dateparser
+from psycopg2 import OperationalError, InterfaceError
 
-from src.common import get_database_password
-from src.database import create_db_connection, write_import_session, write_idp_fraud_event_to_database, \
-    update_session_as_validated, write_upload_error, RunInTransaction
+from src.common import get_slow_statement_seconds, is_set
+from src.connection_pool import get_connection_pool
+from src.database import write_import_session, write_idp_fraud_event_to_database, \
+    update_session_as_validated, InstrumentedTransaction, write_idp_fraud_event_contraindicators, \
+    bulk_load_idp_fraud_events, write_upload_summary, delete_upload_session_events, stored_idp_event_ids
+from src.duplicate_detector import DuplicateDetector, DuplicateRowError, EVENT_ID_FIELD, OFF, DUPLICATE_POLICIES, \
+    repeated_event_ids
+from src.idp_fraud_columns import parse_columns
 from src.idp_fraud_event import IdpFraudEvent
-from src.s3 import fetch_object_tags, move_file, download_import_file
+from src.idp_fraud_validation import validate_rows, validate_parsed_rows, COLUMN_COUNT
+from src.import_checkpoint import is_checkpoint, load_checkpoint, save_checkpoint, clear_checkpoint
+from src.parallel_parser import parse_in_processes
+from src.s3 import fetch_object_tags, fetch_object_metadata, move_file, download_import_file, open_import_file, \
+    read_import_file
+from src.timestamp_parser import TimestampParser
+from src.transaction_metrics import get_transaction_metrics
+from src.upload_progress import UploadProgress, DEFAULT_LOG_INTERVAL_SECONDS
 from src.upload_session import UploadSession
+from src.validation_error_collector import ValidationErrorCollector, DEFAULT_MAX_ERRORS
 
 SUCCESS_FOLDER = 'success'
 ERROR_FOLDER = 'error'
 DEFAULT_TIMEZONE = 'Europe/London'
 DEFAULT_HAS_HEADER = True
 DEFAULT_DIALECT = 'excel'
+CONTRA_INDICATOR_SEPARATOR = re.compile(',|\n|\r\n')
+# Contraindicator counts are upserted together once this many have built up, rather than one statement each
+CONTRAINDICATOR_BATCH_SIZE = 500
+# IDP_FRAUD_BULK_LOAD turns on writing each file with one set-based load instead of row by row
+DEFAULT_BULK_LOAD = False
+# IDP_FRAUD_STREAM_UPLOAD turns on parsing uploads as they stream from S3 instead of from a downloaded copy in /tmp
+DEFAULT_STREAM_UPLOAD = False
+# Streamed uploads up to this size are read into memory once, rather than streamed again for each pass over the rows
+DEFAULT_IN_MEMORY_MAX_BYTES = 8 * 1024 * 1024
+# IDP_FRAUD_VALIDATE_ALL turns on checking every row, and reporting every failure, before anything is written
+DEFAULT_VALIDATE_ALL = False
+# Processes parsing rows for validation and bulk loading; 1 parses them in the handler's own process
+DEFAULT_PARSE_WORKERS = 1
+# IDP_FRAUD_COLUMNAR_PARSE turns on parsing whole uploads for validation and bulk loading a column at a time with NumPy
+DEFAULT_COLUMNAR_PARSE = False
+# IDP_FRAUD_STORE_SUMMARY turns on storing each upload's counts and timings on its upload_sessions row
+DEFAULT_STORE_SUMMARY = False
+# IDP_FRAUD_CHUNK_ROWS commits every this many rows, so that a retried upload resumes after the last commit; 0 writes
+# each upload in one transaction
+DEFAULT_CHUNK_ROWS = 0
+# IDP_FRAUD_DUPLICATE_POLICY is one of off, reject or merge - see src.duplicate_detector
+DEFAULT_DUPLICATE_POLICY = OFF
 logger = logging.getLogger('idp_fraud_data_handler')
 logger.setLevel(logging.INFO)
 
 
+class UploadOptions(object):
+    """
+    How process_file reads, checks and writes an upload: the handler's environment settings, and the CSV format and
+    timezone from the upload's tags.
+    """
+
+    def __init__(self, has_header=DEFAULT_HAS_HEADER, dialect=DEFAULT_DIALECT, timezone=DEFAULT_TIMEZONE,
+                 bulk_load=DEFAULT_BULK_LOAD, max_validation_errors=DEFAULT_MAX_ERRORS,
+                 stream_upload=DEFAULT_STREAM_UPLOAD, validate_all=DEFAULT_VALIDATE_ALL,
+                 parse_workers=DEFAULT_PARSE_WORKERS, progress_interval_seconds=DEFAULT_LOG_INTERVAL_SECONDS,
+                 store_summary=DEFAULT_STORE_SUMMARY, chunk_rows=DEFAULT_CHUNK_ROWS,
+                 duplicate_policy=DEFAULT_DUPLICATE_POLICY, columnar_parse=DEFAULT_COLUMNAR_PARSE):
+        self.has_header = has_header
+        self.dialect = dialect
+        self.timezone = timezone
+        self.bulk_load = bulk_load
+        self.max_validation_errors = max_validation_errors
+        self.stream_upload = stream_upload
+        self.validate_all = validate_all
+        self.parse_workers = parse_workers
+        self.progress_interval_seconds = progress_interval_seconds
+        self.store_summary = store_summary
+        self.chunk_rows = chunk_rows
+        self.duplicate_policy = duplicate_policy
+        self.columnar_parse = columnar_parse
+
+    def with_tags(self, tags):
+        options = copy(self)
+        options.timezone = tags.get('timezone', self.timezone)
+        options.dialect = tags.get('dialect', self.dialect)
+        options.has_header = is_set(tags.get('has_header'), self.has_header)
+        return options
+
+
 def create_import_session(filename, idp_entity_id, userid, db_connection):
     upload_session = UploadSession(
         source_file_name=filename,
@@ -30,51 +105,468 @@ def create_import_session(filename, idp_entity_id, userid, db_connection):
     return write_import_session(upload_session, db_connection, logger)
 
 
-def process_file(bucket, filename, upload_session, db_connection,
-                 has_header=DEFAULT_HAS_HEADER, dialect=DEFAULT_DIALECT, timezone=DEFAULT_TIMEZONE):
+def process_file(bucket, filename, upload_session, run, options=None, resume=False):
+    """
+    Each transaction is passed to run, as ConnectionPool.run, so that a transient error retries only that transaction.
+
+    With options.chunk_rows, rows are committed chunk_rows at a time. With resume, the rows already stored for
+    upload_session by an earlier attempt are skipped.
+
+    options.duplicate_policy decides what happens to rows repeating an earlier row's event id, before any reach the
+    database.
+    """
+    options = options if options else UploadOptions()
     logger.info('Processing data for IDP {}'.format(upload_session.idp_entity_id))
 
-    temp_file = download_import_file(bucket, filename)
+    validation_errors = ValidationErrorCollector(upload_session, options.max_validation_errors)
+    timestamps = TimestampParser(options.timezone)
+    progress = UploadProgress(upload_session, logger, options.progress_interval_seconds)
+    temp_file = None
+    if options.stream_upload:
+        open_upload = __open_streamed_upload(bucket, filename)
+    else:
+        temp_file = download_import_file(bucket, filename)
+        open_upload = partial(open, temp_file, 'rb')
     try:
-        with open(temp_file, newline='') as csvfile:
-            reader = csv.reader(csvfile, dialect=dialect)
-            errors_occurred = False
-            skip_row = has_header
-            row_number = 0
-            try:
-                with RunInTransaction(db_connection) as cursor:
-                    for row in reader:
-                        row_number = row_number + 1
-                        if skip_row:
-                            skip_row = False
-                            continue
-
-                        idp_fraud_event = parse_line(row, upload_session.idp_entity_id, timezone)
-                        id = write_idp_fraud_event_to_database(upload_session, idp_fraud_event, cursor, logger)
-                        if id:
-                            logger.info(
-                                'Successfully wrote IDP fraud event ID {} to database.'.format(idp_fraud_event.idp_event_id)
-                            )
-
-            except Exception as exception:
-                message = 'Failed to store IDP fraud event: {} (line {})'.format(exception, row_number)
-                logger.exception(message)
-                write_upload_error(upload_session, row_number, '**Row Exception**', message, db_connection)
-                errors_occurred = True
-
+        succeeded = __process_rows(open_upload, upload_session, run, validation_errors, timestamps, progress, options,
+                                   resume, __duplicate_detectors(open_upload, options))
     finally:
-        os.remove(temp_file)
+        if temp_file:
+            os.remove(temp_file)
+
+    progress.log_summary()
+    if options.store_summary:
+        run(lambda db_connection: write_upload_summary(upload_session, progress.summary, db_connection))
+
+    if timestamps.fallback_count:
+        logger.info('Parsed {} of {} timestamps with dateparser as they did not match the format "{}"'.format(
+            timestamps.fallback_count, timestamps.parsed_count, timestamps.format or 'none detected'))
+    run(validation_errors.write)
+    return succeeded
+
+
+def __open_streamed_upload(bucket, filename):
+    """
+    Returns a function that opens the upload for one pass over its rows.
+    """
+    size = fetch_object_metadata(bucket, filename)['ContentLength']
+    if size <= int(os.environ.get('IDP_FRAUD_IN_MEMORY_MAX_BYTES', DEFAULT_IN_MEMORY_MAX_BYTES)):
+        return partial(io.BytesIO, read_import_file(bucket, filename))
+    return partial(open_import_file, bucket, filename)
+
+
+def __process_rows(open_upload, upload_session, run, validation_errors, timestamps, progress, options, resume,
+                   new_duplicates):
+    if options.chunk_rows:
+        return __process_rows_in_chunks(open_upload, upload_session, run, validation_errors, timestamps, progress,
+                                        options, resume, new_duplicates)
+
+    if options.validate_all:
+        start = progress.clock()
+        numbered_events = __validate_file(open_upload, upload_session, validation_errors, timestamps, options,
+                                          new_duplicates)
+        progress.parsed(len(numbered_events or []), start)
+        if numbered_events is None:
+            return False
+        if options.bulk_load and __bulk_load(numbered_events, upload_session, run, progress):
+            return True
+        return __write_row_by_row(partial(iter, numbered_events), None, upload_session, run, validation_errors,
+                                  progress)
+
+    if options.bulk_load:
+        start = progress.clock()
+        numbered_events = None
+        if options.columnar_parse:
+            numbered_events = __parse_file_in_columns(open_upload, upload_session, timestamps, options,
+                                                      new_duplicates)
+        elif options.parse_workers > 1:
+            numbered_events = __parse_file_in_processes(open_upload, upload_session, timestamps, options,
+                                                        new_duplicates)
+        if numbered_events is None:
+            numbered_events = __parse_file(open_upload, upload_session, validation_errors, timestamps, options,
+                                           new_duplicates)
+        progress.parsed(len(numbered_events or []), start)
+        if numbered_events is None:
+            return False
+        if __bulk_load(numbered_events, upload_session, run, progress):
+            return True
+        # The rows are already parsed, so are written as they are rather than read and parsed again
+        return __write_row_by_row(partial(iter, numbered_events), None, upload_session, run, validation_errors,
+                                  progress)
+
+    return __write_row_by_row(
+        partial(__read_unique_rows, open_upload, options, new_duplicates),
+        lambda row: parse_line(row, upload_session.idp_entity_id, timestamps.timezone, timestamps),
+        upload_session, run, validation_errors, progress
+    )
+
+
+def __process_rows_in_chunks(open_upload, upload_session, run, validation_errors, timestamps, progress, options,
+                             resume, new_duplicates):
+    committed = Counter()
+    if resume:
+        committed.update(run(lambda db_connection: stored_idp_event_ids(upload_session, db_connection)))
+        logger.info('Resuming upload session {} after the {} rows already committed'.format(
+            upload_session.id, sum(committed.values())))
+
+    if options.validate_all:
+        start = progress.clock()
+        numbered_events = __validate_file(open_upload, upload_session, validation_errors, timestamps, options,
+                                          new_duplicates)
+        progress.parsed(len(numbered_events or []), start)
+        if numbered_events is None:
+            return False
+        read_rows, parse, event_id = partial(iter, numbered_events), None, __event_id_of_event
+    else:
+        read_rows = partial(__read_unique_rows, open_upload, options, new_duplicates)
+        parse = partial(parse_line, idp_entity_id=upload_session.idp_entity_id, timezone=timestamps.timezone,
+                        timestamp_parser=timestamps)
+        event_id = __event_id_of_row
+
+    return __write_row_by_row(
+        lambda: __skip_committed_rows(read_rows(), committed, event_id),
+        parse, upload_session, run, validation_errors, progress, options.chunk_rows, sum(committed.values())
+    )
+
+
+def __skip_committed_rows(numbered_rows, committed, event_id):
+    """
+    Chunks commit in file order, so an event id stored k times by an earlier attempt was stored for the first k rows
+    that have it.
+    """
+    committed = Counter(committed)
+    for row_number, row in numbered_rows:
+        key = event_id(row)
+        if committed[key]:
+            committed[key] -= 1
+            continue
+        yield row_number, row
+
+
+def __event_id_of_row(row):
+    # Short rows are left to fail when they are parsed
+    return row[1] if len(row) > 1 else None
+
+
+def __event_id_of_event(idp_fraud_event):
+    return idp_fraud_event.idp_event_id
+
+
+def __read_unique_rows(open_upload, options, new_duplicates):
+    """
+    Yields the (row_number, row) pairs to keep under options.duplicate_policy, with a new DuplicateDetector each time
+    the rows are read, so that a retried transaction does not find its own rows repeated.
+    """
+    duplicates = new_duplicates()
+    for row_number, row in __read_rows(open_upload, options):
+        if duplicates.check(row_number, row):
+            yield row_number, row
+    __log_merged_rows(duplicates)
+
+
+def __write_row_by_row(read_rows, parse, upload_session, run, validation_errors, progress, chunk_rows=0,
+                       stored_rows=0):
+    """
+    Writes the (row_number, row) pairs returned by read_rows, parsing each row with parse, or (row_number,
+    IdpFraudEvent) pairs if parse is None. Without chunk_rows they are written in one transaction, calling read_rows
+    again if it is retried. With chunk_rows, commits every chunk_rows rows in a transaction of their own. stored_rows
+    is the number of rows already stored for the upload session by an earlier attempt.
+    """
+    row_number = 0
+    try:
+        for read_chunk in __chunks(read_rows, chunk_rows):
+            row_number, exception = __run_write_once(
+                run,
+                lambda db_connection, written: __write_rows(read_chunk(), parse, upload_session, db_connection,
+                                                            progress, written),
+                upload_session, stored_rows + progress.rows_written
+            )
+            if exception:
+                __record_row_error(validation_errors, row_number, exception)
+                return False
+            progress.committed()
+
+    except (OperationalError, InterfaceError):
+        raise
+    except Exception as exception:
+        # The rows of a chunk are read before its transaction starts
+        __record_row_error(validation_errors, row_number, exception)
+        return False
+
+    return True
+
+
+def __run_write_once(run, write, upload_session, stored_rows):
+    """
+    Runs write(db_connection, written) with run, where write sets written[0] to its result just before its
+    transaction commits. If the commit then fails with an error worth retrying, the server may have committed anyway.
+    IDP fraud events and contraindicator counts would be written twice, so rather than write again, a retry returns
+    that result if more than stored_rows rows are now stored for the upload session.
+    """
+    written = [None]
+
+    def write_once(db_connection):
+        if written[0] is not None:
+            if len(stored_idp_event_ids(upload_session, db_connection)) > stored_rows:
+                logger.warning('Rows for upload session {} were committed before the connection was lost'.format(
+                    upload_session.id))
+                return written[0]
+            written[0] = None
+        return write(db_connection, written)
+
+    return run(write_once)
+
+
+def __write_rows(numbered_rows, parse, upload_session, db_connection, progress, written):
+    """
+    Returns the last row number written and None once the rows are committed, or the row number and the exception
+    that rolled them back. Errors worth retrying are raised instead, leaving the rows' counts in progress for the
+    caller to commit or roll back.
+    """
+    row_number = 0
+    # Counts left by an attempt whose transaction did not commit
+    progress.rolled_back()
+    try:
+        with InstrumentedTransaction(db_connection, 'idp_fraud_rows') as cursor:
+            contraindicator_rows = []
+            for row_number, row in numbered_rows:
+                start = progress.clock()
+                if parse:
+                    idp_fraud_event = parse(row)
+                    progress.parsed_in_transaction(1, start)
+                    start = progress.clock()
+                else:
+                    idp_fraud_event = row
+                write_idp_fraud_event_to_database(upload_session, idp_fraud_event, cursor, logger,
+                                                  contraindicator_rows)
+                progress.wrote(1, 0, start)
+                if len(contraindicator_rows) >= CONTRAINDICATOR_BATCH_SIZE:
+                    __write_contraindicators(contraindicator_rows, cursor, progress)
+                    contraindicator_rows = []
+                progress.log_if_due()
+            __write_contraindicators(contraindicator_rows, cursor, progress)
+            written[0] = (row_number, None)
+    except (OperationalError, InterfaceError):
+        raise
+    except Exception as exception:
+        progress.failed()
+        return row_number, exception
+    return row_number, None
+
+
+def __chunks(read_rows, chunk_rows):
+    """
+    Yields a function returning the rows of each chunk, that can be called again if its transaction is retried.
+    """
+    if not chunk_rows:
+        yield read_rows
+        return
+    numbered_rows = iter(read_rows())
+    chunk = list(islice(numbered_rows, chunk_rows))
+    while chunk:
+        yield partial(iter, chunk)
+        chunk = list(islice(numbered_rows, chunk_rows))
 
-    return not errors_occurred
 
+def __write_contraindicators(contraindicator_rows, cursor, progress):
+    start = progress.clock()
+    write_idp_fraud_event_contraindicators(contraindicator_rows, cursor)
+    progress.wrote(0, len(contraindicator_rows), start)
 
-def parse_line(row, idp_entity_id, timezone=DEFAULT_TIMEZONE):
+
+def __parse_file(open_upload, upload_session, validation_errors, timestamps, options, new_duplicates):
+    duplicates = new_duplicates()
+    numbered_events = []
+    row_number = 0
+    try:
+        for row_number, row in __read_rows(open_upload, options):
+            if not duplicates.check(row_number, row):
+                continue
+            numbered_events.append(
+                (row_number, parse_line(row, upload_session.idp_entity_id, timestamps.timezone, timestamps))
+            )
+    except Exception as exception:
+        __record_row_error(validation_errors, row_number, exception)
+        return None
+    __log_merged_rows(duplicates)
+    return numbered_events
+
+
+def __validate_file(open_upload, upload_session, validation_errors, timestamps, options, new_duplicates):
+    """
+    Records every failing field in the file, not just the first, so that one upload reports them all. Returns the
+    parsed (row_number, IdpFraudEvent) pairs, or None if any row failed.
+    """
+    if options.parse_workers > 1 and not options.columnar_parse:
+        result = __parse_in_processes(open_upload, upload_session, timestamps, options, new_duplicates)
+        numbered_events, errors = result.numbered_events, result.errors
+    else:
+        duplicates = new_duplicates()
+        duplicate_errors = []
+        numbered_rows = __drop_duplicate_rows(__read_rows(open_upload, options), duplicates, duplicate_errors)
+        if options.columnar_parse:
+            numbered_rows = list(numbered_rows)
+            numbered_events, errors = validate_parsed_rows(numbered_rows, parse_columns(
+                [row for _, row in numbered_rows], upload_session.idp_entity_id, timestamps))
+        else:
+            numbered_events, errors = validate_rows(numbered_rows, partial(
+                parse_line, idp_entity_id=upload_session.idp_entity_id, timezone=timestamps.timezone,
+                timestamp_parser=timestamps))
+        errors = sorted(errors + duplicate_errors, key=lambda error: error[0])
+        if not errors:
+            __log_merged_rows(duplicates)
+    if not errors:
+        return numbered_events
+
+    logger.warning('Found {} validation errors in IDP fraud data; nothing was written'.format(len(errors)))
+    for row_number, field, message in errors:
+        validation_errors.add(row_number, field, message)
+    return None
+
+
+def __parse_file_in_processes(open_upload, upload_session, timestamps, options, new_duplicates):
+    """
+    Returns None if any row fails to parse, for the file to be parsed row by row to find and report the failing line.
+    """
+    result = __parse_in_processes(open_upload, upload_session, timestamps, options, new_duplicates)
+    if result.errors:
+        logger.warning('Parallel parse of IDP fraud events failed, parsing row by row: {}'.format(result.errors[0][2]))
+        return None
+    return result.numbered_events
+
+
+def __parse_file_in_columns(open_upload, upload_session, timestamps, options, new_duplicates):
+    """
+    Returns None if any row fails to parse, for the file to be parsed row by row to find and report the failing line.
+    """
+    try:
+        numbered_rows = list(__read_unique_rows(open_upload, options, new_duplicates))
+    except Exception as exception:
+        logger.warning('Columnar parse of IDP fraud events failed, parsing row by row: {}'.format(exception))
+        return None
+    short_rows = [row_number for row_number, row in numbered_rows if len(row) < COLUMN_COUNT]
+    if short_rows:
+        logger.warning('Columnar parse of IDP fraud events failed, parsing row by row: line {} has fewer than {} '
+                       'fields'.format(short_rows[0], COLUMN_COUNT))
+        return None
+
+    results = parse_columns([row for _, row in numbered_rows], upload_session.idp_entity_id, timestamps)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning('Columnar parse of IDP fraud events failed, parsing row by row: {}'.format(result))
+            return None
+    return [(row_number, idp_fraud_event) for (row_number, _), idp_fraud_event in zip(numbered_rows, results)]
+
+
+def __parse_in_processes(open_upload, upload_session, timestamps, options, new_duplicates):
+    # Duplicates are found here, before the rows are split between processes that would each see only their own
+    duplicates = new_duplicates()
+    duplicate_errors = []
+    numbered_rows = list(__drop_duplicate_rows(__read_rows(open_upload, options), duplicates, duplicate_errors))
+    result = parse_in_processes(numbered_rows, parse_line, upload_session.idp_entity_id, timestamps.timezone,
+                                options.parse_workers)
+    timestamps.parsed_count += result.parsed_count
+    timestamps.fallback_count += result.fallback_count
+    if duplicate_errors:
+        result.errors = sorted(result.errors + duplicate_errors, key=lambda error: error[0])
+    elif not result.errors:
+        __log_merged_rows(duplicates)
+    return result
+
+
+def __drop_duplicate_rows(numbered_rows, duplicates, errors):
+    """
+    Yields the (row_number, row) pairs that duplicates keeps, adding a (row_number, field, message) to errors for each
+    that it rejects.
+    """
+    for row_number, row in numbered_rows:
+        try:
+            if duplicates.check(row_number, row):
+                yield row_number, row
+        except DuplicateRowError as exception:
+            errors.append((row_number, EVENT_ID_FIELD, str(exception)))
+
+
+def __log_merged_rows(duplicates):
+    if duplicates and duplicates.merged_count:
+        logger.info('Merged {} rows repeating an earlier row of the upload'.format(duplicates.merged_count))
+
+
+def __bulk_load(numbered_events, upload_session, run, progress):
+    """
+    A failed bulk load cannot say which row was at fault, so returns False for the file to be written row by row to
+    find and report the failing line.
+    """
+    start = progress.clock()
+    try:
+        contraindicator_count = __run_write_once(
+            run, partial(__bulk_load_in_transaction, numbered_events, upload_session), upload_session, 0)
+    except (OperationalError, InterfaceError):
+        raise
+    except Exception as exception:
+        logger.warning('Bulk load of IDP fraud events failed, retrying row by row: {}'.format(exception))
+        return False
+
+    progress.wrote(len(numbered_events), contraindicator_count, start)
+    progress.committed()
+    return True
+
+
+def __bulk_load_in_transaction(numbered_events, upload_session, db_connection, written):
+    with InstrumentedTransaction(db_connection, 'idp_fraud_bulk_load') as cursor:
+        written[0] = bulk_load_idp_fraud_events(upload_session, numbered_events, cursor)
+    return written[0]
+
+
+def __duplicate_detectors(open_upload, options):
+    """
+    Returns a function making a DuplicateDetector for one pass over the upload. Unless the policy is off, the upload is
+    first read once to find its repeated_event_ids, so that the detectors only need to track those.
+    """
+    if options.duplicate_policy == OFF:
+        return partial(DuplicateDetector, OFF)
+    try:
+        repeated = repeated_event_ids(__read_rows(open_upload, options))
+    except Exception as exception:
+        # The pass that follows fails on the same row, and reports it
+        logger.warning('Could not screen IDP fraud data for repeated event ids: {}'.format(exception))
+        return partial(DuplicateDetector, options.duplicate_policy)
+    return partial(DuplicateDetector, options.duplicate_policy, repeated)
+
+
+def __read_rows(open_upload, options):
+    with io.TextIOWrapper(open_upload(), encoding='utf-8', newline='') as csvfile:
+        reader = csv.reader(csvfile, dialect=options.dialect)
+        for row_number, row in enumerate(reader, 1):
+            if row_number == 1 and options.has_header:
+                continue
+            yield row_number, row
+
+
+def __record_row_error(validation_errors, row_number, exception):
+    if isinstance(exception, DuplicateRowError):
+        row_number = exception.row_number
+    message = 'Failed to store IDP fraud event: {} (line {})'.format(exception, row_number)
+    # Not always called while the exception is being handled, so it is passed explicitly
+    logger.error(message, exc_info=exception)
+    if isinstance(exception, DuplicateRowError):
+        # As IDP_FRAUD_VALIDATE_ALL reports them
+        validation_errors.add(row_number, EVENT_ID_FIELD, str(exception))
+    else:
+        validation_errors.add(row_number, '**Row Exception**', message)
+
+
+def parse_line(row, idp_entity_id, timezone=DEFAULT_TIMEZONE, timestamp_parser=None):
+    if timestamp_parser:
+        timestamp = timestamp_parser.parse(row[0])
+    else:
+        timestamp = dateparser.parse(row[0], settings={'TIMEZONE': timezone})
     return IdpFraudEvent(
         idp_entity_id=idp_entity_id,
-        timestamp=dateparser.parse(row[0], settings={'TIMEZONE': timezone}),
+        timestamp=timestamp,
         idp_event_id=row[1],
         fid_code=row[2],
-        contra_indicators=re.split(',|\n|\r\n', row[3]) if row[3].strip() else [],
+        contra_indicators=CONTRA_INDICATOR_SEPARATOR.split(row[3]) if row[3].strip() else [],
         contra_score=row[4] if row[4].strip() else 0,
         request_id=row[5],
         client_ip_address=row[6],
@@ -91,35 +583,82 @@ def move_to_success(bucket, filename):
 
 
 def idp_fraud_data_events(event, __):
+    # The handler's own checkpoints notify it too, and need no database connection
+    records = [record for record in event['Records'] if not is_checkpoint(record['s3']['object']['key'])]
+    if not records:
+        return
+
     dsn = os.environ['DB_CONNECTION_STRING']
 
-    db_connection = create_db_connection(dsn, get_database_password(dsn))
+    environment_options = __upload_options_from_environment()
+    metrics = get_transaction_metrics()
+    metrics.slow_statement_seconds = get_slow_statement_seconds()
+
+    pool = get_connection_pool(dsn)
+    pool.get_connection()
     logger.info('Created connection to DB')
 
-    for record in event['Records']:
+    for record in records:
         bucket = record['s3']['bucket']['name']
         filename = record['s3']['object']['key']
-
         tags = fetch_object_tags(bucket, filename)
         idp_entity_id = tags['idp']
         username = tags['username']
 
-        timezone = DEFAULT_TIMEZONE
-        dialect = DEFAULT_DIALECT
-        has_header = DEFAULT_HAS_HEADER
+        options = environment_options.with_tags(tags)
 
-        if 'timezone' in tags:
-            timezone = tags['timezone']
-        if 'dialect' in tags:
-            dialect = tags['dialect']
-        if 'has_header' in tags:
-            has_header = tags['has_header'].lower() in ['true', '1', 'y', 'yes']
+        # In chunked mode the checkpoint only records the upload session, so that a retry carries on with it
+        checkpoint = None
+        if options.chunk_rows:
+            etag = fetch_object_metadata(bucket, filename)['ETag']
+            checkpoint = load_checkpoint(bucket, filename, etag)
 
-        upload_session = create_import_session(filename, idp_entity_id, username, db_connection)
-        if process_file(bucket, filename, upload_session, db_connection, has_header, dialect, timezone):
+        resume = bool(checkpoint and checkpoint.upload_session_id)
+        if resume:
+            upload_session = UploadSession(id=checkpoint.upload_session_id, source_file_name=filename,
+                                           idp_entity_id=idp_entity_id, userid=username)
+        else:
+            upload_session = pool.run(
+                lambda db_connection: create_import_session(filename, idp_entity_id, username, db_connection))
+            if checkpoint:
+                checkpoint.upload_session_id = upload_session.id
+                save_checkpoint(bucket, filename, etag, checkpoint)
+
+        if process_file(bucket, filename, upload_session, pool.run, options, resume):
             logger.info("Processing successful")
-            update_session_as_validated(upload_session, db_connection)
+            # Only once every chunk has committed
+            pool.run(lambda db_connection: update_session_as_validated(upload_session, db_connection))
             move_to_success(bucket, filename)
         else:
             logger.warning("Processing Failed")
+            if options.chunk_rows:
+                pool.run(lambda db_connection: delete_upload_session_events(upload_session, db_connection))
             move_to_error(bucket, filename)
+        if options.chunk_rows:
+            clear_checkpoint(bucket, filename)
+
+    metrics.log_summary()
+    metrics.clear()
+
+
+def __upload_options_from_environment():
+    return UploadOptions(
+        bulk_load=is_set(os.environ.get('IDP_FRAUD_BULK_LOAD'), DEFAULT_BULK_LOAD),
+        max_validation_errors=int(os.environ.get('MAX_VALIDATION_ERRORS', DEFAULT_MAX_ERRORS)),
+        stream_upload=is_set(os.environ.get('IDP_FRAUD_STREAM_UPLOAD'), DEFAULT_STREAM_UPLOAD),
+        validate_all=is_set(os.environ.get('IDP_FRAUD_VALIDATE_ALL'), DEFAULT_VALIDATE_ALL),
+        parse_workers=int(os.environ.get('IDP_FRAUD_PARSE_WORKERS', DEFAULT_PARSE_WORKERS)),
+        progress_interval_seconds=float(
+            os.environ.get('IDP_FRAUD_PROGRESS_INTERVAL_SECONDS', DEFAULT_LOG_INTERVAL_SECONDS)),
+        store_summary=is_set(os.environ.get('IDP_FRAUD_STORE_SUMMARY'), DEFAULT_STORE_SUMMARY),
+        chunk_rows=int(os.environ.get('IDP_FRAUD_CHUNK_ROWS', DEFAULT_CHUNK_ROWS)),
+        duplicate_policy=__duplicate_policy(),
+        columnar_parse=is_set(os.environ.get('IDP_FRAUD_COLUMNAR_PARSE'), DEFAULT_COLUMNAR_PARSE)
+    )
+
+
+def __duplicate_policy():
+    duplicate_policy = os.environ.get('IDP_FRAUD_DUPLICATE_POLICY', DEFAULT_DUPLICATE_POLICY).lower()
+    if duplicate_policy not in DUPLICATE_POLICIES:
+        raise ValueError('Unknown IDP_FRAUD_DUPLICATE_POLICY "{0}"'.format(duplicate_policy))
+    return duplicate_policy
@@ -0,0 +1,63 @@
+from functools import partial
+
+# Event Time, Event ID, FID code, Contra Indicators, Contra Score, Request ID, Client IP Address, PID
+COLUMN_COUNT = 8
+ROW_FIELD = '**Row Exception**'
+EVENT_TIME_FIELD = 'Event Time'
+CONTRA_SCORE_FIELD = 'Contra Score'
+
+
+def validate_rows(numbered_rows, parse):
+    """
+    Parses and checks each (row_number, row) pair with parse, carrying on past failures. Returns the
+    (row_number, IdpFraudEvent) pairs of the valid rows and a (row_number, field, message) for every problem found.
+    No row depends on any other, so a file can be validated in chunks, in any order.
+    """
+    return __validate((row_number, row, partial(parse, row)) for row_number, row in numbered_rows)
+
+
+def validate_parsed_rows(numbered_rows, results):
+    """
+    As validate_rows, for rows already parsed by parse_columns into results, one for each row.
+    """
+    return __validate(
+        (row_number, row, partial(__returned_or_raised, result))
+        for (row_number, row), result in zip(numbered_rows, results)
+    )
+
+
+def __validate(numbered_parses):
+    numbered_events = []
+    errors = []
+    for row_number, row, parse in numbered_parses:
+        if len(row) < COLUMN_COUNT:
+            errors.append((row_number, ROW_FIELD, 'Expected {} fields but found {}'.format(COLUMN_COUNT, len(row))))
+            continue
+        try:
+            idp_fraud_event = parse()
+        except Exception as exception:
+            errors.append((row_number, ROW_FIELD, 'Failed to parse IDP fraud event: {}'.format(exception)))
+            continue
+
+        row_errors = __field_errors(row, idp_fraud_event)
+        errors.extend((row_number, field, message) for field, message in row_errors)
+        if not row_errors:
+            numbered_events.append((row_number, idp_fraud_event))
+    return numbered_events, errors
+
+
+def __returned_or_raised(result):
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def __field_errors(row, idp_fraud_event):
+    errors = []
+    if idp_fraud_event.timestamp is None:
+        errors.append((EVENT_TIME_FIELD, 'Could not read "{}" as a date and time'.format(row[0])))
+    try:
+        int(idp_fraud_event.contra_score)
+    except ValueError:
+        errors.append((CONTRA_SCORE_FIELD, '"{}" is not a whole number'.format(row[4])))
+    return errors
@@ -0,0 +1,70 @@
+import json
+import os
+
+from botocore.exceptions import ClientError
+
+from src.aws_client import aws_client
+
+# Checkpoints are sidecar objects under this prefix, in the same bucket as the file they track. The bucket
+# notification should be filtered so that it does not match them, as each save would otherwise invoke the Lambda
+DEFAULT_CHECKPOINT_PREFIX = 'recorder-checkpoints/'
+CHECKPOINT_SUFFIX = '.checkpoint'
+
+
+class ImportCheckpoint(object):
+    """
+    The byte offset and line number up to which an import file's events have been committed, and the upload session
+    they were committed under if the file has one. A checkpoint only applies to the version of the file with the same
+    ETag, so a replaced file is imported from the start.
+    """
+
+    def __init__(self, offset=0, line_number=0, upload_session_id=None):
+        self.offset = offset
+        self.line_number = line_number
+        self.upload_session_id = upload_session_id
+
+
+def checkpoint_prefix():
+    return os.environ.get('IMPORT_CHECKPOINT_PREFIX', DEFAULT_CHECKPOINT_PREFIX)
+
+
+def is_checkpoint(filename):
+    return filename.startswith(checkpoint_prefix())
+
+
+def load_checkpoint(bucket_name, filename, etag):
+    s3_client = aws_client('s3')
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=__checkpoint_key(filename))
+    except ClientError as error:
+        if error.response['Error']['Code'] in ['NoSuchKey', '404']:
+            return ImportCheckpoint()
+        raise
+    checkpoint = json.loads(response['Body'].read().decode())
+    if checkpoint['etag'] != etag:
+        return ImportCheckpoint()
+    return ImportCheckpoint(checkpoint['offset'], checkpoint['line_number'], checkpoint.get('upload_session_id'))
+
+
+def save_checkpoint(bucket_name, filename, etag, checkpoint):
+    s3_client = aws_client('s3')
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=__checkpoint_key(filename),
+        Body=json.dumps({
+            'etag': etag,
+            'offset': checkpoint.offset,
+            'line_number': checkpoint.line_number,
+            'upload_session_id': checkpoint.upload_session_id
+        }),
+        ServerSideEncryption='AES256'
+    )
+
+
+def clear_checkpoint(bucket_name, filename):
+    s3_client = aws_client('s3')
+    s3_client.delete_object(Bucket=bucket_name, Key=__checkpoint_key(filename))
+
+
+def __checkpoint_key(filename):
+    return '{}{}{}'.format(checkpoint_prefix(), filename, CHECKPOINT_SUFFIX)
@@ -0,0 +1,123 @@
+import cProfile
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+
+from src.database import is_billing_event, is_fraud_event, audit_event_parameters, billing_event_parameters, \
+    fraud_event_parameters
+from src.event_mapper import event_from_json_object
+from src.s3 import put_object
+
+# cProfile dumps of dry runs are uploaded under this prefix, in the same bucket as the import file
+PROFILE_PREFIX = 'import-profiles/'
+
+
+class DryRunReport(object):
+    """
+    What importing a file would do: how fast its lines parse, why any fail to, what mix of events it holds and how
+    many statements and transactions writing them would take.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.line_count = 0
+        self.seconds = 0.0
+        self.failure_reasons = Counter()
+        self.event_mix = Counter()
+        self.derived_row_failures = 0
+
+    @property
+    def event_count(self):
+        return sum(self.event_mix.values())
+
+    @property
+    def lines_per_second(self):
+        return self.line_count / self.seconds if self.seconds else 0.0
+
+    @property
+    def projected_transactions(self):
+        # Each batch is checked for stored events, then written in one transaction
+        batches = -(-self.event_count // self.batch_size)
+        return 2 * batches
+
+    @property
+    def projected_statements(self):
+        # One existence check per batch; SAVEPOINT, write and RELEASE per event
+        return self.projected_transactions // 2 + 3 * self.event_count
+
+    def add_failure(self, exception):
+        if isinstance(exception, json.JSONDecodeError):
+            reason = 'JSONDecodeError'
+        else:
+            reason = '{}: {}'.format(type(exception).__name__, exception)
+        self.failure_reasons[reason] += 1
+
+    def add_event(self, event):
+        audit_event_parameters(event)
+        if is_billing_event(event):
+            self.event_mix['billing'] += 1
+            derived_parameters = billing_event_parameters
+        elif is_fraud_event(event):
+            self.event_mix['fraud'] += 1
+            derived_parameters = fraud_event_parameters
+        else:
+            self.event_mix['audit only'] += 1
+            return
+        try:
+            derived_parameters(event)
+        except KeyError:
+            self.derived_row_failures += 1
+
+    def log(self, filename, logger):
+        logger.info('Dry run of {}: {} lines in {:.2f}s ({:.0f} lines/s)'.format(
+            filename, self.line_count, self.seconds, self.lines_per_second))
+        logger.info('Dry run of {}: {} events - {} audit only, {} billing, {} fraud, {} derived rows missing fields'
+                    .format(filename, self.event_count, self.event_mix['audit only'], self.event_mix['billing'],
+                            self.event_mix['fraud'], self.derived_row_failures))
+        logger.info('Dry run of {}: {} parse failures'.format(filename, sum(self.failure_reasons.values())))
+        for reason, count in self.failure_reasons.most_common():
+            logger.info('Dry run of {}: {} x {}'.format(filename, count, reason))
+        logger.info('Dry run of {}: projected {} statements in {} transactions'.format(
+            filename, self.projected_statements, self.projected_transactions))
+
+
+def dry_run_import(bucket, filename, lines, batch_size, logger, profile=False):
+    """
+    Parses, maps and routes every line as an import would, without touching the database or the file, and logs a
+    DryRunReport. With profile, a cProfile dump of the run is uploaded to PROFILE_PREFIX in the same bucket.
+    """
+    report = DryRunReport(batch_size)
+    profiler = cProfile.Profile() if profile else None
+    if profiler:
+        profiler.enable()
+
+    start = time.monotonic()
+    for line, _ in lines:
+        report.line_count += 1
+        try:
+            event = event_from_json_object(json.loads(line)['document'])
+            report.add_event(event)
+        except Exception as exception:
+            report.add_failure(exception)
+    report.seconds = time.monotonic() - start
+
+    if profiler:
+        profiler.disable()
+        __upload_profile(profiler, bucket, '{}{}.pstats'.format(PROFILE_PREFIX, filename))
+        logger.info('Dry run of {}: profile written to {}{}.pstats'.format(filename, PROFILE_PREFIX, filename))
+
+    report.log(filename, logger)
+    return report
+
+
+def __upload_profile(profiler, bucket, key):
+    fd, temp_file_name = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        profiler.dump_stats(temp_file_name)
+        with open(temp_file_name, 'rb') as stats:
+            put_object(bucket, key, stats.read())
+    finally:
+        os.remove(temp_file_name)
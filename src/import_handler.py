@@ -1,43 +1,241 @@
 import json
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
 
-from src.common import get_database_password
-from src.database import create_db_connection, write_audit_event_to_database, \
-    write_billing_event_to_database, write_fraud_event_to_database
+from src.async_database import AsyncEventWriter
+from src.common import get_database_backend, get_database_password, get_slow_statement_seconds, is_set, \
+    ASYNCPG_BACKEND
+from src.connection_pool import get_connection_pool
+from src.database import write_events_to_database, existing_event_ids
 from src.event_mapper import event_from_json_object
-from src.s3 import fetch_import_file, delete_import_file
+from src.import_dry_run import dry_run_import, PROFILE_PREFIX
+from src.import_checkpoint import ImportCheckpoint, is_checkpoint, load_checkpoint, save_checkpoint, clear_checkpoint
+from src.parallel_parser import map_in_processes
+from src.ranged_reader import fetch_import_file_from, fetch_import_file_in_ranges, fetch_compressed_import_file, \
+    compression_of, DEFAULT_RANGE_SIZE, DEFAULT_WORKERS
+from src.s3 import fetch_object_metadata, fetch_object_tags, delete_import_file
+from src.transaction_metrics import get_transaction_metrics
+
+IMPORT_BATCH_SIZE = 500
+# Each checkpoint is an S3 PUT into the bucket the handler is notified from, so they are saved at most this often
+DEFAULT_CHECKPOINT_INTERVAL_SECONDS = 30
+# Files from one S3 notification imported at once, each on its own thread and connection
+DEFAULT_IMPORT_WORKERS = 4
+# Processes parsing the lines of each file; 1 parses them on the importing thread
+DEFAULT_PARSE_WORKERS = 1
+# Files larger than this are read as parallel ranged GETs rather than one stream
+DEFAULT_RANGED_READ_MIN_BYTES = 2 * DEFAULT_RANGE_SIZE
 
 
 def import_events(event, __):
     logger = logging.getLogger('event-recorder')
     logger.setLevel(logging.INFO)
 
+    # The handler's own checkpoints and profiles notify it too, and need no database connection
+    records = [record for record in event['Records'] if not __is_own_object(record['s3']['object']['key'])]
+    if not records:
+        return
+
     dsn = os.environ['DB_CONNECTION_STRING']
+    metrics = get_transaction_metrics()
+    metrics.slow_statement_seconds = get_slow_statement_seconds()
+
+    if get_database_backend() == ASYNCPG_BACKEND:
+        pool = None
+        database_password = get_database_password(dsn)
+
+        def import_record(record):
+            # asyncpg connections belong to one event loop, so each file gets a writer of its own
+            async_writer = AsyncEventWriter(dsn, database_password)
+            try:
+                __import_record(record, async_writer.existing_event_ids, async_writer.write_events, logger)
+            finally:
+                async_writer.close()
+    else:
+        pool = get_connection_pool(dsn)
+        pool.get_connection()
+
+        def write_events(events):
+            return pool.run(lambda db_connection: write_events_to_database(events, db_connection))
+
+        def find_existing(event_ids):
+            return pool.run(lambda db_connection: existing_event_ids(event_ids, db_connection))
+
+        def import_record(record):
+            # Each worker thread gets its own pooled connection
+            __import_record(record, find_existing, write_events, logger)
 
-    db_connection = create_db_connection(dsn, get_database_password(dsn))
     logger.info('Created connection to DB')
 
-    for record in event['Records']:
-        bucket = record['s3']['bucket']['name']
-        filename = record['s3']['object']['key']
+    try:
+        __import_records(records, import_record, pool, logger)
+    finally:
+        metrics.log_summary()
+        metrics.clear()
 
-        iterable = fetch_import_file(bucket, filename)
 
-        for line in iterable:
-            try:
-                message_envelope = json.loads(line)
-                event = event_from_json_object(message_envelope['document'])
+def __import_records(records, import_record, pool, logger):
+    """
+    Imports up to IMPORT_WORKERS files at once. A failure in one file does not stop the others; once all have
+    finished, each failure is logged against its file and the first is raised.
+    """
+    if len(records) == 1:
+        import_record(records[0])
+        return
+
+    def import_record_in_worker(record):
+        try:
+            import_record(record)
+        finally:
+            if pool:
+                pool.release()
+
+    workers = int(os.environ.get('IMPORT_WORKERS', DEFAULT_IMPORT_WORKERS))
+    with ThreadPoolExecutor(max_workers=min(workers, len(records))) as executor:
+        futures = [(record, executor.submit(import_record_in_worker, record)) for record in records]
+
+    errors = []
+    for record, future in futures:
+        error = future.exception()
+        if error:
+            logger.error('Failed to import {}: {}'.format(record['s3']['object']['key'], error))
+            errors.append(error)
+    if errors:
+        raise errors[0]
+
+
+def __import_record(record, find_existing, write_events, logger):
+    bucket = record['s3']['bucket']['name']
+    filename = record['s3']['object']['key']
+    metadata = fetch_object_metadata(bucket, filename)
+    tags = fetch_object_tags(bucket, filename)
+    if is_set(tags.get('dry_run', os.environ.get('IMPORT_DRY_RUN'))):
+        dry_run_import(bucket, filename, __open_import_file(bucket, filename, metadata, 0), IMPORT_BATCH_SIZE, logger,
+                       profile=is_set(tags.get('profile', os.environ.get('IMPORT_PROFILE'))))
+        return
+
+    etag = metadata['ETag']
+    checkpoint = load_checkpoint(bucket, filename, etag)
+    if checkpoint.offset:
+        logger.info('Resuming import of {} after line {}'.format(filename, checkpoint.line_number))
+
+    checkpoint_interval_seconds = float(
+        os.environ.get('IMPORT_CHECKPOINT_INTERVAL_SECONDS', DEFAULT_CHECKPOINT_INTERVAL_SECONDS))
+    last_saved = time.monotonic()
+    events = []
+    event_count = 0
+    skipped_count = 0
+    line_number = checkpoint.line_number
+    lines = __open_import_file(bucket, filename, metadata, checkpoint.offset)
+    parse_workers = int(os.environ.get('IMPORT_PARSE_WORKERS', DEFAULT_PARSE_WORKERS))
+    for offset, event, exception in __parse_import_lines(lines, parse_workers):
+        line_number += 1
+        if exception:
+            logger.error('Failed to store message{}'.format(exception), exc_info=exception)
+        else:
+            events.append(event)
+
+        if len(events) >= IMPORT_BATCH_SIZE:
+            event_count += len(events)
+            skipped_count += __write_new_events(find_existing, write_events, events, logger)
+            events = []
+            if offset is not None and time.monotonic() - last_saved >= checkpoint_interval_seconds:
+                save_checkpoint(bucket, filename, etag, ImportCheckpoint(offset, line_number))
+                last_saved = time.monotonic()
+    event_count += len(events)
+    skipped_count += __write_new_events(find_existing, write_events, events, logger)
+
+    logger.info('Skipped {} of {} events already in the database ({:.1%})'.format(
+        skipped_count, event_count, skipped_count / event_count if event_count else 0))
+    # Only once every event in the file has been written
+    delete_import_file(bucket, filename)
+    clear_checkpoint(bucket, filename)
+
+
+def __is_own_object(filename):
+    return is_checkpoint(filename) or filename.startswith(PROFILE_PREFIX)
+
+
+def __open_import_file(bucket, filename, metadata, start):
+    """
+    Yields (line, offset) pairs from byte start, where offset is where to resume after the line, or None if the file
+    is compressed or read out of order and so cannot be resumed part way through.
+    """
+    compression = compression_of(filename, metadata.get('ContentEncoding'))
+    if compression:
+        return fetch_compressed_import_file(bucket, filename, compression)
+
+    size = metadata['ContentLength']
+    if size - start < int(os.environ.get('IMPORT_RANGED_READ_MIN_BYTES', DEFAULT_RANGED_READ_MIN_BYTES)):
+        return fetch_import_file_from(bucket, filename, start)
+    ordered = is_set(os.environ.get('IMPORT_ORDERED_READ'), True)
+    lines = fetch_import_file_in_ranges(
+        bucket, filename, size,
+        range_size=int(os.environ.get('IMPORT_RANGE_SIZE', DEFAULT_RANGE_SIZE)),
+        workers=int(os.environ.get('IMPORT_RANGE_WORKERS', DEFAULT_WORKERS)),
+        ordered=ordered,
+        start=start
+    )
+    return lines if ordered else ((line, None) for line in lines)
+
+
+def __parse_import_lines(lines, workers):
+    """
+    Yields an (offset, event, exception) triple for each (line, offset) pair, where exception is whatever stopped the
+    line being parsed. IMPORT_BATCH_SIZE lines per worker are parsed at a time, each worker process given a contiguous
+    slice of them.
+    """
+    lines = iter(lines)
+    group = list(islice(lines, IMPORT_BATCH_SIZE * workers))
+    while group:
+        parsed = chain.from_iterable(map_in_processes(__parse_lines, [line for line, _ in group], workers))
+        for (_, offset), (event, exception) in zip(group, parsed):
+            yield offset, event, exception
+        group = list(islice(lines, IMPORT_BATCH_SIZE * workers))
+
+
+def __parse_lines(lines):
+    parsed = []
+    for line in lines:
+        try:
+            parsed.append((event_from_json_object(json.loads(line)['document']), None))
+        except Exception as exception:
+            parsed.append((None, exception))
+    return parsed
+
+
+def __write_new_events(find_existing, write_events, events, logger):
+    """
+    Drops the events that are already stored before writing the rest, so replayed files do not pay for an insert
+    attempt per duplicate. Returns the number dropped.
+    """
+    if not events:
+        return 0
+
+    try:
+        existing = find_existing([event.event_id for event in events])
+    except Exception as exception:
+        logger.exception('Failed to check for existing events{}'.format(exception))
+        existing = set()
+
+    new_events = [event for event in events if event.event_id not in existing]
+    __write_events(write_events, new_events, logger)
+    return len(events) - len(new_events)
+
 
-                if write_audit_event_to_database(event, db_connection):
-                    if (event.event_type == 'session_event'
-                            and event.details.get('session_event_type') == 'idp_authn_succeeded'):
-                        write_billing_event_to_database(event, db_connection)
-                    if (event.event_type == 'session_event'
-                            and event.details.get('session_event_type') == 'fraud_detected'):
-                        write_fraud_event_to_database(event, db_connection)
+def __write_events(write_events, events, logger):
+    if not events:
+        return
 
-            except Exception as exception:
-                logger.exception('Failed to store message{}'.format(exception))
+    try:
+        outcomes = write_events(events)
+    except Exception as exception:
+        logger.exception('Failed to store {} messages{}'.format(len(events), exception))
+        return
 
-        delete_import_file(bucket, filename)
+    for outcome in outcomes:
+        if not outcome.succeeded:
+            logger.error('Failed to store message{}'.format(outcome.error))
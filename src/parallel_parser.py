@@ -0,0 +1,109 @@
+import multiprocessing
+from functools import partial
+
+from src.idp_fraud_event import IdpFraudEvent
+from src.idp_fraud_validation import validate_rows
+from src.timestamp_parser import TimestampParser
+
+
+class ParseResult(object):
+    def __init__(self, numbered_events, errors, parsed_count, fallback_count):
+        self.numbered_events = numbered_events
+        self.errors = errors
+        self.parsed_count = parsed_count
+        self.fallback_count = fallback_count
+
+
+def parse_in_processes(numbered_rows, parse_line, idp_entity_id, timezone, workers):
+    """
+    Validates (row_number, row) pairs as validate_rows does, split into one contiguous slice per worker process, and
+    returns a ParseResult with events and errors in row order.
+    """
+    replies = map_in_processes(
+        partial(__parse_slice, parse_line=parse_line, idp_entity_id=idp_entity_id, timezone=timezone),
+        numbered_rows, workers
+    )
+    return __to_result(replies, idp_entity_id)
+
+
+def map_in_processes(function, items, workers):
+    """
+    Calls function with one contiguous slice of items per worker process, returning its replies in order. Each worker
+    replies over a Pipe: multiprocessing.Pool and Queue need /dev/shm, which Lambda does not have. With a single
+    slice, function is called in this process.
+    """
+    slices = __slices(items, workers)
+    if len(slices) <= 1:
+        return [function(items)]
+
+    processes = []
+    for slice_items in slices:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=__call_in_process, args=(function, slice_items, sender))
+        process.start()
+        sender.close()
+        processes.append((process, receiver))
+
+    replies = []
+    for process, receiver in processes:
+        # Read before joining, or a worker with more to send than the pipe holds never exits
+        replies.append(receiver.recv())
+        receiver.close()
+        process.join()
+
+    for error, _ in replies:
+        if error:
+            raise error
+    return [reply for _, reply in replies]
+
+
+def __slices(numbered_rows, workers):
+    slice_size = -(-len(numbered_rows) // max(workers, 1))
+    return [numbered_rows[start:start + slice_size] for start in range(0, len(numbered_rows), slice_size or 1)]
+
+
+def __call_in_process(function, items, sender):
+    try:
+        sender.send((None, function(items)))
+    except Exception as exception:
+        sender.send((exception, None))
+    finally:
+        sender.close()
+
+
+def __parse_slice(rows, parse_line, idp_entity_id, timezone):
+    # Events go back as plain tuples, which are smaller to send than IdpFraudEvents
+    timestamps = TimestampParser(timezone)
+    numbered_events, errors = validate_rows(
+        rows, partial(parse_line, idp_entity_id=idp_entity_id, timezone=timezone, timestamp_parser=timestamps)
+    )
+    event_rows = [
+        (row_number, event.idp_event_id, event.timestamp, event.fid_code, event.contra_indicators,
+         event.contra_score, event.request_id, event.client_ip_address, event.pid)
+        for row_number, event in numbered_events
+    ]
+    return event_rows, errors, timestamps.parsed_count, timestamps.fallback_count
+
+
+def __to_result(replies, idp_entity_id):
+    result = ParseResult([], [], 0, 0)
+    for event_rows, errors, parsed_count, fallback_count in replies:
+        result.numbered_events.extend(
+            (row_number, IdpFraudEvent(
+                idp_entity_id=idp_entity_id,
+                idp_event_id=idp_event_id,
+                timestamp=timestamp,
+                fid_code=fid_code,
+                contra_indicators=contra_indicators,
+                contra_score=contra_score,
+                request_id=request_id,
+                client_ip_address=client_ip_address,
+                pid=pid
+            ))
+            for (row_number, idp_event_id, timestamp, fid_code, contra_indicators, contra_score, request_id,
+                 client_ip_address, pid) in event_rows
+        )
+        result.errors.extend(errors)
+        result.parsed_count += parsed_count
+        result.fallback_count += fallback_count
+    return result
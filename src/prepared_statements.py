@@ -0,0 +1,59 @@
+import weakref
+
+__prepared_names = weakref.WeakKeyDictionary()
+
+
+class PreparedStatement:
+    """
+    A server-side prepared statement. It is PREPAREd the first time it is executed on a connection and EXECUTEd
+    from then on. New connections, including those created by a reconnect, are prepared again on first use.
+
+    sql uses the same %s placeholders as cursor.execute, so execute_unprepared runs exactly the same statement.
+    """
+
+    def __init__(self, name, sql):
+        self.__name = name
+        self.__sql = sql
+        self.__parameter_count = sql.count('%s')
+        self.__positional_sql = sql % self.__positional_placeholders()
+        self.__prepare_sql = 'PREPARE {0} AS {1}'.format(name, self.__positional_sql)
+        if self.__parameter_count:
+            self.__execute_sql = 'EXECUTE {0} ({1})'.format(name, ', '.join(['%s'] * self.__parameter_count))
+        else:
+            self.__execute_sql = 'EXECUTE {0}'.format(name)
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def sql(self):
+        return self.__sql
+
+    @property
+    def positional_sql(self):
+        """
+        The statement with $1, $2... placeholders, as used by drivers that prepare statements natively
+        """
+        return self.__positional_sql
+
+    def execute(self, cursor, parameters):
+        prepared_names = _prepared_names_for(cursor.connection)
+        if self.__name not in prepared_names:
+            cursor.execute(self.__prepare_sql)
+            prepared_names.add(self.__name)
+        cursor.execute(self.__execute_sql, parameters)
+
+    def execute_unprepared(self, cursor, parameters):
+        cursor.execute(self.__sql, parameters)
+
+    def __positional_placeholders(self):
+        return tuple('${0}'.format(position) for position in range(1, self.__parameter_count + 1))
+
+
+def _prepared_names_for(connection):
+    prepared_names = __prepared_names.get(connection)
+    if prepared_names is None:
+        prepared_names = set()
+        __prepared_names[connection] = prepared_names
+    return prepared_names
@@ -0,0 +1,175 @@
+"""
+Reads S3 objects as lines, as StreamingBody.iter_lines would give them for newline (or CRLF) delimited files, but
+optionally from a byte offset and with the offset reached after each line, so that reading can be resumed. Large
+objects can be read as several ranged GETs in parallel, realigned on newlines, and gzip or zstd compressed objects
+are decompressed as they stream.
+"""
+import gzip
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from botocore.exceptions import ClientError
+
+from src.aws_client import aws_client
+
+DEFAULT_RANGE_SIZE = 8 * 1024 * 1024
+DEFAULT_WORKERS = 8
+STREAM_CHUNK_SIZE = 64 * 1024
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+__COMPRESSION_SUFFIXES = {'.gz': GZIP, '.gzip': GZIP, '.zst': ZSTD, '.zstd': ZSTD}
+__COMPRESSION_ENCODINGS = {'gzip': GZIP, 'x-gzip': GZIP, 'zstd': ZSTD}
+
+
+class RangeLines(object):
+    """
+    The lines of one byte range. head is the text before the range's first newline and tail the text after its last,
+    both of which belong to lines that may cross into the neighbouring ranges; lines are the complete lines between.
+    A range without a newline has its whole text as head, and no tail.
+    """
+
+    def __init__(self, data):
+        pieces = data.split(b'\n')
+        self.has_newline = len(pieces) > 1
+        self.head = pieces[0]
+        self.lines = pieces[1:-1]
+        self.tail = pieces[-1] if self.has_newline else b''
+
+
+def __strip_carriage_return(line):
+    return line[:-1] if line.endswith(b'\r') else line
+
+
+def byte_ranges(size, range_size, start=0):
+    return [(first, min(first + range_size, size) - 1) for first in range(start, size, range_size)]
+
+
+def join_ranges(ranges):
+    """
+    Stitches the heads and tails of a sequence of RangeLines, in file order, into the lines that cross range
+    boundaries, yielding those and the complete lines in file order.
+    """
+    for line, _ in join_ranges_with_offsets(ranges):
+        yield line
+
+
+def join_ranges_with_offsets(ranges, start=0):
+    """
+    As join_ranges, but yields (line, offset) pairs, where offset is the position just after the line and its newline
+    for ranges read from start.
+    """
+    offset = start
+    pending = b''
+    for range_lines in ranges:
+        pending += range_lines.head
+        if range_lines.has_newline:
+            offset += len(pending) + 1
+            yield __strip_carriage_return(pending), offset
+            for line in range_lines.lines:
+                offset += len(line) + 1
+                yield __strip_carriage_return(line), offset
+            pending = range_lines.tail
+    if pending:
+        yield __strip_carriage_return(pending), offset + len(pending)
+
+
+def fetch_import_file_from(bucket_name, filename, start=0):
+    """
+    Streams an S3 object from byte start as one GET, yielding (line, offset) pairs as join_ranges_with_offsets does.
+    """
+    s3_client = aws_client('s3')
+    try:
+        if start:
+            response = s3_client.get_object(Bucket=bucket_name, Key=filename, Range='bytes={}-'.format(start))
+        else:
+            response = s3_client.get_object(Bucket=bucket_name, Key=filename)
+    except ClientError as error:
+        # Resuming from the end of the file
+        if error.response['Error']['Code'] == 'InvalidRange':
+            return iter([])
+        raise
+    chunks = (RangeLines(chunk) for chunk in response['Body'].iter_chunks(STREAM_CHUNK_SIZE))
+    return join_ranges_with_offsets(chunks, start)
+
+
+def compression_of(filename, content_encoding=None):
+    """
+    Returns GZIP or ZSTD if the object is compressed, judging by its key's suffix or its Content-Encoding, or None.
+    """
+    for suffix, compression in __COMPRESSION_SUFFIXES.items():
+        if filename.lower().endswith(suffix):
+            return compression
+    if content_encoding:
+        return __COMPRESSION_ENCODINGS.get(content_encoding.strip().lower())
+    return None
+
+
+def fetch_compressed_import_file(bucket_name, filename, compression):
+    """
+    Streams and decompresses an S3 object, yielding (line, None) pairs: offsets into a compressed stream cannot be
+    resumed from, so these files are always read from the start.
+    """
+    s3_client = aws_client('s3')
+    body = s3_client.get_object(Bucket=bucket_name, Key=filename)['Body']
+    if compression == ZSTD:
+        # Only needed for zstd compressed files
+        import zstandard
+        stream = zstandard.ZstdDecompressor().stream_reader(body, read_across_frames=True)
+    else:
+        stream = gzip.GzipFile(fileobj=body, mode='rb')
+
+    chunks = (RangeLines(chunk) for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b''))
+    for line, _ in join_ranges_with_offsets(chunks):
+        yield line, None
+
+
+def fetch_import_file_in_ranges(bucket_name, filename, size=None, range_size=DEFAULT_RANGE_SIZE,
+                                workers=DEFAULT_WORKERS, ordered=True, start=0):
+    """
+    Yields the lines of an S3 object from byte start, fetching up to workers byte ranges at once. In order, they are
+    yielded as (line, offset) pairs as join_ranges_with_offsets does. With ordered=False the complete lines of each
+    range are yielded, without offsets, as soon as it arrives, and the lines crossing range boundaries at the end. No
+    more than two ranges per worker are held in memory either way.
+    """
+    s3_client = aws_client('s3')
+    if size is None:
+        size = s3_client.head_object(Bucket=bucket_name, Key=filename)['ContentLength']
+
+    def fetch(byte_range):
+        response = s3_client.get_object(Bucket=bucket_name, Key=filename, Range='bytes={}-{}'.format(*byte_range))
+        return RangeLines(response['Body'].read())
+
+    ranges = byte_ranges(size, range_size, start)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if ordered:
+            yield from join_ranges_with_offsets(__fetch_in_order(executor, fetch, ranges, workers * 2), start)
+        else:
+            yield from __fetch_out_of_order(executor, fetch, ranges, workers * 2)
+
+
+def __fetch_in_order(executor, fetch, ranges, window):
+    futures = [executor.submit(fetch, byte_range) for byte_range in ranges[:window]]
+    for index in range(len(ranges)):
+        if index + window < len(ranges):
+            futures.append(executor.submit(fetch, ranges[index + window]))
+        yield futures[index].result()
+        futures[index] = None
+
+
+def __fetch_out_of_order(executor, fetch, ranges, window):
+    fetched = [None] * len(ranges)
+    in_flight = {}
+    next_range = 0
+    while next_range < len(ranges) or in_flight:
+        while next_range < len(ranges) and len(in_flight) < window:
+            in_flight[executor.submit(fetch, ranges[next_range])] = next_range
+            next_range += 1
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            range_lines = future.result()
+            for line in range_lines.lines:
+                yield __strip_carriage_return(line)
+            # Only the boundary pieces are kept until the end
+            range_lines.lines = []
+            fetched[in_flight.pop(future)] = range_lines
+    yield from join_ranges(fetched)
@@ -0,0 +1,93 @@
+import random
+import time
+
+from psycopg2 import Error, OperationalError, InterfaceError
+
+# SQLSTATE classes and codes worth retrying: the connection went away, the server is restarting or failing over, or
+# the transaction lost a race that will usually succeed when run again
+TRANSIENT_SQLSTATE_CLASSES = ['08']
+TRANSIENT_SQLSTATES = [
+    '40001',  # serialization_failure
+    '40P01',  # deadlock_detected
+    '53300',  # too_many_connections
+    '55P03',  # lock_not_available
+    '57P01',  # admin_shutdown
+    '57P02',  # crash_shutdown
+    '57P03',  # cannot_connect_now
+]
+# Of the transient errors, those that leave the connection unusable
+CONNECTION_SQLSTATES = ['57P01', '57P02', '57P03']
+
+# invalid_authorization_specification and invalid_password, e.g. an expired or revoked IAM token
+AUTHENTICATION_SQLSTATE_CLASS = '28'
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY_SECONDS = 0.1
+DEFAULT_MAX_DELAY_SECONDS = 2
+DEFAULT_TIME_BUDGET_SECONDS = 10
+
+
+def is_transient(error):
+    if not isinstance(error, Error):
+        return False
+    if error.pgcode is None:
+        # Raised by the client rather than the server, e.g. "server closed the connection unexpectedly"
+        return isinstance(error, (OperationalError, InterfaceError))
+    return error.pgcode[:2] in TRANSIENT_SQLSTATE_CLASSES or error.pgcode in TRANSIENT_SQLSTATES
+
+
+def needs_reconnect(error):
+    return error.pgcode is None or error.pgcode[:2] in TRANSIENT_SQLSTATE_CLASSES \
+        or error.pgcode in CONNECTION_SQLSTATES
+
+
+def is_authentication_failure(error):
+    if not isinstance(error, OperationalError):
+        return False
+    if error.pgcode is None:
+        # Errors while connecting carry no SQLSTATE, only the server's message
+        return 'authentication failed' in str(error)
+    return error.pgcode[:2] == AUTHENTICATION_SQLSTATE_CLASS
+
+
+class RetryPolicy:
+    """
+    Retries an operation that fails with a transient database error, with exponential backoff and full jitter, until
+    it succeeds, fails with a permanent error, has been attempted max_attempts times or would overrun time_budget.
+    The last error is raised if the operation never succeeds. is_transient decides which errors are worth retrying.
+    """
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay_seconds=DEFAULT_BASE_DELAY_SECONDS,
+                 max_delay_seconds=DEFAULT_MAX_DELAY_SECONDS, time_budget_seconds=DEFAULT_TIME_BUDGET_SECONDS,
+                 sleep=time.sleep, jitter=random.random, is_transient=is_transient):
+        self.max_attempts = max_attempts
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.time_budget_seconds = time_budget_seconds
+        self.__sleep = sleep
+        self.__jitter = jitter
+        self.__is_transient = is_transient
+
+    def run(self, operation, on_retry=None):
+        """
+        Calls operation(attempt), with attempt counting from 1. on_retry, if given, is called with the error and the
+        delay before each retry.
+        """
+        start = time.monotonic()
+        attempt = 1
+        while True:
+            try:
+                return operation(attempt)
+            except Exception as error:
+                if not self.__is_transient(error) or attempt >= self.max_attempts:
+                    raise
+                delay = self.delay(attempt)
+                if time.monotonic() - start + delay > self.time_budget_seconds:
+                    raise
+                if on_retry:
+                    on_retry(error, delay)
+                self.__sleep(delay)
+                attempt += 1
+
+    def delay(self, attempt):
+        return self.__jitter() * min(self.max_delay_seconds, self.base_delay_seconds * 2 ** (attempt - 1))
@@ -1,11 +1,12 @@
+import io
 import os
 import tempfile
 
-import boto3
+from src.aws_client import aws_client
 
 
 def fetch_decryption_key():
-    s3_client = boto3.client('s3')
+    s3_client = aws_client('s3')
     bucket_name = os.environ['DECRYPTION_KEY_BUCKET_NAME']
     filename = os.environ['DECRYPTION_KEY_FILE_NAME']
     response = s3_client.get_object(Bucket=bucket_name, Key=filename)
@@ -13,13 +14,33 @@ def fetch_decryption_key():
 
 
 def fetch_import_file(bucket_name, filename):
-    s3_client = boto3.client('s3')
+    s3_client = aws_client('s3')
     response = s3_client.get_object(Bucket=bucket_name, Key=filename)
     return response['Body'].iter_lines()
 
 
+def fetch_object_metadata(bucket_name, filename):
+    s3_client = aws_client('s3')
+    return s3_client.head_object(Bucket=bucket_name, Key=filename)
+
+
+def open_import_file(bucket_name, filename):
+    """
+    Returns a binary file that streams the object from S3, so that it can be read while it downloads.
+    """
+    s3_client = aws_client('s3')
+    response = s3_client.get_object(Bucket=bucket_name, Key=filename)
+    return io.BufferedReader(__StreamingBodyReader(response['Body']))
+
+
+def read_import_file(bucket_name, filename):
+    s3_client = aws_client('s3')
+    response = s3_client.get_object(Bucket=bucket_name, Key=filename)
+    return response['Body'].read()
+
+
 def download_import_file(bucket_name, filename):
-    s3_client = boto3.client('s3')
+    s3_client = aws_client('s3')
     fd, temp_file_name = tempfile.mkstemp()
     with open(temp_file_name, 'wb') as data:
         s3_client.download_fileobj(bucket_name, filename, data)
@@ -28,19 +49,24 @@ def download_import_file(bucket_name, filename):
     return temp_file_name
 
 
+def put_object(bucket_name, key, body):
+    s3_client = aws_client('s3')
+    s3_client.put_object(Bucket=bucket_name, Key=key, Body=body, ServerSideEncryption='AES256')
+
+
 def delete_import_file(bucket_name, filename):
-    s3_client = boto3.client('s3')
+    s3_client = aws_client('s3')
     s3_client.delete_object(Bucket=bucket_name, Key=filename)
 
 
 def fetch_object_tags(bucket_name, filename):
-    s3_client = boto3.client('s3')
+    s3_client = aws_client('s3')
     response = s3_client.get_object_tagging(Bucket=bucket_name, Key=filename)
     return {tag['Key']: tag['Value'] for tag in response['TagSet']}
 
 
 def move_file(bucket_name, filename, new_prefix):
-    s3_client = boto3.client('s3')
+    s3_client = aws_client('s3')
     new_filename = os.path.basename(filename)
 
     s3_client.copy_object(Bucket=bucket_name,
@@ -49,3 +75,24 @@ def move_file(bucket_name, filename, new_prefix):
                           TaggingDirective="COPY",
                           ServerSideEncryption="AES256")
     s3_client.delete_object(Bucket=bucket_name, Key=filename)
+
+
+class __StreamingBodyReader(io.RawIOBase):
+    """
+    Adapts a botocore StreamingBody, which only has read, to the raw file interface io.BufferedReader expects.
+    """
+
+    def __init__(self, body):
+        self.__body = body
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.__body.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.__body.close()
+        super().close()
@@ -1,11 +1,15 @@
-def fetch_single_message(sqs_client, queue_url):
+# SQS will not return more than 10 messages from a single receive
+MAX_MESSAGES_PER_RECEIVE = 10
+
+
+def fetch_messages(sqs_client, queue_url, max_messages=MAX_MESSAGES_PER_RECEIVE):
     response = sqs_client.receive_message(
         QueueUrl=queue_url,
-        MaxNumberOfMessages=1,
+        MaxNumberOfMessages=max_messages,
         VisibilityTimeout=300,  # 5 min timeout - any failed messages can be picked up by a later lambda
         WaitTimeSeconds=0,  # Don't wait for messages - if there aren't any left, then this lambda's job is done
     )
-    return response['Messages'][0] if 'Messages' in response and response['Messages'] else None
+    return response.get('Messages', [])
 
 
 def delete_message(sqs_client, queue_url, message):
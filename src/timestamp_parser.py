@@ -0,0 +1,137 @@
+import re
+from datetime import datetime, timedelta, timezone as fixed_timezone
+
+import dateparser
+import pytz
+
+# Timestamps parsed with dateparser before a file's format is chosen
+DETECTION_ROWS = 10
+# Distinct timestamps remembered once the format is chosen; uploads are often sorted by time, with many rows to a minute
+CACHE_SIZE = 4096
+
+ISO_8601 = 'ISO 8601'
+ISO_8601_PATTERN = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?(Z|[+-]\d{2}:?\d{2})?$'
+)
+# Like dateparser, slashed dates are read month first unless that is not a valid date
+STRPTIME_FORMATS = [
+    ('%m/%d/%Y %H:%M', '%d/%m/%Y %H:%M'),
+    ('%m/%d/%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S'),
+    ('%m/%d/%Y', '%d/%m/%Y'),
+    ('%Y-%m-%d',),
+]
+
+
+class TimestampParser(object):
+    """
+    Parses the timestamps of one upload as dateparser would, but without its per-value language detection. The first
+    DETECTION_ROWS values are parsed with dateparser, and the first fast format that agrees with dateparser on every
+    one of them is used for the rest of the file. Values that format cannot parse fall back to dateparser and are
+    counted in fallback_count. After that, each distinct value is only parsed once, for up to CACHE_SIZE values at a
+    time.
+    """
+
+    def __init__(self, timezone):
+        self.timezone = timezone
+        self.format = None
+        self.parsed_count = 0
+        self.fallback_count = 0
+        self.__fast_parse = None
+        self.__samples = []
+        self.__cache = {}
+
+    def parse(self, value):
+        self.parsed_count += 1
+        if self.format is None:
+            parsed = self.__dateparser_parse(value)
+            self.__samples.append((value, parsed))
+            if len(self.__samples) == DETECTION_ROWS:
+                self.__detect_format()
+            return parsed
+
+        cached = self.__cache.get(value)
+        if cached is None:
+            if len(self.__cache) >= CACHE_SIZE:
+                self.__cache.clear()
+            cached = self.__cache[value] = self.__parse_with_format(value)
+        parsed, fell_back = cached
+        if fell_back:
+            self.fallback_count += 1
+        return parsed
+
+    def parse_repeated(self, value, occurrences):
+        """
+        Parses value once, counting it as parse would count occurrences calls with it. Only for once the format is
+        chosen, after which every occurrence of a value parses the same way.
+        """
+        fallback_count = self.fallback_count
+        parsed = self.parse(value)
+        self.parsed_count += occurrences - 1
+        self.fallback_count += (self.fallback_count - fallback_count) * (occurrences - 1)
+        return parsed
+
+    def __parse_with_format(self, value):
+        """
+        Returns the parsed value and whether it had to fall back to dateparser.
+        """
+        if self.__fast_parse:
+            try:
+                return self.__fast_parse(value), False
+            except ValueError:
+                pass
+        return self.__dateparser_parse(value), True
+
+    def __dateparser_parse(self, value):
+        return dateparser.parse(value, settings={'TIMEZONE': self.timezone})
+
+    def __detect_format(self):
+        candidates = [(ISO_8601, self.__parse_iso_8601)] + [
+            (' or '.join(date_formats), self.__strptime_parser(date_formats)) for date_formats in STRPTIME_FORMATS
+        ]
+        for date_format, fast_parse in candidates:
+            if all(self.__agrees(fast_parse, value, expected) for value, expected in self.__samples):
+                self.format = date_format
+                self.__fast_parse = fast_parse
+                break
+        else:
+            self.format = ''
+        self.__samples = []
+
+    @staticmethod
+    def __agrees(fast_parse, value, expected):
+        try:
+            parsed = fast_parse(value)
+        except ValueError:
+            return False
+        return expected is not None and parsed == expected and parsed.utcoffset() == expected.utcoffset()
+
+    @staticmethod
+    def __strptime_parser(date_formats):
+        def parse(value):
+            for date_format in date_formats[:-1]:
+                try:
+                    return datetime.strptime(value.strip(), date_format)
+                except ValueError:
+                    pass
+            return datetime.strptime(value.strip(), date_formats[-1])
+        return parse
+
+    def __parse_iso_8601(self, value):
+        match = ISO_8601_PATTERN.match(value.strip())
+        if not match:
+            raise ValueError('"{}" is not an ISO 8601 timestamp'.format(value))
+        year, month, day, hour, minute, second, fraction, offset = match.groups()
+        microsecond = int(fraction[:6].ljust(6, '0')) if fraction else 0
+        parsed = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), microsecond)
+        if offset is None:
+            return parsed
+        # dateparser converts timestamps with an offset to the upload's timezone
+        return parsed.replace(tzinfo=self.__fixed_offset(offset)).astimezone(pytz.timezone(self.timezone))
+
+    @staticmethod
+    def __fixed_offset(offset):
+        if offset == 'Z':
+            return fixed_timezone.utc
+        sign = -1 if offset[0] == '-' else 1
+        digits = offset[1:].replace(':', '')
+        return fixed_timezone(sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:])))
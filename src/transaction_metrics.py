@@ -0,0 +1,147 @@
+import bisect
+import threading
+from logging import getLogger
+
+# Upper bounds, in seconds, of the latency histogram buckets; anything slower falls in a final overflow bucket
+LATENCY_BUCKET_BOUNDS = [0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+class LatencyHistogram:
+    def __init__(self, bounds=LATENCY_BUCKET_BOUNDS):
+        self.bounds = bounds
+        self.bucket_counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds):
+        self.bucket_counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def percentile(self, percent):
+        """
+        Returns the upper bound of the bucket holding the given percentile, or the slowest time recorded if that falls
+        in the overflow bucket.
+        """
+        if not self.count:
+            return 0.0
+        rank = self.count * percent / 100.0
+        seen = 0
+        for bound, bucket_count in zip(self.bounds, self.bucket_counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(bound, self.max_seconds)
+        return self.max_seconds
+
+
+class TransactionMetrics:
+    """
+    In-memory latency histograms for instrumented transactions. Statement times and rows affected are kept per
+    statement label, commit times and rollback counts per transaction label, and flush times and sizes per
+    write-behind buffer label. If slow_statement_seconds is set, any statement or commit slower than that is logged.
+    Safe to share between threads.
+    """
+
+    def __init__(self, slow_statement_seconds=None):
+        self.slow_statement_seconds = slow_statement_seconds
+        self.__lock = threading.Lock()
+        self.execute_latencies = {}
+        self.rows_affected = {}
+        self.commit_latencies = {}
+        self.rollback_counts = {}
+        self.attempt_counts = {}
+        self.retry_counts = {}
+        self.flush_latencies = {}
+        self.flushed_event_counts = {}
+        self.largest_flush_sizes = {}
+
+    def record_execute(self, label, seconds, rowcount):
+        with self.__lock:
+            self.__histogram(self.execute_latencies, label).record(seconds)
+            if rowcount > 0:
+                self.rows_affected[label] = self.rows_affected.get(label, 0) + rowcount
+        self.__log_if_slow('Slow statement', label, seconds)
+
+    def record_commit(self, label, seconds):
+        with self.__lock:
+            self.__histogram(self.commit_latencies, label).record(seconds)
+        self.__log_if_slow('Slow commit', label, seconds)
+
+    def record_rollback(self, label):
+        with self.__lock:
+            self.rollback_counts[label] = self.rollback_counts.get(label, 0) + 1
+
+    def record_attempt(self, label):
+        with self.__lock:
+            self.attempt_counts[label] = self.attempt_counts.get(label, 0) + 1
+
+    def record_retry(self, label):
+        with self.__lock:
+            self.retry_counts[label] = self.retry_counts.get(label, 0) + 1
+
+    def record_flush(self, label, size, seconds):
+        with self.__lock:
+            self.__histogram(self.flush_latencies, label).record(seconds)
+            self.flushed_event_counts[label] = self.flushed_event_counts.get(label, 0) + size
+            self.largest_flush_sizes[label] = max(self.largest_flush_sizes.get(label, 0), size)
+
+    def summary_lines(self):
+        with self.__lock:
+            return self.__summary_lines()
+
+    def __summary_lines(self):
+        lines = []
+        for label, histogram in sorted(self.execute_latencies.items()):
+            lines.append('{} execute: {}, {} rows'.format(
+                label, self.__describe(histogram), self.rows_affected.get(label, 0)))
+        for label, histogram in sorted(self.commit_latencies.items()):
+            lines.append('{} commit: {}, {} rollbacks'.format(
+                label, self.__describe(histogram), self.rollback_counts.get(label, 0)))
+        for label, attempts in sorted(self.attempt_counts.items()):
+            lines.append('{} operations: {} attempts, {} retried after a transient error'.format(
+                label, attempts, self.retry_counts.get(label, 0)))
+        for label, histogram in sorted(self.flush_latencies.items()):
+            lines.append('{} flush: {}, {} events, largest {}'.format(
+                label, self.__describe(histogram), self.flushed_event_counts[label], self.largest_flush_sizes[label]))
+        return lines
+
+    def log_summary(self):
+        for line in self.summary_lines():
+            getLogger('transaction-metrics').info(line)
+
+    def clear(self):
+        with self.__lock:
+            self.execute_latencies.clear()
+            self.rows_affected.clear()
+            self.commit_latencies.clear()
+            self.rollback_counts.clear()
+            self.attempt_counts.clear()
+            self.retry_counts.clear()
+            self.flush_latencies.clear()
+            self.flushed_event_counts.clear()
+            self.largest_flush_sizes.clear()
+
+    def __log_if_slow(self, description, label, seconds):
+        if self.slow_statement_seconds is not None and seconds >= self.slow_statement_seconds:
+            getLogger('transaction-metrics').warning('{} {} took {:.3f}s'.format(description, label, seconds))
+
+    @staticmethod
+    def __histogram(histograms, label):
+        if label not in histograms:
+            histograms[label] = LatencyHistogram()
+        return histograms[label]
+
+    @staticmethod
+    def __describe(histogram):
+        return '{} timed, p50 {:.3f}s, p95 {:.3f}s, max {:.3f}s, total {:.3f}s'.format(
+            histogram.count, histogram.percentile(50), histogram.percentile(95), histogram.max_seconds,
+            histogram.total_seconds)
+
+
+__transaction_metrics = TransactionMetrics()
+
+
+def get_transaction_metrics():
+    return __transaction_metrics
@@ -0,0 +1,83 @@
+from time import monotonic
+
+DEFAULT_LOG_INTERVAL_SECONDS = 30
+
+
+class UploadProgress(object):
+    """
+    Counts the rows of one upload as they are parsed and written, logging progress at most every
+    log_interval_seconds and a summary at the end, instead of a line per row.
+
+    Callers take a start time from clock() and pass it back, so that timings only come from this module's clock. Rows
+    written, and rows parsed_in_transaction(), are only counted once their transaction has committed(), so that a
+    retried transaction does not count its rows twice. If it failed() instead, the rows it parsed are still counted.
+    """
+
+    def __init__(self, upload_session, logger, log_interval_seconds=DEFAULT_LOG_INTERVAL_SECONDS):
+        self.__upload_session = upload_session
+        self.__logger = logger
+        self.__log_interval_seconds = log_interval_seconds
+        self.__last_logged = monotonic()
+        self.rows_parsed = 0
+        self.rows_written = 0
+        self.contraindicators_upserted = 0
+        self.parse_seconds = 0.0
+        self.write_seconds = 0.0
+        self.__uncommitted_parsed_rows = 0
+        self.__uncommitted_rows = 0
+        self.__uncommitted_contraindicators = 0
+
+    @staticmethod
+    def clock():
+        return monotonic()
+
+    def parsed(self, row_count, since):
+        self.rows_parsed += row_count
+        self.parse_seconds += monotonic() - since
+
+    def parsed_in_transaction(self, row_count, since):
+        self.__uncommitted_parsed_rows += row_count
+        self.parse_seconds += monotonic() - since
+
+    def wrote(self, row_count, contraindicator_count, since):
+        self.__uncommitted_rows += row_count
+        self.__uncommitted_contraindicators += contraindicator_count
+        self.write_seconds += monotonic() - since
+
+    def committed(self):
+        self.rows_parsed += self.__uncommitted_parsed_rows
+        self.rows_written += self.__uncommitted_rows
+        self.contraindicators_upserted += self.__uncommitted_contraindicators
+        self.rolled_back()
+
+    def failed(self):
+        self.rows_parsed += self.__uncommitted_parsed_rows
+        self.rolled_back()
+
+    def rolled_back(self):
+        self.__uncommitted_parsed_rows = 0
+        self.__uncommitted_rows = 0
+        self.__uncommitted_contraindicators = 0
+
+    def log_if_due(self):
+        if monotonic() - self.__last_logged >= self.__log_interval_seconds:
+            self.__logger.info('Progress of upload session {}: {}'.format(self.__upload_session.id, self))
+            self.__last_logged = monotonic()
+
+    def log_summary(self):
+        self.__logger.info('Processed upload session {}: {}'.format(self.__upload_session.id, self))
+
+    @property
+    def summary(self):
+        return {
+            'rows_parsed': self.rows_parsed,
+            'rows_written': self.rows_written,
+            'contraindicators_upserted': self.contraindicators_upserted,
+            'parse_seconds': round(self.parse_seconds, 3),
+            'write_seconds': round(self.write_seconds, 3),
+        }
+
+    def __str__(self):
+        return 'parsed {} rows in {:.2f}s, wrote {} rows and {} contraindicators in {:.2f}s'.format(
+            self.rows_parsed, self.parse_seconds, self.rows_written, self.contraindicators_upserted,
+            self.write_seconds)
@@ -0,0 +1,49 @@
+from src.database import write_upload_errors
+
+DEFAULT_MAX_ERRORS = 1000
+SUMMARY_FIELD = '**Summary**'
+
+
+class ValidationErrorCollector:
+    """
+    Buffers the validation failures for an upload session so they can be written together in one multi-row insert.
+    Only the first max_errors are kept; any beyond that are stored as a single summary row instead.
+    """
+
+    def __init__(self, upload_session, max_errors=DEFAULT_MAX_ERRORS):
+        self.__upload_session = upload_session
+        self.__max_errors = max_errors
+        self.__errors = []
+        self.__omitted_count = 0
+        self.__first_omitted_row = None
+
+    def __len__(self):
+        return len(self.__errors) + self.__omitted_count
+
+    def add(self, row, field, message):
+        if len(self.__errors) < self.__max_errors:
+            self.__errors.append((self.__upload_session.id, row, field, message))
+            return
+        if not self.__omitted_count:
+            self.__first_omitted_row = row
+        self.__omitted_count += 1
+
+    @property
+    def rows(self):
+        rows = list(self.__errors)
+        if self.__omitted_count:
+            rows.append((
+                self.__upload_session.id,
+                self.__first_omitted_row,
+                SUMMARY_FIELD,
+                '{} further validation errors from line {} onwards were not stored'.format(
+                    self.__omitted_count, self.__first_omitted_row)
+            ))
+        return rows
+
+    def write(self, db_connection):
+        # Only cleared once written, so that a retried write stores them all again
+        write_upload_errors(self.rows, db_connection)
+        self.__errors = []
+        self.__omitted_count = 0
+        self.__first_omitted_row = None
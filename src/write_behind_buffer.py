@@ -0,0 +1,85 @@
+import time
+
+from src.database import is_billing_event, is_fraud_event
+from src.event_write_outcome import EventWriteOutcome
+from src.transaction_metrics import get_transaction_metrics
+
+# Every flush is committed with synchronous_commit on
+DURABLE = 'durable'
+# Events that only produce an audit row are committed with synchronous_commit off; billing and fraud events are not
+RELAXED_AUDIT = 'relaxed-audit'
+DURABILITY_MODES = [DURABLE, RELAXED_AUDIT]
+
+DEFAULT_MAX_SIZE = 100
+DEFAULT_MAX_AGE_SECONDS = 5
+
+
+class WriteBehindBuffer:
+    """
+    Collects events and writes them in one group commit once max_size events are waiting or the oldest has waited
+    max_age_seconds. Each event's callback is only called, with its EventWriteOutcome, once the flush has committed,
+    so messages should be acknowledged from the callback and never before.
+
+    write_events is called as write_events(events, synchronous_commit) and must return one outcome per event. The size
+    and time of each flush are recorded under label in metrics, the shared TransactionMetrics by default.
+    """
+
+    def __init__(self, write_events, max_size=DEFAULT_MAX_SIZE, max_age_seconds=DEFAULT_MAX_AGE_SECONDS,
+                 durability=DURABLE, label='write_behind', metrics=None):
+        if durability not in DURABILITY_MODES:
+            raise ValueError('Unknown durability mode "{0}"'.format(durability))
+        self.__write_events = write_events
+        self.__max_size = max_size
+        self.__max_age_seconds = max_age_seconds
+        self.__durability = durability
+        self.__pending = []
+        self.__oldest_pending_time = None
+        self.__label = label
+        self.__metrics = metrics if metrics else get_transaction_metrics()
+
+    def __len__(self):
+        return len(self.__pending)
+
+    def add(self, event, on_written):
+        if not self.__pending:
+            self.__oldest_pending_time = time.monotonic()
+        self.__pending.append((event, on_written))
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        if not self.__pending:
+            return
+        if (len(self.__pending) >= self.__max_size
+                or time.monotonic() - self.__oldest_pending_time >= self.__max_age_seconds):
+            self.flush()
+
+    def flush(self):
+        pending, self.__pending = self.__pending, []
+        if not pending:
+            return
+
+        start = time.monotonic()
+        if self.__durability == RELAXED_AUDIT:
+            audit_only = [entry for entry in pending if not self.__has_derived_row(entry[0])]
+            with_derived = [entry for entry in pending if self.__has_derived_row(entry[0])]
+            outcomes = self.__write(audit_only, False) + self.__write(with_derived, True)
+            pending = audit_only + with_derived
+        else:
+            outcomes = self.__write(pending, True)
+        self.__metrics.record_flush(self.__label, len(pending), time.monotonic() - start)
+
+        for (_, on_written), outcome in zip(pending, outcomes):
+            on_written(outcome)
+
+    def __write(self, entries, synchronous_commit):
+        if not entries:
+            return []
+        events = [event for event, _ in entries]
+        try:
+            return self.__write_events(events, synchronous_commit)
+        except Exception as exception:
+            return [EventWriteOutcome(event, error=exception) for event in events]
+
+    @staticmethod
+    def __has_derived_row(event):
+        return is_billing_event(event) or is_fraud_event(event)
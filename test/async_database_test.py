@@ -0,0 +1,94 @@
+from unittest import TestCase
+
+import asyncpg
+import psycopg2
+from retrying import retry
+
+from src.async_database import AsyncEventWriter, is_transient, needs_reconnect
+from src.database import RunInTransaction
+from src.event import Event
+from src.event_mapper import event_from_json
+from src.event_write_outcome import AUDIT_EVENTS_TABLE, BILLING_EVENTS_TABLE, STORED
+from src.transaction_metrics import get_transaction_metrics
+from test.helpers import clean_db, create_event_string, create_fraud_event_string
+
+
+class AsyncDatabaseTest(TestCase):
+    db_connection = None
+    db_connection_string = "host='event-store' dbname='events' user='postgres'"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.connect()
+
+    @classmethod
+    @retry(stop_max_attempt_number=5, wait_fixed=500)
+    def connect(cls):
+        cls.db_connection = psycopg2.connect(cls.db_connection_string)
+
+    def setUp(self):
+        self.writer = AsyncEventWriter(self.db_connection_string, None)
+
+    def tearDown(self):
+        self.writer.close()
+        clean_db(self.db_connection)
+
+    def test_pipelines_a_batch_of_events(self):
+        events = [
+            event_from_json(create_event_string('sample-id-1', 'session-id-1')),
+            event_from_json(create_fraud_event_string('sample-id-2', 'session-id-2', 'fraud-event-id-1')),
+        ]
+
+        outcomes = self.writer.write_events(events)
+
+        self.assertTrue(all(outcome.succeeded for outcome in outcomes))
+        self.assertEqual(outcomes[0].tables, {AUDIT_EVENTS_TABLE: STORED, BILLING_EVENTS_TABLE: STORED})
+        self.assertEqual(self.__count('audit.audit_events'), 2)
+        self.assertEqual(self.__count('billing.billing_events'), 1)
+        self.assertEqual(self.__count('billing.fraud_events'), 1)
+
+    def test_counts_the_rows_each_statement_inserted(self):
+        metrics = get_transaction_metrics()
+        metrics.clear()
+        events = [event_from_json(create_event_string('sample-id-1', 'session-id-1'))]
+
+        self.writer.write_events(events)
+        self.writer.write_events(events)
+
+        self.assertEqual(metrics.rows_affected, {
+            'write_events.insert_audit_and_billing_event_if_new': 2,
+            'write_events.inserted_rows': 2,
+        })
+
+    def test_isolates_bad_rows_when_a_batch_fails(self):
+        events = [
+            event_from_json(create_event_string('sample-id-1', 'session-id-1')),
+            Event(None, 1518264452000, 'session_event', 'test service', 'session-id-2', {}),
+        ]
+
+        outcomes = self.writer.write_events(events)
+
+        self.assertEqual([outcome.succeeded for outcome in outcomes], [True, False])
+        self.assertEqual(self.__count('audit.audit_events'), 1)
+
+    def __count(self, table):
+        with RunInTransaction(self.db_connection) as cursor:
+            cursor.execute('SELECT count(*) FROM {}'.format(table))
+            return cursor.fetchone()[0]
+
+
+class AsyncErrorClassificationTest(TestCase):
+
+    def test_classifies_asyncpg_errors_by_sqlstate(self):
+        self.assertTrue(is_transient(asyncpg.DeadlockDetectedError()))
+        self.assertTrue(is_transient(asyncpg.AdminShutdownError()))
+        self.assertTrue(is_transient(asyncpg.ConnectionDoesNotExistError()))
+        self.assertTrue(is_transient(ConnectionResetError()))
+        self.assertFalse(is_transient(asyncpg.UniqueViolationError()))
+        self.assertFalse(is_transient(KeyError('pid')))
+
+    def test_only_connection_errors_need_a_new_connection(self):
+        self.assertTrue(needs_reconnect(asyncpg.AdminShutdownError()))
+        self.assertTrue(needs_reconnect(asyncpg.ConnectionDoesNotExistError()))
+        self.assertTrue(needs_reconnect(ConnectionResetError()))
+        self.assertFalse(needs_reconnect(asyncpg.DeadlockDetectedError()))
@@ -0,0 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import patch
+
+from src.aws_client import aws_client
+from test.helpers import setup_stub_aws_config
+
+
+@patch('src.aws_client.boto3.session.Session')
+class AwsClientTest(TestCase):
+
+    def setUp(self):
+        setup_stub_aws_config()
+
+    def test_reuses_one_session_per_thread(self, session):
+        def create_clients():
+            aws_client('s3')
+            aws_client('s3')
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(create_clients).result()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(create_clients).result()
+
+        self.assertEqual(session.call_count, 2)
+        self.assertEqual(session.return_value.client.call_count, 4)
+        session.return_value.client.assert_called_with('s3')
@@ -0,0 +1,53 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from src import common
+from test.helpers import setup_stub_aws_config
+
+DSN = "host='event-store' dbname='events' user='postgres'"
+
+
+@patch('src.common.aws_client')
+class CommonTest(TestCase):
+
+    def setUp(self):
+        setup_stub_aws_config()
+        common.clear_iam_token_cache()
+
+    def test_reuses_iam_token_until_shortly_before_expiry(self, aws_client):
+        aws_client.return_value.generate_db_auth_token.side_effect = ['token-1', 'token-2']
+
+        with patch('src.common.time.time', return_value=1000):
+            first_token = common.get_database_password(DSN)
+        refresh_time = 1000 + common.IAM_TOKEN_LIFETIME_SECONDS - common.IAM_TOKEN_REFRESH_MARGIN_SECONDS
+        with patch('src.common.time.time', return_value=refresh_time - 1):
+            second_token = common.get_database_password(DSN)
+
+        self.assertEqual(first_token, 'token-1')
+        self.assertEqual(second_token, 'token-1')
+        aws_client.return_value.generate_db_auth_token.assert_called_once_with('event-store', 5432, 'postgres')
+
+    def test_generates_new_iam_token_once_cached_token_is_due_to_expire(self, aws_client):
+        aws_client.return_value.generate_db_auth_token.side_effect = ['token-1', 'token-2']
+
+        with patch('src.common.time.time', return_value=1000):
+            common.get_database_password(DSN)
+        refresh_time = 1000 + common.IAM_TOKEN_LIFETIME_SECONDS - common.IAM_TOKEN_REFRESH_MARGIN_SECONDS
+        with patch('src.common.time.time', return_value=refresh_time):
+            token = common.get_database_password(DSN)
+
+        self.assertEqual(token, 'token-2')
+
+    def test_generates_new_iam_token_once_cached_token_is_forgotten(self, aws_client):
+        aws_client.return_value.generate_db_auth_token.side_effect = ['token-1', 'token-2']
+
+        common.get_database_password(DSN)
+        common.forget_iam_token(DSN)
+
+        self.assertEqual(common.get_database_password(DSN), 'token-2')
+
+    def test_reads_a_flag_or_falls_back_to_its_default(self, _):
+        self.assertTrue(common.is_set('Yes'))
+        self.assertFalse(common.is_set('false', True))
+        self.assertFalse(common.is_set(None))
+        self.assertTrue(common.is_set(None, True))
@@ -0,0 +1,77 @@
+import threading
+from unittest import TestCase
+
+import psycopg2
+from retrying import retry
+
+from src.connection_pool import ConnectionPool
+from src.database import RunInTransaction
+from test.helpers import setup_stub_aws_config, DB_PASSWORD
+
+
+class ConnectionPoolTest(TestCase):
+    db_connection = None
+    db_connection_string = "host='event-store' dbname='events' user='postgres'"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.connect()
+
+    @classmethod
+    @retry(stop_max_attempt_number=5, wait_fixed=500)
+    def connect(cls):
+        cls.db_connection = psycopg2.connect(cls.db_connection_string)
+
+    def setUp(self):
+        setup_stub_aws_config()
+        self.pool = ConnectionPool(self.pool_dsn())
+
+    def tearDown(self):
+        self.pool.close_all()
+
+    def test_reuses_connection_within_a_thread(self):
+        self.assertIs(self.pool.get_connection(), self.pool.get_connection())
+
+    def test_gives_each_thread_its_own_connection(self):
+        connections = []
+        thread = threading.Thread(target=lambda: connections.append(self.pool.get_connection()))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(connections[0], self.pool.get_connection())
+
+    def test_replaces_closed_connection(self):
+        connection = self.pool.get_connection()
+        connection.close()
+
+        self.assertFalse(self.pool.get_connection().closed)
+
+    def test_replaces_idle_connection_that_fails_health_check(self):
+        pool = ConnectionPool(self.pool_dsn(), idle_check_seconds=0)
+        try:
+            connection = pool.get_connection()
+            self.__terminate_backend(connection)
+
+            self.assertIsNot(pool.get_connection(), connection)
+        finally:
+            pool.close_all()
+
+    def test_run_retries_on_fresh_connection_after_operational_error(self):
+        self.__terminate_backend(self.pool.get_connection())
+
+        result = self.pool.run(self.__select_one)
+
+        self.assertEqual(result, 1)
+
+    def pool_dsn(self):
+        return "{} password='{}'".format(self.db_connection_string, DB_PASSWORD)
+
+    @staticmethod
+    def __select_one(connection):
+        with RunInTransaction(connection) as cursor:
+            cursor.execute('SELECT 1')
+            return cursor.fetchone()[0]
+
+    def __terminate_backend(self, connection):
+        with RunInTransaction(self.db_connection) as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [connection.get_backend_pid()])
@@ -0,0 +1,140 @@
+from unittest import TestCase
+
+import psycopg2
+from retrying import retry
+
+from src.database import RunInTransaction, InstrumentedTransaction, write_events_to_database
+from src.event import Event
+from src.event_mapper import event_from_json
+from src.event_write_outcome import AUDIT_EVENTS_TABLE, BILLING_EVENTS_TABLE, FRAUD_EVENTS_TABLE, INSERTED, \
+    DUPLICATE, FAILED
+from src.prepared_statements import PreparedStatement
+from src.transaction_metrics import TransactionMetrics
+from test.helpers import TIMESTAMP, clean_db, create_event_string, create_fraud_event_string, \
+    create_billing_event_without_minimum_level_of_assurance_string
+
+
+class DatabaseTest(TestCase):
+    db_connection = None
+    db_connection_string = "host='event-store' dbname='events' user='postgres'"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.connect()
+
+    @classmethod
+    @retry(stop_max_attempt_number=5, wait_fixed=500)
+    def connect(cls):
+        cls.db_connection = psycopg2.connect(cls.db_connection_string)
+
+    def tearDown(self):
+        clean_db(self.db_connection)
+
+    def test_writes_audit_and_billing_rows_in_one_statement(self):
+        event = event_from_json(create_event_string('sample-id-1', 'session-id-1'))
+
+        outcome = self.__write_event(event)
+
+        self.assertTrue(outcome.succeeded)
+        self.assertEqual(outcome.tables, {AUDIT_EVENTS_TABLE: INSERTED, BILLING_EVENTS_TABLE: INSERTED})
+        self.assertEqual(self.__count('audit.audit_events', 'sample-id-1'), 1)
+        self.assertEqual(self.__count('billing.billing_events', 'sample-id-1'), 1)
+
+    def test_writes_audit_and_fraud_rows_in_one_statement(self):
+        event = event_from_json(create_fraud_event_string('sample-id-1', 'session-id-1', 'fraud-event-id-1'))
+
+        outcome = self.__write_event(event)
+
+        self.assertEqual(outcome.tables, {AUDIT_EVENTS_TABLE: INSERTED, FRAUD_EVENTS_TABLE: INSERTED})
+        self.assertEqual(self.__count('billing.fraud_events', 'sample-id-1'), 1)
+
+    def test_reports_both_rows_as_duplicates_when_event_already_exists(self):
+        event = event_from_json(create_event_string('sample-id-1', 'session-id-1'))
+        self.__write_event(event)
+
+        outcome = self.__write_event(event)
+
+        self.assertTrue(outcome.succeeded)
+        self.assertEqual(outcome.tables, {AUDIT_EVENTS_TABLE: DUPLICATE, BILLING_EVENTS_TABLE: DUPLICATE})
+        self.assertEqual(self.__count('billing.billing_events', 'sample-id-1'), 1)
+
+    def test_fills_in_a_missing_derived_row_when_audit_event_already_exists(self):
+        event = event_from_json(create_event_string('sample-id-1', 'session-id-1'))
+        self.__write_event(event)
+        with RunInTransaction(self.db_connection) as cursor:
+            cursor.execute("DELETE FROM billing.billing_events WHERE event_id = 'sample-id-1'")
+
+        outcome = self.__write_event(event)
+
+        self.assertTrue(outcome.succeeded)
+        self.assertEqual(outcome.tables, {AUDIT_EVENTS_TABLE: DUPLICATE, BILLING_EVENTS_TABLE: INSERTED})
+        self.assertEqual(self.__count('audit.audit_events', 'sample-id-1'), 1)
+        self.assertEqual(self.__count('billing.billing_events', 'sample-id-1'), 1)
+
+    def test_keeps_audit_row_and_reports_error_when_derived_row_is_incomplete(self):
+        event = event_from_json(
+            create_billing_event_without_minimum_level_of_assurance_string('sample-id-1', 'session-id-1'))
+
+        outcome = self.__write_event(event)
+
+        self.assertFalse(outcome.succeeded)
+        self.assertIsInstance(outcome.error, KeyError)
+        self.assertEqual(outcome.tables, {AUDIT_EVENTS_TABLE: INSERTED, BILLING_EVENTS_TABLE: FAILED})
+        self.assertEqual(self.__count('audit.audit_events', 'sample-id-1'), 1)
+        self.assertEqual(self.__count('billing.billing_events', 'sample-id-1'), 0)
+
+    def test_isolates_bad_rows_in_a_batch_and_commits_the_rest(self):
+        bad_event = Event('sample-id-2', 'not a timestamp', 'session_event', 'test service', 'session-id-2', {})
+        # Fails in the database rather than in Python, leaving the transaction aborted until the savepoint is restored
+        rejected_event = Event(None, TIMESTAMP, 'session_event', 'test service', 'session-id-4', {})
+        events = [
+            event_from_json(create_event_string('sample-id-1', 'session-id-1')),
+            bad_event,
+            rejected_event,
+            event_from_json(create_fraud_event_string('sample-id-3', 'session-id-3', 'fraud-event-id-1')),
+        ]
+
+        outcomes = write_events_to_database(events, self.db_connection)
+
+        self.assertEqual([outcome.succeeded for outcome in outcomes], [True, False, False, True])
+        self.assertIs(outcomes[1].event, bad_event)
+        self.assertIsInstance(outcomes[1].error, ValueError)
+        self.assertIs(outcomes[2].event, rejected_event)
+        self.assertIsInstance(outcomes[2].error, psycopg2.IntegrityError)
+        self.assertEqual(self.__count('audit.audit_events', 'sample-id-1'), 1)
+        self.assertEqual(self.__count('audit.audit_events', 'sample-id-2'), 0)
+        self.assertEqual(self.__count('billing.fraud_events', 'sample-id-3'), 1)
+
+    def test_instrumented_transaction_records_statements_commits_and_rollbacks(self):
+        metrics = TransactionMetrics()
+
+        with InstrumentedTransaction(self.db_connection, 'test', metrics) as cursor:
+            cursor.execute('SELECT 1')
+        with self.assertRaises(ZeroDivisionError):
+            with InstrumentedTransaction(self.db_connection, 'test', metrics) as cursor:
+                cursor.execute('SELECT 1')
+                raise ZeroDivisionError()
+
+        self.assertEqual(metrics.execute_latencies['test.SELECT'].count, 2)
+        self.assertEqual(metrics.rows_affected, {'test.SELECT': 2})
+        self.assertEqual(metrics.commit_latencies['test'].count, 1)
+        self.assertEqual(metrics.rollback_counts, {'test': 1})
+
+    def test_instrumented_transaction_labels_prepared_statements_by_name(self):
+        metrics = TransactionMetrics()
+        statement = PreparedStatement('select_parameter', 'SELECT %s')
+
+        with InstrumentedTransaction(self.db_connection, 'test', metrics) as cursor:
+            statement.execute(cursor, [1])
+            statement.execute(cursor, [2])
+
+        self.assertEqual(metrics.execute_latencies['test.PREPARE'].count, 1)
+        self.assertEqual(metrics.execute_latencies['test.select_parameter'].count, 2)
+
+    def __write_event(self, event):
+        return write_events_to_database([event], self.db_connection)[0]
+
+    def __count(self, table, event_id):
+        with RunInTransaction(self.db_connection) as cursor:
+            cursor.execute('SELECT count(*) FROM {} WHERE event_id = %s'.format(table), [event_id])
+            return cursor.fetchone()[0]
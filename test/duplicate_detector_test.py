@@ -0,0 +1,75 @@
+from unittest import TestCase
+
+from src.duplicate_detector import DuplicateDetector, DuplicateRowError, OFF, REJECT, MERGE, repeated_event_ids
+
+ROW = ['05/08/2019 11:54', '1111111', 'DF01', 'A04,D02', '-5', '_req1', '111.222.222.111', 'pid1']
+OTHER_ROW = ['07/08/2019 16:37', '2222222', 'DF01', 'Z01', '-5', '_req2', '222.111.111.222', 'pid2']
+CONFLICTING_ROW = ['05/08/2019 11:54', '1111111', 'DF01', 'A04', '-5', '_req3', '111.222.222.111', 'pid3']
+
+
+class DuplicateDetectorTest(TestCase):
+
+    def test_keeps_rows_with_different_event_ids(self):
+        duplicates = DuplicateDetector(REJECT)
+
+        self.assertTrue(duplicates.check(2, ROW))
+        self.assertTrue(duplicates.check(3, OTHER_ROW))
+
+    def test_keeps_every_row_when_off(self):
+        duplicates = DuplicateDetector(OFF)
+
+        self.assertTrue(duplicates.check(2, ROW))
+        self.assertTrue(duplicates.check(3, list(ROW)))
+
+    def test_rejects_a_repeated_row(self):
+        duplicates = DuplicateDetector(REJECT)
+        duplicates.check(2, ROW)
+
+        with self.assertRaisesRegex(DuplicateRowError, '^Row repeats line 2$') as context:
+            duplicates.check(3, list(ROW))
+        self.assertEqual(context.exception.row_number, 3)
+
+    def test_merges_a_repeated_row(self):
+        duplicates = DuplicateDetector(MERGE)
+        duplicates.check(2, ROW)
+
+        self.assertFalse(duplicates.check(3, list(ROW)))
+        self.assertFalse(duplicates.check(4, list(ROW)))
+        self.assertEqual(duplicates.merged_count, 2)
+
+    def test_rejects_a_conflicting_row_even_when_merging(self):
+        for policy in [REJECT, MERGE]:
+            duplicates = DuplicateDetector(policy)
+            duplicates.check(2, ROW)
+
+            with self.assertRaisesRegex(DuplicateRowError, '^Event ID "1111111" is also used on line 2$'):
+                duplicates.check(3, CONFLICTING_ROW)
+
+    def test_leaves_short_rows_to_validation(self):
+        duplicates = DuplicateDetector(REJECT)
+
+        self.assertTrue(duplicates.check(2, ['01/01/2019 11:00', '1111111']))
+        self.assertTrue(duplicates.check(3, ROW))
+
+    def test_refuses_an_unknown_policy(self):
+        with self.assertRaisesRegex(ValueError, 'Unknown duplicate policy "ignore"'):
+            DuplicateDetector('ignore')
+
+    def test_finds_repeated_event_ids_with_a_fixed_size_filter(self):
+        rows = [(2, ROW), (3, OTHER_ROW), (4, CONFLICTING_ROW), (5, ['01/01/2019 11:00', '2222222'])]
+        many_rows = [(row_number, [ROW[0], str(row_number)] + ROW[2:]) for row_number in range(6, 100)]
+
+        self.assertEqual(repeated_event_ids(rows), {'1111111'})
+        # A filter this small is soon full, so takes unique ids for repeats but never misses one
+        repeated = repeated_event_ids(rows + many_rows, filter_bits=8)
+        self.assertIn('1111111', repeated)
+        self.assertGreater(len(repeated), 1)
+
+    def test_only_tracks_the_repeated_event_ids_it_is_given(self):
+        duplicates = DuplicateDetector(REJECT, repeated_event_ids={'2222222'})
+
+        self.assertTrue(duplicates.check(2, ROW))
+        self.assertTrue(duplicates.check(3, CONFLICTING_ROW))
+        self.assertTrue(duplicates.check(4, OTHER_ROW))
+        with self.assertRaises(DuplicateRowError):
+            duplicates.check(5, list(OTHER_ROW))
@@ -152,9 +152,9 @@ class EventHandlerTest(TestCase):
                 ('event-recorder', 'INFO', 'Decrypted key successfully'),
                 ('event-recorder', 'INFO', 'Created connection to DB'),
                 ('event-recorder', 'INFO', 'Decrypted event with ID: sample-id-1'),
-                ('event-recorder', 'INFO', 'Stored audit event: sample-id-1'),
                 ('event-recorder', 'WARNING',
                     'Failed to store a billing event [Event ID sample-id-1] due to key error'),
+                ('event-recorder', 'INFO', 'Stored audit event: sample-id-1'),
                 ('event-recorder', 'ERROR',
                     'Failed to store event {0}, event type "{1}" from SQS message ID {2}'.format(
                         'sample-id-1', EVENT_TYPE, message_ids[0])),
@@ -182,8 +182,8 @@ class EventHandlerTest(TestCase):
                 ('event-recorder', 'INFO', 'Decrypted key successfully'),
                 ('event-recorder', 'INFO', 'Created connection to DB'),
                 ('event-recorder', 'INFO', 'Decrypted event with ID: sample-id-1'),
-                ('event-recorder', 'INFO', 'Stored audit event: sample-id-1'),
                 ('event-recorder', 'WARNING', 'Failed to store a fraud event [Event ID sample-id-1] due to key error'),
+                ('event-recorder', 'INFO', 'Stored audit event: sample-id-1'),
                 ('event-recorder', 'ERROR',
                     'Failed to store event {0}, event type "{1}" from SQS message ID {2}'.format(
                         'sample-id-1', EVENT_TYPE, message_ids[0])),
@@ -257,15 +257,15 @@ class EventHandlerTest(TestCase):
                 ('event-recorder', 'INFO', 'Decrypted key successfully'),
                 ('event-recorder', 'INFO', 'Created connection to DB'),
                 ('event-recorder', 'INFO', 'Decrypted event with ID: sample-id-1'),
-                ('event-recorder', 'INFO', 'Stored audit event: sample-id-1'),
-                ('event-recorder', 'INFO', 'Stored billing event: sample-id-1'),
-                ('event-recorder', 'INFO', 'Deleted event from queue with ID: sample-id-1'),
                 ('event-recorder', 'INFO', 'Decrypted event with ID: sample-id-1'),
                 ('event-recorder', 'WARNING',
                     'Failed to store an audit event. The Event ID sample-id-1 already exists in the database'),
-                ('event-recorder', 'INFO', 'Stored audit event: sample-id-1'),
                 ('event-recorder', 'WARNING',
                     'Failed to store a billing event. The Event ID sample-id-1 already exists in the database'),
+                ('event-recorder', 'INFO', 'Stored audit event: sample-id-1'),
+                ('event-recorder', 'INFO', 'Stored billing event: sample-id-1'),
+                ('event-recorder', 'INFO', 'Deleted event from queue with ID: sample-id-1'),
+                ('event-recorder', 'INFO', 'Stored audit event: sample-id-1'),
                 ('event-recorder', 'INFO', 'Stored billing event: sample-id-1'),
                 ('event-recorder', 'INFO', 'Deleted event from queue with ID: sample-id-1'),
                 ('event-recorder', 'INFO', 'Queue is empty - finishing after 2 events')
@@ -0,0 +1,97 @@
+import csv
+import io
+from functools import partial
+from unittest import TestCase
+
+from src.idp_fraud_columns import parse_columns
+from src.idp_fraud_data_handler import parse_line, DEFAULT_TIMEZONE
+from src.idp_fraud_validation import validate_rows, validate_parsed_rows
+from src.timestamp_parser import TimestampParser
+from test.helpers import IDP_ENTITY_ID
+
+# The rows written by the IDP fraud data handler tests, and their error rows
+UPLOAD = '\n'.join([
+    '"05/08/2019 11:54","1111111","DF01","A04,D02",-5,"_req1","111.222.222.111","pid1"',
+    '"07/08/2019 16:37","2222222","DF01","Z01,D15",-5,"_req2","222.111.111.222","pid2"',
+    '"10/08/2019 09:24","3333333","DF01","A01,A05,V03,A05,A05,A05",-10,"_req3","111.111.111.111","pid3"',
+    '"23/08/2019 21:22","4444444","DF01","A01\nA02",-1,"_req4","111.111.111.111","pid4"',
+    '"05/08/2019 11:54","5555555","DF01","A01\r\nA02",-1,"_req5","111.111.111.111","pid5"',
+    '"07/08/2019 16:37","6666666","DF01","","","_req6","111.111.111.111","pid6"',
+    '"10/08/2019 09:24","7777777","DF01"," "," ","_req7","111.111.111.111","pid7"',
+])
+ERROR_ROWS = '\n'.join([
+    '"01/01/2019 11:00",,,',
+    '"01/01/2019 11:00","5555555","DF01","A01",not-a-score,"_req5555555","111.111.111.111","pid5555555"',
+    '"not a date","8888888","DF01","A01,",-1,"_req8","111.111.111.111","pid8"',
+])
+# Timestamps in the fixtures' format that are only day first, not zero padded, out of range, or not a date at all
+UNUSUAL_TIMESTAMPS = '\n'.join(
+    '"{}","9999999","DF01","A01",-1,"_req9","111.111.111.111","pid9"'.format(timestamp)
+    for timestamp in ['13/08/2019 11:54', '02/30/2019 10:00', '5/8/2019 11:54', ' 05/08/2019 11:54',
+                      '05/08/2019 24:00', '05/08/2019 11:54:00', '00/00/0000 00:00']
+)
+
+
+def numbered_rows(upload):
+    return list(enumerate(csv.reader(io.StringIO(upload, newline='')), 1))
+
+
+class IdpFraudColumnsTest(TestCase):
+
+    def test_parses_the_same_events_as_parse_line(self):
+        # Enough rows for the timestamp format to be chosen, and then for each distinct timestamp to repeat
+        rows = [row for _, row in numbered_rows('\n'.join([UPLOAD] * 4))]
+        row_timestamps = TimestampParser(DEFAULT_TIMEZONE)
+        column_timestamps = TimestampParser(DEFAULT_TIMEZONE)
+
+        events = parse_columns(rows, IDP_ENTITY_ID, column_timestamps)
+
+        self.assertEqual(
+            [vars(event) for event in events],
+            [vars(parse_line(row, IDP_ENTITY_ID, DEFAULT_TIMEZONE, row_timestamps)) for row in rows]
+        )
+        self.assertEqual(
+            (column_timestamps.format, column_timestamps.parsed_count, column_timestamps.fallback_count),
+            (row_timestamps.format, row_timestamps.parsed_count, row_timestamps.fallback_count)
+        )
+
+    def test_parses_unusual_timestamps_as_parse_line_does(self):
+        rows = [row for _, row in numbered_rows('\n'.join([UPLOAD, UPLOAD, UNUSUAL_TIMESTAMPS, UNUSUAL_TIMESTAMPS]))]
+        row_timestamps = TimestampParser(DEFAULT_TIMEZONE)
+        column_timestamps = TimestampParser(DEFAULT_TIMEZONE)
+
+        events = parse_columns(rows, IDP_ENTITY_ID, column_timestamps)
+
+        self.assertEqual(
+            [event.timestamp for event in events],
+            [parse_line(row, IDP_ENTITY_ID, DEFAULT_TIMEZONE, row_timestamps).timestamp for row in rows]
+        )
+        self.assertEqual(
+            (column_timestamps.parsed_count, column_timestamps.fallback_count),
+            (row_timestamps.parsed_count, row_timestamps.fallback_count)
+        )
+
+    def test_reports_the_same_errors_as_parse_line(self):
+        rows = numbered_rows('\n'.join([UPLOAD, ERROR_ROWS] * 3))
+
+        row_events, row_errors = validate_rows(
+            rows, partial(parse_line, idp_entity_id=IDP_ENTITY_ID, timezone=DEFAULT_TIMEZONE,
+                          timestamp_parser=TimestampParser(DEFAULT_TIMEZONE))
+        )
+        column_events, column_errors = validate_parsed_rows(
+            rows, parse_columns([row for _, row in rows], IDP_ENTITY_ID, TimestampParser(DEFAULT_TIMEZONE))
+        )
+
+        self.assertEqual(
+            [(row_number, vars(event)) for row_number, event in column_events],
+            [(row_number, vars(event)) for row_number, event in row_events]
+        )
+        self.assertEqual(column_errors, row_errors)
+
+    def test_does_not_parse_rows_with_too_few_fields(self):
+        rows = [row for _, row in numbered_rows(ERROR_ROWS)]
+
+        self.assertIsNone(parse_columns(rows, IDP_ENTITY_ID, TimestampParser(DEFAULT_TIMEZONE))[0])
+
+    def test_parses_an_empty_file(self):
+        self.assertEqual(parse_columns([], IDP_ENTITY_ID, TimestampParser(DEFAULT_TIMEZONE)), [])
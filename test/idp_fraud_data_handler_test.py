@@ -2,6 +2,7 @@ import os
 import urllib.parse
 import uuid
 from unittest import TestCase
+from unittest.mock import patch
 
 import boto3
 import dateparser
@@ -19,9 +20,14 @@ from test.helpers import IDP_ENTITY_ID, clean_db, file_exists_in_s3, setup_stub_
 
 UPLOAD_BUCKET_NAME = 's3-idp-fraud-data-bucket'
 UPLOAD_FILE_NAME = 'idp-data.csv'
+CHECKPOINT_FILE_NAME = 'recorder-checkpoints/' + UPLOAD_FILE_NAME + '.checkpoint'
 UPLOAD_USERNAME = 'my.user.name@example.com'
 
 
+class LambdaTimeout(BaseException):
+    pass
+
+
 @mock_s3
 @mock_kms
 class IdpFraudDataHandlerTest(TestCase):
@@ -48,8 +54,17 @@ class IdpFraudDataHandlerTest(TestCase):
 
     def tearDown(self):
         clean_db(self.db_connection)
-
-    def test_writes_messages_to_db(self):
+        os.environ.pop('IDP_FRAUD_BULK_LOAD', None)
+        os.environ.pop('IDP_FRAUD_STREAM_UPLOAD', None)
+        os.environ.pop('IDP_FRAUD_IN_MEMORY_MAX_BYTES', None)
+        os.environ.pop('IDP_FRAUD_VALIDATE_ALL', None)
+        os.environ.pop('IDP_FRAUD_PARSE_WORKERS', None)
+        os.environ.pop('IDP_FRAUD_COLUMNAR_PARSE', None)
+        os.environ.pop('IDP_FRAUD_CHUNK_ROWS', None)
+        os.environ.pop('IDP_FRAUD_DUPLICATE_POLICY', None)
+
+    @patch('src.upload_progress.monotonic', return_value=0)
+    def test_writes_messages_to_db(self, _):
         idp_fraud_events = self.__generate_test_idp_fraud_events()
 
         self.__write_import_file_to_s3(idp_fraud_events)
@@ -71,29 +86,9 @@ class IdpFraudDataHandlerTest(TestCase):
                 (
                     'idp_fraud_data_handler',
                     'INFO',
-                    'Successfully wrote IDP fraud event ID {} to database.'.format(
-                        idp_fraud_events[0].idp_event_id
-                    )
-                ),
-                (
-                    'idp_fraud_data_handler',
-                    'INFO',
-                    'Successfully wrote IDP fraud event ID {} to database.'.format(
-                        idp_fraud_events[1].idp_event_id
-                    )
-                ),
-                (
-                    'idp_fraud_data_handler',
-                    'INFO',
-                    'Successfully wrote IDP fraud event ID {} to database.'.format(
-                        idp_fraud_events[2].idp_event_id
-                    )
-                ),
-                (
-                    'idp_fraud_data_handler',
-                    'INFO',
-                    'Successfully wrote IDP fraud event ID {} to database.'.format(
-                        idp_fraud_events[3].idp_event_id
+                    'Processed upload session {}: {}'.format(
+                        self.__upload_session_id(),
+                        'parsed 4 rows in 0.00s, wrote 4 rows and 8 contraindicators in 0.00s'
                     )
                 ),
                 (
@@ -106,7 +101,8 @@ class IdpFraudDataHandlerTest(TestCase):
             self.__assert_events_exist_in_database(idp_fraud_events)
             self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.SUCCESS_FOLDER)
 
-    def test_writes_messages_to_db_and_increments_contra_indicator_count_correctly(self):
+    @patch('src.upload_progress.monotonic', return_value=0)
+    def test_writes_messages_to_db_and_increments_contra_indicator_count_correctly(self, _):
         idp_fraud_events = [
             IdpFraudEvent(
                 timestamp="05/08/2019 11:54",
@@ -162,22 +158,9 @@ class IdpFraudDataHandlerTest(TestCase):
                 (
                     'idp_fraud_data_handler',
                     'INFO',
-                    'Successfully wrote IDP fraud event ID {} to database.'.format(
-                        idp_fraud_events[0].idp_event_id
-                    )
-                ),
-                (
-                    'idp_fraud_data_handler',
-                    'INFO',
-                    'Successfully wrote IDP fraud event ID {} to database.'.format(
-                        idp_fraud_events[1].idp_event_id
-                    )
-                ),
-                (
-                    'idp_fraud_data_handler',
-                    'INFO',
-                    'Successfully wrote IDP fraud event ID {} to database.'.format(
-                        idp_fraud_events[2].idp_event_id
+                    'Processed upload session {}: {}'.format(
+                        self.__upload_session_id(),
+                        'parsed 3 rows in 0.00s, wrote 3 rows and 7 contraindicators in 0.00s'
                     )
                 ),
                 (
@@ -190,7 +173,8 @@ class IdpFraudDataHandlerTest(TestCase):
             self.__assert_events_exist_in_database(idp_fraud_events)
             self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.SUCCESS_FOLDER)
 
-    def test_invalid_data_causes_error(self):
+    @patch('src.upload_progress.monotonic', return_value=0)
+    def test_invalid_data_causes_error(self, _):
         idp_fraud_events = self.__generate_test_idp_fraud_events()
         self.__write_import_file_to_s3(idp_fraud_events, error_rows=[
             '"01/01/2019 11:00",,,'
@@ -212,37 +196,17 @@ class IdpFraudDataHandlerTest(TestCase):
                 ),
                 (
                     'idp_fraud_data_handler',
-                    'INFO',
-                    'Successfully wrote IDP fraud event ID {} to database.'.format(
-                        idp_fraud_events[0].idp_event_id
-                    )
-                ),
-                (
-                    'idp_fraud_data_handler',
-                    'INFO',
-                    'Successfully wrote IDP fraud event ID {} to database.'.format(
-                        idp_fraud_events[1].idp_event_id
-                    )
-                ),
-                (
-                    'idp_fraud_data_handler',
-                    'INFO',
-                    'Successfully wrote IDP fraud event ID {} to database.'.format(
-                        idp_fraud_events[2].idp_event_id
-                    )
+                    'ERROR',
+                    'Failed to store IDP fraud event: list index out of range (line 6)'
                 ),
                 (
                     'idp_fraud_data_handler',
                     'INFO',
-                    'Successfully wrote IDP fraud event ID {} to database.'.format(
-                        idp_fraud_events[3].idp_event_id
+                    'Processed upload session {}: {}'.format(
+                        self.__upload_session_id(),
+                        'parsed 4 rows in 0.00s, wrote 0 rows and 0 contraindicators in 0.00s'
                     )
                 ),
-                (
-                    'idp_fraud_data_handler',
-                    'ERROR',
-                    'Failed to store IDP fraud event: list index out of range (line 6)'
-                ),
                 (
                     'idp_fraud_data_handler',
                     'WARNING',
@@ -347,6 +311,432 @@ class IdpFraudDataHandlerTest(TestCase):
             self.__assert_events_exist_in_database(idp_fraud_events)
             self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.SUCCESS_FOLDER)
 
+    @patch('src.upload_progress.monotonic', return_value=0)
+    def test_bulk_load_writes_messages_to_db(self, _):
+        os.environ['IDP_FRAUD_BULK_LOAD'] = 'true'
+        idp_fraud_events = self.__generate_test_idp_fraud_events([
+            IdpFraudEvent(
+                timestamp="10/08/2019 09:24",
+                idp_event_id="5555555",
+                idp_entity_id=IDP_ENTITY_ID,
+                fid_code="DF01",
+                contra_indicators=["A01", "A05", "V03", "A05", "A05", "A05"],
+                contra_score=-10,
+                request_id="_{}".format(uuid.uuid4()),
+                client_ip_address="111.111.111.111",
+                pid=str(uuid.uuid4())
+            ),
+        ])
+
+        self.__write_import_file_to_s3(idp_fraud_events)
+
+        with LogCapture('idp_fraud_data_handler', propagate=False) as log_capture:
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            log_capture.check(
+                (
+                    'idp_fraud_data_handler',
+                    'INFO',
+                    'Created connection to DB'
+                ),
+                (
+                    'idp_fraud_data_handler',
+                    'INFO',
+                    'Processing data for IDP {}'.format(IDP_ENTITY_ID)
+                ),
+                (
+                    'idp_fraud_data_handler',
+                    'INFO',
+                    'Processed upload session {}: {}'.format(
+                        self.__upload_session_id(),
+                        'parsed 5 rows in 0.00s, wrote 5 rows and 11 contraindicators in 0.00s'
+                    )
+                ),
+                (
+                    'idp_fraud_data_handler',
+                    'INFO',
+                    'Processing successful'
+                )
+            )
+            self.__assert_upload_session_exists_in_database(True)
+            self.__assert_events_exist_in_database(idp_fraud_events)
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.SUCCESS_FOLDER)
+
+    def test_bulk_load_reports_the_row_that_failed_to_parse(self):
+        os.environ['IDP_FRAUD_BULK_LOAD'] = 'true'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events, error_rows=[
+            '"01/01/2019 11:00",,,'
+        ])
+
+        with LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.__assert_upload_session_exists_in_database(False)
+            self.__assert_no_events_exist_in_database(idp_fraud_events)
+            self.__assert_error_in_database_failure_table(
+                6,
+                '**Row Exception**',
+                'Failed to store IDP fraud event: list index out of range (line 6)'
+            )
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.ERROR_FOLDER)
+
+    @patch('src.upload_progress.monotonic', return_value=0)
+    def test_bulk_load_falls_back_to_row_by_row_to_report_the_row_the_database_rejected(self, _):
+        os.environ['IDP_FRAUD_BULK_LOAD'] = 'true'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events, error_rows=[
+            '"01/01/2019 11:00","5555555","DF01","A01",not-a-score,"_req5555555","111.111.111.111","pid5555555"'
+        ])
+
+        with LogCapture('idp_fraud_data_handler', propagate=False) as log_capture:
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.assertIn('WARNING', [record.levelname for record in log_capture.records])
+            self.assertIn('Processed upload session {}: {}'.format(
+                self.__upload_session_id(), 'parsed 5 rows in 0.00s, wrote 0 rows and 0 contraindicators in 0.00s'
+            ), [record.getMessage() for record in log_capture.records])
+            self.__assert_upload_session_exists_in_database(False)
+            self.__assert_no_events_exist_in_database(idp_fraud_events)
+            with RunInTransaction(self.db_connection) as cursor:
+                cursor.execute('SELECT row FROM idp_data.upload_session_validation_failures')
+                self.assertEqual(cursor.fetchall(), [(6,)])
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.ERROR_FOLDER)
+
+    @parameterized.expand([
+        ('in memory', '1048576'),
+        ('streamed', '0'),
+    ])
+    def test_stream_upload_writes_messages_to_db(self, _, in_memory_max_bytes):
+        os.environ['IDP_FRAUD_STREAM_UPLOAD'] = 'true'
+        os.environ['IDP_FRAUD_IN_MEMORY_MAX_BYTES'] = in_memory_max_bytes
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events, '\n')
+
+        with LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.__assert_upload_session_exists_in_database(True)
+            self.__assert_events_exist_in_database(idp_fraud_events)
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.SUCCESS_FOLDER)
+
+    def test_stream_upload_reports_the_row_that_failed(self):
+        os.environ['IDP_FRAUD_STREAM_UPLOAD'] = 'true'
+        os.environ['IDP_FRAUD_IN_MEMORY_MAX_BYTES'] = '0'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events, error_rows=[
+            '"01/01/2019 11:00",,,'
+        ])
+
+        with LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.__assert_upload_session_exists_in_database(False)
+            self.__assert_error_in_database_failure_table(
+                6,
+                '**Row Exception**',
+                'Failed to store IDP fraud event: list index out of range (line 6)'
+            )
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.ERROR_FOLDER)
+
+    def test_validate_all_writes_messages_to_db(self):
+        os.environ['IDP_FRAUD_VALIDATE_ALL'] = 'true'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events)
+
+        with LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.__assert_upload_session_exists_in_database(True)
+            self.__assert_events_exist_in_database(idp_fraud_events)
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.SUCCESS_FOLDER)
+
+    def test_validate_all_reports_every_invalid_row_and_writes_nothing(self):
+        os.environ['IDP_FRAUD_VALIDATE_ALL'] = 'true'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events, error_rows=[
+            '"01/01/2019 11:00",,,',
+            '"01/01/2019 11:00","5555555","DF01","A01",not-a-score,"_req5555555","111.111.111.111","pid5555555"'
+        ])
+
+        with LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.__assert_upload_session_exists_in_database(False)
+            self.__assert_no_events_exist_in_database(idp_fraud_events)
+            with RunInTransaction(self.db_connection) as cursor:
+                cursor.execute(
+                    'SELECT row, field, message FROM idp_data.upload_session_validation_failures ORDER BY row'
+                )
+                self.assertEqual(cursor.fetchall(), [
+                    (6, '**Row Exception**', 'Expected 8 fields but found 4'),
+                    (7, 'Contra Score', '"not-a-score" is not a whole number')
+                ])
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.ERROR_FOLDER)
+
+    def test_parse_workers_bulk_load_messages_to_db(self):
+        os.environ['IDP_FRAUD_BULK_LOAD'] = 'true'
+        os.environ['IDP_FRAUD_PARSE_WORKERS'] = '2'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events)
+
+        with LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.__assert_upload_session_exists_in_database(True)
+            self.__assert_events_exist_in_database(idp_fraud_events)
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.SUCCESS_FOLDER)
+
+    def test_parse_workers_validate_every_row(self):
+        os.environ['IDP_FRAUD_VALIDATE_ALL'] = 'true'
+        os.environ['IDP_FRAUD_PARSE_WORKERS'] = '2'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events, error_rows=[
+            '"01/01/2019 11:00",,,',
+            '"01/01/2019 11:00","5555555","DF01","A01",not-a-score,"_req5555555","111.111.111.111","pid5555555"'
+        ])
+
+        with LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.__assert_upload_session_exists_in_database(False)
+            self.__assert_no_events_exist_in_database(idp_fraud_events)
+            with RunInTransaction(self.db_connection) as cursor:
+                cursor.execute('SELECT row FROM idp_data.upload_session_validation_failures ORDER BY row')
+                self.assertEqual(cursor.fetchall(), [(6,), (7,)])
+
+    def test_columnar_parse_bulk_load_messages_to_db(self):
+        os.environ['IDP_FRAUD_BULK_LOAD'] = 'true'
+        os.environ['IDP_FRAUD_COLUMNAR_PARSE'] = 'true'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events)
+
+        with LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.__assert_upload_session_exists_in_database(True)
+            self.__assert_events_exist_in_database(idp_fraud_events)
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.SUCCESS_FOLDER)
+
+    def test_columnar_parse_validate_every_row(self):
+        os.environ['IDP_FRAUD_VALIDATE_ALL'] = 'true'
+        os.environ['IDP_FRAUD_COLUMNAR_PARSE'] = 'true'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events, error_rows=[
+            '"01/01/2019 11:00",,,',
+            '"01/01/2019 11:00","5555555","DF01","A01",not-a-score,"_req5555555","111.111.111.111","pid5555555"'
+        ])
+
+        with LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.__assert_upload_session_exists_in_database(False)
+            self.__assert_no_events_exist_in_database(idp_fraud_events)
+            with RunInTransaction(self.db_connection) as cursor:
+                cursor.execute('SELECT row FROM idp_data.upload_session_validation_failures ORDER BY row')
+                self.assertEqual(cursor.fetchall(), [(6,), (7,)])
+
+    def test_chunked_commits_write_messages_to_db(self):
+        os.environ['IDP_FRAUD_CHUNK_ROWS'] = '2'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events)
+
+        with LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.__assert_upload_session_exists_in_database(True)
+            self.__assert_events_exist_in_database(idp_fraud_events)
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.SUCCESS_FOLDER)
+            self.assertFalse(file_exists_in_s3(UPLOAD_BUCKET_NAME, CHECKPOINT_FILE_NAME))
+
+    def test_chunked_commits_resume_after_the_rows_already_committed(self):
+        os.environ['IDP_FRAUD_CHUNK_ROWS'] = '2'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events)
+        writes = []
+
+        def write_or_time_out(*args):
+            writes.append(args[1].idp_event_id)
+            if len(writes) == 4:
+                # The Lambda times out after the first chunk has committed
+                raise LambdaTimeout()
+            return database.write_idp_fraud_event_to_database(*args)
+
+        with patch('src.idp_fraud_data_handler.write_idp_fraud_event_to_database', write_or_time_out), \
+                LogCapture('idp_fraud_data_handler', propagate=False):
+            with self.assertRaises(LambdaTimeout):
+                idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+        self.__assert_events_exist_in_database(idp_fraud_events[:2])
+
+        with LogCapture('idp_fraud_data_handler', propagate=False) as log_capture:
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.assertIn('Resuming upload session {} after the 2 rows already committed'.format(
+                self.__upload_session_id()), [record.getMessage() for record in log_capture.records])
+            self.__assert_upload_session_exists_in_database(True)
+            self.__assert_events_exist_in_database(idp_fraud_events)
+            with RunInTransaction(self.db_connection) as cursor:
+                cursor.execute('SELECT COUNT(*) FROM idp_data.idp_fraud_events')
+                self.assertEqual(cursor.fetchone()[0], len(idp_fraud_events))
+            self.assertFalse(file_exists_in_s3(UPLOAD_BUCKET_NAME, CHECKPOINT_FILE_NAME))
+
+    def test_chunked_commits_retry_only_the_chunk_that_lost_its_connection(self):
+        os.environ['IDP_FRAUD_CHUNK_ROWS'] = '2'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events)
+        writes = []
+
+        def write_or_drop_connection(*args):
+            writes.append(args[1].idp_event_id)
+            if len(writes) == 3:
+                raise psycopg2.OperationalError('server closed the connection unexpectedly')
+            return database.write_idp_fraud_event_to_database(*args)
+
+        with patch('src.idp_fraud_data_handler.write_idp_fraud_event_to_database', write_or_drop_connection), \
+                LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.assertEqual(writes, ['1111111', '2222222', '3333333', '3333333', '4444444'])
+            self.__assert_upload_session_exists_in_database(True)
+            self.__assert_events_exist_in_database(idp_fraud_events)
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.SUCCESS_FOLDER)
+
+    @parameterized.expand([('0',), ('2',)])
+    def test_does_not_write_rows_again_if_the_connection_drops_after_they_commit(self, chunk_rows):
+        os.environ['IDP_FRAUD_CHUNK_ROWS'] = chunk_rows
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events)
+        commits = []
+
+        class CommitThenDropConnection(database.InstrumentedTransaction):
+            def __exit__(self, type, value, traceback):
+                super().__exit__(type, value, traceback)
+                commits.append(type)
+                if len(commits) == 1:
+                    raise psycopg2.OperationalError('server closed the connection unexpectedly')
+
+        with patch('src.idp_fraud_data_handler.InstrumentedTransaction', CommitThenDropConnection), \
+                LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            with RunInTransaction(self.db_connection) as cursor:
+                cursor.execute('SELECT COUNT(*) FROM idp_data.idp_fraud_events')
+                self.assertEqual(cursor.fetchone()[0], len(idp_fraud_events))
+            self.__assert_events_exist_in_database(idp_fraud_events)
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.SUCCESS_FOLDER)
+
+    @patch('src.upload_progress.monotonic', return_value=0)
+    def test_counts_rows_once_when_their_transaction_is_retried(self, _):
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events)
+        transactions = []
+
+        class DropConnectionBeforeCommit(database.InstrumentedTransaction):
+            def __exit__(self, type, value, traceback):
+                transactions.append(type)
+                if len(transactions) == 1:
+                    error = psycopg2.OperationalError('server closed the connection unexpectedly')
+                    super().__exit__(psycopg2.OperationalError, error, None)
+                    raise error
+                return super().__exit__(type, value, traceback)
+
+        with patch('src.idp_fraud_data_handler.InstrumentedTransaction', DropConnectionBeforeCommit), \
+                LogCapture('idp_fraud_data_handler', propagate=False) as log_capture:
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.assertIn('parsed {0} rows in 0.00s, wrote {0} rows'.format(len(idp_fraud_events)), [
+                record.getMessage() for record in log_capture.records
+                if record.getMessage().startswith('Processed upload session')
+            ][0])
+            self.__assert_events_exist_in_database(idp_fraud_events)
+
+    @patch('src.idp_fraud_data_handler.get_connection_pool')
+    def test_ignores_its_own_checkpoints_without_connecting_to_the_db(self, get_connection_pool):
+        with LogCapture('idp_fraud_data_handler', propagate=False) as log_capture:
+            idp_fraud_data_handler.idp_fraud_data_events(
+                self.__create_s3_event(CHECKPOINT_FILE_NAME), None)
+
+            log_capture.check()
+        get_connection_pool.assert_not_called()
+
+    def test_chunked_commits_are_removed_if_a_later_chunk_fails(self):
+        os.environ['IDP_FRAUD_CHUNK_ROWS'] = '2'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events, error_rows=[
+            '"01/01/2019 11:00",,,'
+        ])
+
+        with LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.__assert_upload_session_exists_in_database(False)
+            self.__assert_no_events_exist_in_database(idp_fraud_events)
+            self.__assert_error_in_database_failure_table(
+                6,
+                '**Row Exception**',
+                'Failed to store IDP fraud event: list index out of range (line 6)'
+            )
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.ERROR_FOLDER)
+
+    def test_duplicate_policy_reject_reports_a_repeated_row(self):
+        os.environ['IDP_FRAUD_DUPLICATE_POLICY'] = 'reject'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events, error_rows=[
+            self.__idp_fraud_event_to_csv_string(idp_fraud_events[0], ',')
+        ])
+
+        with LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.__assert_upload_session_exists_in_database(False)
+            self.__assert_error_in_database_failure_table(6, 'Event ID', 'Row repeats line 2')
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.ERROR_FOLDER)
+
+    def test_unknown_duplicate_policy_fails_before_any_upload_session_is_created(self):
+        os.environ['IDP_FRAUD_DUPLICATE_POLICY'] = 'sometimes'
+        self.__write_import_file_to_s3(self.__generate_test_idp_fraud_events())
+
+        with LogCapture('idp_fraud_data_handler', propagate=False):
+            with self.assertRaisesRegex(ValueError, 'Unknown IDP_FRAUD_DUPLICATE_POLICY "sometimes"'):
+                idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+        with RunInTransaction(self.db_connection) as cursor:
+            cursor.execute('SELECT COUNT(*) FROM idp_data.upload_sessions')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertTrue(file_exists_in_s3(UPLOAD_BUCKET_NAME, UPLOAD_FILE_NAME))
+
+    def test_duplicate_policy_merge_drops_a_repeated_row(self):
+        os.environ['IDP_FRAUD_DUPLICATE_POLICY'] = 'merge'
+        os.environ['IDP_FRAUD_BULK_LOAD'] = 'true'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events, error_rows=[
+            self.__idp_fraud_event_to_csv_string(idp_fraud_events[0], ',')
+        ])
+
+        with LogCapture('idp_fraud_data_handler', propagate=False) as log_capture:
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.assertIn('Merged 1 rows repeating an earlier row of the upload',
+                          [record.getMessage() for record in log_capture.records])
+            self.__assert_upload_session_exists_in_database(True)
+            self.__assert_events_exist_in_database(idp_fraud_events)
+            self.__assert_upload_file_has_been_moved_to_folder(idp_fraud_data_handler.SUCCESS_FOLDER)
+
+    def test_duplicate_policy_validate_all_reports_a_reused_event_id(self):
+        os.environ['IDP_FRAUD_DUPLICATE_POLICY'] = 'merge'
+        os.environ['IDP_FRAUD_VALIDATE_ALL'] = 'true'
+        idp_fraud_events = self.__generate_test_idp_fraud_events()
+        self.__write_import_file_to_s3(idp_fraud_events, error_rows=[
+            '"01/01/2019 11:00","1111111","DF01","A01",-5,"_req1111111","111.111.111.111","pid1111111"'
+        ])
+
+        with LogCapture('idp_fraud_data_handler', propagate=False):
+            idp_fraud_data_handler.idp_fraud_data_events(self.__create_s3_event(), None)
+
+            self.__assert_upload_session_exists_in_database(False)
+            self.__assert_no_events_exist_in_database(idp_fraud_events)
+            self.__assert_error_in_database_failure_table(6, 'Event ID', 'Event ID "1111111" is also used on line 2')
+
     def __assert_upload_file_has_been_moved_to_folder(self, folder):
         self.assertFalse(file_exists_in_s3(UPLOAD_BUCKET_NAME, UPLOAD_FILE_NAME))
         self.assertTrue(file_exists_in_s3(
@@ -354,6 +744,11 @@ class IdpFraudDataHandlerTest(TestCase):
             '{}/{}'.format(folder, os.path.basename(UPLOAD_FILE_NAME))
         ))
 
+    def __upload_session_id(self):
+        with RunInTransaction(self.db_connection) as cursor:
+            cursor.execute('SELECT id FROM idp_data.upload_sessions')
+            return cursor.fetchone()[0]
+
     def __assert_upload_session_exists_in_database(self, passed_validation):
         with RunInTransaction(self.db_connection) as cursor:
             cursor.execute("""
@@ -0,0 +1,44 @@
+from functools import partial
+from unittest import TestCase
+
+from src.idp_fraud_data_handler import parse_line
+from src.idp_fraud_validation import validate_rows, ROW_FIELD, EVENT_TIME_FIELD, CONTRA_SCORE_FIELD
+from test.helpers import IDP_ENTITY_ID
+
+VALID_ROW = ['05/08/2019 11:54', '1111111', 'DF01', 'A04,D02', '-5', '_req1', '111.222.222.111', 'pid1']
+
+
+def row_with(index, value):
+    row = list(VALID_ROW)
+    row[index] = value
+    return row
+
+
+class IdpFraudValidationTest(TestCase):
+
+    def test_returns_the_parsed_events_of_a_clean_file(self):
+        numbered_events, errors = validate_rows([(2, VALID_ROW), (3, row_with(4, ''))],
+                                                partial(parse_line, idp_entity_id=IDP_ENTITY_ID))
+
+        self.assertEqual(errors, [])
+        self.assertEqual([row_number for row_number, _ in numbered_events], [2, 3])
+        self.assertEqual(vars(numbered_events[0][1]), vars(parse_line(VALID_ROW, IDP_ENTITY_ID)))
+
+    def test_collects_every_error_with_its_row_and_field(self):
+        numbered_events, errors = validate_rows([
+            (2, VALID_ROW),
+            (3, ['01/01/2019 11:00', '', '', '']),
+            (4, row_with(0, 'not a time')),
+            (5, row_with(4, 'not-a-score')),
+            (6, VALID_ROW),
+            (7, ['99/99/2019 11:00', '7777777', 'DF01', '', 'y', '', '', '']),
+        ], partial(parse_line, idp_entity_id=IDP_ENTITY_ID))
+
+        self.assertEqual([row_number for row_number, _ in numbered_events], [2, 6])
+        self.assertEqual(errors, [
+            (3, ROW_FIELD, 'Expected 8 fields but found 4'),
+            (4, EVENT_TIME_FIELD, 'Could not read "not a time" as a date and time'),
+            (5, CONTRA_SCORE_FIELD, '"not-a-score" is not a whole number'),
+            (7, EVENT_TIME_FIELD, 'Could not read "99/99/2019 11:00" as a date and time'),
+            (7, CONTRA_SCORE_FIELD, '"y" is not a whole number'),
+        ])
@@ -0,0 +1,58 @@
+from unittest import TestCase
+
+import boto3
+from moto import mock_s3
+
+from src.import_checkpoint import ImportCheckpoint, load_checkpoint, save_checkpoint, clear_checkpoint, \
+    is_checkpoint
+from test.helpers import setup_stub_aws_config
+
+BUCKET_NAME = 's3-import-bucket'
+FILE_NAME = 'imports/replay-events.json'
+ETAG = '"b1946ac92492d2347c6235b4d2611184"'
+
+
+@mock_s3
+class ImportCheckpointTest(TestCase):
+
+    def setUp(self):
+        setup_stub_aws_config()
+        boto3.client('s3').create_bucket(Bucket=BUCKET_NAME)
+
+    def test_starts_from_the_beginning_without_a_checkpoint(self):
+        checkpoint = load_checkpoint(BUCKET_NAME, FILE_NAME, ETAG)
+
+        self.assertEqual((checkpoint.offset, checkpoint.line_number), (0, 0))
+
+    def test_loads_a_saved_checkpoint(self):
+        save_checkpoint(BUCKET_NAME, FILE_NAME, ETAG, ImportCheckpoint(1024, 12))
+
+        checkpoint = load_checkpoint(BUCKET_NAME, FILE_NAME, ETAG)
+
+        self.assertEqual((checkpoint.offset, checkpoint.line_number), (1024, 12))
+
+    def test_loads_the_upload_session_of_a_saved_checkpoint(self):
+        save_checkpoint(BUCKET_NAME, FILE_NAME, ETAG, ImportCheckpoint(line_number=12, upload_session_id=7))
+
+        checkpoint = load_checkpoint(BUCKET_NAME, FILE_NAME, ETAG)
+
+        self.assertEqual((checkpoint.line_number, checkpoint.upload_session_id), (12, 7))
+
+    def test_ignores_a_checkpoint_for_another_version_of_the_file(self):
+        save_checkpoint(BUCKET_NAME, FILE_NAME, ETAG, ImportCheckpoint(1024, 12))
+
+        checkpoint = load_checkpoint(BUCKET_NAME, FILE_NAME, '"another etag"')
+
+        self.assertEqual((checkpoint.offset, checkpoint.line_number), (0, 0))
+
+    def test_clears_a_checkpoint(self):
+        save_checkpoint(BUCKET_NAME, FILE_NAME, ETAG, ImportCheckpoint(1024, 12))
+
+        clear_checkpoint(BUCKET_NAME, FILE_NAME)
+
+        self.assertEqual(load_checkpoint(BUCKET_NAME, FILE_NAME, ETAG).offset, 0)
+        self.assertEqual(boto3.client('s3').list_objects(Bucket=BUCKET_NAME).get('Contents', []), [])
+
+    def test_recognises_checkpoint_objects(self):
+        self.assertTrue(is_checkpoint('recorder-checkpoints/imports/replay-events.json.checkpoint'))
+        self.assertFalse(is_checkpoint(FILE_NAME))
@@ -0,0 +1,59 @@
+import json
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from src.import_dry_run import dry_run_import
+
+
+def import_line(event_id, session_event_type, details=None):
+    event_details = {'session_event_type': session_event_type}
+    event_details.update(details or {})
+    return json.dumps({'document': {
+        'eventId': event_id,
+        'eventType': 'session_event',
+        'timestamp': 1518264452000,
+        'originatingService': 'test service',
+        'sessionId': 'session-id',
+        'details': event_details
+    }})
+
+
+BILLING_DETAILS = {
+    'pid': 'pid',
+    'request_id': 'request-id',
+    'idp_entity_id': 'idp-entity-id',
+    'minimum_level_of_assurance': 'LEVEL_2',
+    'provided_level_of_assurance': 'LEVEL_2',
+    'preferred_level_of_assurance': 'LEVEL_2',
+    'transaction_entity_id': 'transaction-entity-id'
+}
+
+
+class ImportDryRunTest(TestCase):
+
+    def test_reports_event_mix_failures_and_projected_statements(self):
+        lines = [
+            import_line('1', 'other'),
+            import_line('2', 'idp_authn_succeeded', BILLING_DETAILS),
+            import_line('3', 'idp_authn_succeeded'),
+            import_line('4', 'fraud_detected', {'idp_entity_id': 'idp-entity-id'}),
+            'not json',
+            json.dumps({'document': {'eventId': '5'}}),
+        ]
+        logger = MagicMock()
+
+        report = dry_run_import('bucket', 'file.json', [(line, None) for line in lines], 2, logger)
+
+        self.assertEqual(report.line_count, 6)
+        self.assertEqual(report.event_count, 4)
+        self.assertEqual(report.event_mix['audit only'], 1)
+        self.assertEqual(report.event_mix['billing'], 2)
+        self.assertEqual(report.event_mix['fraud'], 1)
+        self.assertEqual(report.derived_row_failures, 2)
+        self.assertEqual(report.failure_reasons, {
+            'JSONDecodeError': 1,
+            'ValueError: Invalid Message. Missing required field "eventType"': 1
+        })
+        self.assertEqual(report.projected_transactions, 4)
+        self.assertEqual(report.projected_statements, 14)
+        logger.info.assert_any_call('Dry run of file.json: projected 14 statements in 4 transactions')
@@ -6,12 +6,14 @@ import psycopg2
 
 from moto import mock_s3, mock_kms
 from unittest import TestCase
+from unittest.mock import patch
 from datetime import datetime
 from testfixtures import LogCapture
 from retrying import retry
 
 from src import import_handler
 from src.database import RunInTransaction
+from src.import_checkpoint import ImportCheckpoint, save_checkpoint
 
 EVENT_TYPE = 'session_event'
 TIMESTAMP = 1518264000000
@@ -31,6 +33,7 @@ FRAUD_SESSION_EVENT_TYPE = 'fraud_detected'
 GPG45_STATUS = 'AA01'
 IMPORT_BUCKET_NAME = 's3-import-bucket'
 IMPORT_FILE_NAME = 'imports/replay-events.json'
+SECOND_IMPORT_FILE_NAME = 'imports/more-replay-events.json'
 
 
 @mock_s3
@@ -117,14 +120,163 @@ class ImportHandlerTest(TestCase):
                     'WARNING',
                     'Failed to store an audit event. The Event ID sample-id-1 already exists in the database'
                 ),
+                (
+                    'event-recorder',
+                    'WARNING',
+                    'Failed to store a billing event. The Event ID sample-id-1 already exists in the database'
+                ),
                 (
                     'event-recorder',
                     'WARNING',
                     'Failed to store an audit event. The Event ID sample-id-3 already exists in the database'
+                ),
+                (
+                    'event-recorder',
+                    'WARNING',
+                    'Failed to store a fraud event. The Event ID sample-id-3 already exists in the database'
+                ),
+                (
+                    'event-recorder',
+                    'INFO',
+                    'Skipped 0 of 4 events already in the database (0.0%)'
+                )
+            )
+            self.__assert_import_file_has_been_removed_from_s3()
+
+    def test_skips_events_already_in_db_without_attempting_to_insert_them(self):
+        self.__setup_s3()
+        self.__setup_db_connection_string(True)
+        self.__write_import_file_to_s3(
+            [
+                self.__create_event_string('sample-id-1', 'session-id-1'),
+                self.__create_fraud_event_string('sample-id-3', 'session-id-3', 'fraud-event-id-1'),
+            ]
+        )
+        import_handler.import_events(self.__create_s3_event(), None)
+
+        self.__write_import_file_to_s3(
+            [
+                self.__create_event_string('sample-id-1', 'session-id-1'),
+                self.__create_event_string('sample-id-2', 'session-id-2'),
+                self.__create_fraud_event_string('sample-id-3', 'session-id-3', 'fraud-event-id-1'),
+                self.__create_fraud_event_string('sample-id-4', 'session-id-4', 'fraud-event-id-2'),
+            ]
+        )
+
+        with LogCapture('event-recorder', propagate=False) as log_capture:
+            import_handler.import_events(self.__create_s3_event(), None)
+
+            log_capture.check(
+                (
+                    'event-recorder',
+                    'INFO',
+                    'Created connection to DB'
+                ),
+                (
+                    'event-recorder',
+                    'INFO',
+                    'Skipped 2 of 4 events already in the database (50.0%)'
                 )
             )
+            self.__assert_audit_events_table_has_billing_event_records(
+                [('sample-id-1', 'session-id-1'), ('sample-id-2', 'session-id-2')], MINIMUM_LEVEL_OF_ASSURANCE)
+            self.__assert_fraud_events_table_has_fraud_event_records(
+                [('session-id-3', 'fraud-event-id-1'), ('session-id-4', 'fraud-event-id-2')])
             self.__assert_import_file_has_been_removed_from_s3()
 
+    @patch('src.import_handler.get_connection_pool')
+    def test_ignores_its_own_checkpoints_and_profiles_without_connecting_to_the_db(self, get_connection_pool):
+        with LogCapture('event-recorder', propagate=False) as log_capture:
+            import_handler.import_events(self.__create_s3_event(
+                'recorder-checkpoints/' + IMPORT_FILE_NAME + '.checkpoint',
+                'import-profiles/' + IMPORT_FILE_NAME + '.pstats'
+            ), None)
+
+            log_capture.check()
+        get_connection_pool.assert_not_called()
+
+    def test_resumes_from_a_checkpoint_and_clears_it_once_the_file_is_imported(self):
+        self.__setup_s3()
+        self.__setup_db_connection_string(True)
+        first_line = self.__create_event_string('sample-id-1', 'session-id-1')
+        self.__write_import_file_to_s3(
+            [
+                first_line,
+                self.__create_event_string('sample-id-2', 'session-id-2'),
+                self.__create_fraud_event_string('sample-id-3', 'session-id-3', 'fraud-event-id-1'),
+            ]
+        )
+        etag = self.__s3_client.head_object(Bucket=IMPORT_BUCKET_NAME, Key=IMPORT_FILE_NAME)['ETag']
+        save_checkpoint(IMPORT_BUCKET_NAME, IMPORT_FILE_NAME, etag, ImportCheckpoint(len(first_line) + 1, 1))
+
+        with LogCapture('event-recorder', propagate=False) as log_capture:
+            import_handler.import_events(self.__create_s3_event(), None)
+
+            log_capture.check(
+                (
+                    'event-recorder',
+                    'INFO',
+                    'Created connection to DB'
+                ),
+                (
+                    'event-recorder',
+                    'INFO',
+                    'Resuming import of {} after line 1'.format(IMPORT_FILE_NAME)
+                ),
+                (
+                    'event-recorder',
+                    'INFO',
+                    'Skipped 0 of 2 events already in the database (0.0%)'
+                )
+            )
+            self.__assert_audit_events_table_has_billing_event_records(
+                [('sample-id-2', 'session-id-2')], MINIMUM_LEVEL_OF_ASSURANCE)
+            self.__assert_fraud_events_table_has_fraud_event_records([('session-id-3', 'fraud-event-id-1')])
+            self.__assert_event_is_not_in_db('sample-id-1')
+            self.__assert_import_file_has_been_removed_from_s3()
+
+    def test_parses_lines_in_worker_processes(self):
+        self.__setup_s3()
+        self.__setup_db_connection_string(True)
+        os.environ['IMPORT_PARSE_WORKERS'] = '2'
+
+        self.__write_import_file_to_s3(
+            [
+                self.__create_event_string('sample-id-1', 'session-id-1'),
+                'not json',
+                self.__create_event_string('sample-id-2', 'session-id-2'),
+                self.__create_fraud_event_string('sample-id-3', 'session-id-3', 'fraud-event-id-1'),
+            ]
+        )
+
+        with LogCapture('event-recorder', propagate=False) as log_capture:
+            import_handler.import_events(self.__create_s3_event(), None)
+
+            self.__assert_audit_events_table_has_billing_event_records(
+                [('sample-id-1', 'session-id-1'), ('sample-id-2', 'session-id-2')], MINIMUM_LEVEL_OF_ASSURANCE)
+            self.__assert_fraud_events_table_has_fraud_event_records([('session-id-3', 'fraud-event-id-1')])
+            self.assertIn('Failed to store messageExpecting value', log_capture.records[1].getMessage())
+            self.__assert_import_file_has_been_removed_from_s3()
+
+    def test_imports_every_file_in_a_notification(self):
+        self.__setup_s3()
+        self.__setup_db_connection_string(True)
+        self.__write_to_s3(IMPORT_BUCKET_NAME, IMPORT_FILE_NAME, '\n'.join([
+            self.__create_event_string('sample-id-1', 'session-id-1'),
+            self.__create_event_string('sample-id-2', 'session-id-2'),
+        ]))
+        self.__write_to_s3(IMPORT_BUCKET_NAME, SECOND_IMPORT_FILE_NAME, '\n'.join([
+            self.__create_fraud_event_string('sample-id-3', 'session-id-3', 'fraud-event-id-1'),
+        ]))
+
+        with LogCapture('event-recorder', propagate=False):
+            import_handler.import_events(self.__create_s3_event(IMPORT_FILE_NAME, SECOND_IMPORT_FILE_NAME), None)
+
+        self.__assert_audit_events_table_has_billing_event_records(
+            [('sample-id-1', 'session-id-1'), ('sample-id-2', 'session-id-2')], MINIMUM_LEVEL_OF_ASSURANCE)
+        self.__assert_fraud_events_table_has_fraud_event_records([('session-id-3', 'fraud-event-id-1')])
+        self.__assert_import_file_has_been_removed_from_s3()
+
     def __clean_db(self):
         with RunInTransaction(self.db_connection) as cursor:
             cursor.execute("""
@@ -133,6 +285,11 @@ class ImportHandlerTest(TestCase):
                 DELETE FROM billing.fraud_events;
             """)
 
+    def __assert_event_is_not_in_db(self, event_id):
+        with RunInTransaction(self.db_connection) as cursor:
+            cursor.execute('SELECT count(*) FROM audit.audit_events WHERE event_id = %s', [event_id])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
     def __assert_audit_events_table_has_billing_event_records(self, expected_events, minimum_level_of_assurance):
         for event in expected_events:
             with RunInTransaction(self.db_connection) as cursor:
@@ -379,7 +536,7 @@ class ImportHandlerTest(TestCase):
             }
         })
 
-    def __create_s3_event(self):
+    def __create_s3_event(self, *filenames):
         return {
             "Records": [
                 {
@@ -388,9 +545,9 @@ class ImportHandlerTest(TestCase):
                             "name": IMPORT_BUCKET_NAME,
                         },
                         "object": {
-                            "key": IMPORT_FILE_NAME,
+                            "key": filename,
                         }
                     }
-                }
+                } for filename in (filenames if filenames else [IMPORT_FILE_NAME])
             ]
         }
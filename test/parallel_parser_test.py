@@ -0,0 +1,57 @@
+from functools import partial
+from unittest import TestCase
+
+from parameterized import parameterized
+
+from src.idp_fraud_data_handler import parse_line, DEFAULT_TIMEZONE
+from src.idp_fraud_validation import validate_rows
+from src.parallel_parser import parse_in_processes, map_in_processes
+from test.helpers import IDP_ENTITY_ID
+
+
+def numbered_rows():
+    rows = []
+    for row_number in range(2, 42):
+        row = ['05/08/2019 11:{:02}'.format(row_number), str(row_number), 'DF01', 'A01,A02', '-5', '_req', 'ip', 'pid']
+        if row_number % 10 == 0:
+            row[4] = 'not-a-score'
+        if row_number % 13 == 0:
+            row = row[:3]
+        rows.append((row_number, row))
+    return rows
+
+
+class ParallelParserTest(TestCase):
+
+    @parameterized.expand([
+        ('in process', 1),
+        ('in worker processes', 3),
+        ('more workers than rows', 50),
+    ])
+    def test_returns_the_same_events_and_errors_as_validate_rows_in_row_order(self, _, workers):
+        expected_events, expected_errors = validate_rows(
+            numbered_rows(), partial(parse_line, idp_entity_id=IDP_ENTITY_ID, timezone=DEFAULT_TIMEZONE)
+        )
+
+        result = parse_in_processes(numbered_rows(), parse_line, IDP_ENTITY_ID, DEFAULT_TIMEZONE, workers)
+
+        self.assertEqual(
+            [(row_number, vars(event)) for row_number, event in result.numbered_events],
+            [(row_number, vars(event)) for row_number, event in expected_events]
+        )
+        self.assertEqual(result.errors, expected_errors)
+        self.assertEqual(result.parsed_count, 37)
+
+    def test_parses_no_rows(self):
+        result = parse_in_processes([], parse_line, IDP_ENTITY_ID, DEFAULT_TIMEZONE, 4)
+
+        self.assertEqual(result.numbered_events, [])
+        self.assertEqual(result.errors, [])
+
+    def test_maps_slices_in_order(self):
+        self.assertEqual(map_in_processes(sum, list(range(10)), 3), [0 + 1 + 2 + 3, 4 + 5 + 6 + 7, 8 + 9])
+        self.assertEqual(map_in_processes(sum, list(range(10)), 1), [45])
+
+    def test_raises_the_error_of_a_failed_slice(self):
+        with self.assertRaises(TypeError):
+            map_in_processes(sum, [1, 2, 'three', 4], 2)
@@ -0,0 +1,52 @@
+from unittest import TestCase
+
+from src.prepared_statements import PreparedStatement
+
+
+class FakeConnection(object):
+    pass
+
+
+class FakeCursor(object):
+    def __init__(self, connection):
+        self.connection = connection
+        self.executed = []
+
+    def execute(self, sql, parameters=None):
+        self.executed.append((sql, parameters))
+
+
+class PreparedStatementTest(TestCase):
+
+    def test_prepares_statement_once_per_connection_then_executes_it(self):
+        statement = PreparedStatement('insert_thing', 'INSERT INTO things (a, b) VALUES (%s, %s)')
+        cursor = FakeCursor(FakeConnection())
+
+        statement.execute(cursor, [1, 2])
+        statement.execute(cursor, [3, 4])
+
+        self.assertEqual(cursor.executed, [
+            ('PREPARE insert_thing AS INSERT INTO things (a, b) VALUES ($1, $2)', None),
+            ('EXECUTE insert_thing (%s, %s)', [1, 2]),
+            ('EXECUTE insert_thing (%s, %s)', [3, 4]),
+        ])
+
+    def test_prepares_statement_again_on_a_new_connection(self):
+        statement = PreparedStatement('insert_thing', 'INSERT INTO things (a) VALUES (%s)')
+        statement.execute(FakeCursor(FakeConnection()), [1])
+        reconnected_cursor = FakeCursor(FakeConnection())
+
+        statement.execute(reconnected_cursor, [2])
+
+        self.assertEqual(reconnected_cursor.executed, [
+            ('PREPARE insert_thing AS INSERT INTO things (a) VALUES ($1)', None),
+            ('EXECUTE insert_thing (%s)', [2]),
+        ])
+
+    def test_executes_unprepared_statement_directly(self):
+        statement = PreparedStatement('insert_thing', 'INSERT INTO things (a) VALUES (%s)')
+        cursor = FakeCursor(FakeConnection())
+
+        statement.execute_unprepared(cursor, [1])
+
+        self.assertEqual(cursor.executed, [('INSERT INTO things (a) VALUES (%s)', [1])])
@@ -0,0 +1,102 @@
+import gzip
+from io import BytesIO
+from unittest import TestCase
+
+import boto3
+import zstandard
+from botocore.response import StreamingBody
+from moto import mock_s3
+from parameterized import parameterized
+
+from src.ranged_reader import RangeLines, byte_ranges, join_ranges, fetch_import_file_in_ranges, \
+    fetch_import_file_from, fetch_compressed_import_file, compression_of, GZIP, ZSTD
+from test.helpers import setup_stub_aws_config
+
+BUCKET_NAME = 's3-import-bucket'
+FILE_NAME = 'imports/replay-events.json'
+CONTENT = b'{"line": 1}\n{"line": 2}\r\n\n{"line": 4, "longer": "than one range"}\n{"line": 5}'
+
+
+def iter_lines(content):
+    return list(StreamingBody(BytesIO(content), len(content)).iter_lines())
+
+
+class RangedReaderTest(TestCase):
+
+    def test_splits_objects_into_inclusive_byte_ranges(self):
+        self.assertEqual(byte_ranges(10, 4), [(0, 3), (4, 7), (8, 9)])
+        self.assertEqual(byte_ranges(0, 4), [])
+
+    @parameterized.expand([
+        ['one range', 1000],
+        ['newline on a boundary', 12],
+        ['carriage return and newline split', 24],
+        ['lines longer than a range', 7],
+        ['single bytes', 1],
+    ])
+    def test_realigns_ranges_into_the_same_lines_as_iter_lines(self, _, range_size):
+        ranges = [RangeLines(CONTENT[start:end + 1]) for start, end in byte_ranges(len(CONTENT), range_size)]
+
+        self.assertEqual(list(join_ranges(ranges)), iter_lines(CONTENT))
+
+    @mock_s3
+    def test_fetches_lines_in_order(self):
+        self.__write_to_s3(CONTENT)
+
+        lines = fetch_import_file_in_ranges(BUCKET_NAME, FILE_NAME, range_size=7, workers=3)
+
+        self.assertEqual([line for line, _ in lines], iter_lines(CONTENT))
+
+    @mock_s3
+    def test_resumes_from_the_offset_after_any_line(self):
+        self.__write_to_s3(CONTENT)
+        lines = list(fetch_import_file_from(BUCKET_NAME, FILE_NAME))
+
+        for index, (_, offset) in enumerate(lines):
+            self.assertEqual(list(fetch_import_file_from(BUCKET_NAME, FILE_NAME, offset)), lines[index + 1:])
+            self.assertEqual(
+                list(fetch_import_file_in_ranges(BUCKET_NAME, FILE_NAME, range_size=7, workers=3, start=offset)),
+                lines[index + 1:]
+            )
+
+    @mock_s3
+    def test_fetches_every_line_out_of_order(self):
+        self.__write_to_s3(CONTENT)
+
+        lines = fetch_import_file_in_ranges(BUCKET_NAME, FILE_NAME, range_size=7, workers=3, ordered=False)
+
+        self.assertCountEqual(list(lines), iter_lines(CONTENT))
+
+    @parameterized.expand([
+        ['gzip suffix', 'events.json.gz', None, GZIP],
+        ['zstd suffix', 'events.json.zst', None, ZSTD],
+        ['gzip encoding', 'events.json', 'gzip', GZIP],
+        ['zstd encoding', 'events.json', 'zstd', ZSTD],
+        ['uncompressed', 'events.json', None, None],
+    ])
+    def test_detects_compression_from_suffix_or_content_encoding(self, _, filename, content_encoding, expected):
+        self.assertEqual(compression_of(filename, content_encoding), expected)
+
+    @mock_s3
+    def test_streams_gzip_compressed_files(self):
+        # Two gzip members, as concatenated exports produce
+        self.__write_to_s3(gzip.compress(CONTENT[:30]) + gzip.compress(CONTENT[30:]))
+
+        lines = fetch_compressed_import_file(BUCKET_NAME, FILE_NAME, GZIP)
+
+        self.assertEqual(list(lines), [(line, None) for line in iter_lines(CONTENT)])
+
+    @mock_s3
+    def test_streams_zstd_compressed_files(self):
+        self.__write_to_s3(zstandard.ZstdCompressor().compress(CONTENT))
+
+        lines = fetch_compressed_import_file(BUCKET_NAME, FILE_NAME, ZSTD)
+
+        self.assertEqual(list(lines), [(line, None) for line in iter_lines(CONTENT)])
+
+    @staticmethod
+    def __write_to_s3(content):
+        setup_stub_aws_config()
+        s3_client = boto3.client('s3')
+        s3_client.create_bucket(Bucket=BUCKET_NAME)
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=FILE_NAME, Body=content)
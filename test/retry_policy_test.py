@@ -0,0 +1,109 @@
+from unittest import TestCase
+
+import psycopg2
+
+from src.retry_policy import RetryPolicy, is_transient, needs_reconnect, is_authentication_failure
+
+
+def database_error(error_type, sqlstate):
+    return type('DatabaseError', (error_type,), {'pgcode': sqlstate})()
+
+
+DEADLOCK = database_error(psycopg2.extensions.TransactionRollbackError, '40P01')
+ADMIN_SHUTDOWN = database_error(psycopg2.OperationalError, '57P01')
+UNIQUE_VIOLATION = database_error(psycopg2.IntegrityError, '23505')
+CONNECTION_LOST = psycopg2.OperationalError('server closed the connection unexpectedly')
+
+
+class RetryPolicyTest(TestCase):
+
+    def setUp(self):
+        self.delays = []
+        self.policy = RetryPolicy(max_attempts=4, base_delay_seconds=0.1, max_delay_seconds=0.3,
+                                  time_budget_seconds=10, sleep=self.delays.append, jitter=lambda: 1.0)
+
+    def test_classifies_errors_by_sqlstate(self):
+        self.assertTrue(is_transient(DEADLOCK))
+        self.assertTrue(is_transient(ADMIN_SHUTDOWN))
+        self.assertTrue(is_transient(CONNECTION_LOST))
+        self.assertTrue(is_transient(database_error(psycopg2.OperationalError, '08006')))
+        self.assertFalse(is_transient(UNIQUE_VIOLATION))
+        self.assertFalse(is_transient(KeyError('pid')))
+
+    def test_only_connection_errors_need_a_new_connection(self):
+        self.assertTrue(needs_reconnect(CONNECTION_LOST))
+        self.assertTrue(needs_reconnect(ADMIN_SHUTDOWN))
+        self.assertFalse(needs_reconnect(DEADLOCK))
+
+    def test_recognises_rejected_credentials(self):
+        self.assertTrue(is_authentication_failure(psycopg2.OperationalError(
+            'FATAL:  PAM authentication failed for user "postgres"')))
+        self.assertTrue(is_authentication_failure(database_error(psycopg2.OperationalError, '28P01')))
+        self.assertFalse(is_authentication_failure(CONNECTION_LOST))
+        self.assertFalse(is_authentication_failure(DEADLOCK))
+
+    def test_retries_transient_errors_with_exponential_backoff(self):
+        errors = [DEADLOCK, CONNECTION_LOST, DEADLOCK]
+        retried = []
+
+        def operation(attempt):
+            if errors:
+                raise errors.pop(0)
+            return attempt
+
+        result = self.policy.run(operation, lambda error, delay: retried.append(error))
+
+        self.assertEqual(result, 4)
+        self.assertEqual(self.delays, [0.1, 0.2, 0.3])
+        self.assertEqual(retried, [DEADLOCK, CONNECTION_LOST, DEADLOCK])
+
+    def test_raises_permanent_errors_without_retrying(self):
+        attempts = []
+
+        def operation(attempt):
+            attempts.append(attempt)
+            raise UNIQUE_VIOLATION
+
+        with self.assertRaises(psycopg2.IntegrityError):
+            self.policy.run(operation)
+        self.assertEqual(attempts, [1])
+
+    def test_gives_up_after_max_attempts(self):
+        attempts = []
+
+        def operation(attempt):
+            attempts.append(attempt)
+            raise DEADLOCK
+
+        with self.assertRaises(psycopg2.extensions.TransactionRollbackError):
+            self.policy.run(operation)
+        self.assertEqual(attempts, [1, 2, 3, 4])
+
+    def test_gives_up_rather_than_overrun_the_time_budget(self):
+        policy = RetryPolicy(base_delay_seconds=5, time_budget_seconds=1, sleep=self.delays.append,
+                             jitter=lambda: 1.0)
+
+        def operation(attempt):
+            raise CONNECTION_LOST
+
+        with self.assertRaises(psycopg2.OperationalError):
+            policy.run(operation)
+        self.assertEqual(self.delays, [])
+
+    def test_classifies_errors_with_the_given_is_transient(self):
+        policy = RetryPolicy(sleep=self.delays.append, jitter=lambda: 1.0,
+                             is_transient=lambda error: isinstance(error, TimeoutError))
+        errors = [TimeoutError()]
+
+        def operation(attempt):
+            if errors:
+                raise errors.pop(0)
+            return attempt
+
+        def deadlocked(attempt):
+            raise DEADLOCK
+
+        self.assertEqual(policy.run(operation), 2)
+        with self.assertRaises(psycopg2.extensions.TransactionRollbackError):
+            policy.run(deadlocked)
+        self.assertEqual(self.delays, [0.1])
@@ -0,0 +1,69 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+import dateparser
+from parameterized import parameterized
+
+from src.timestamp_parser import TimestampParser, DETECTION_ROWS, ISO_8601
+
+SLASHED = '%m/%d/%Y %H:%M or %d/%m/%Y %H:%M'
+
+TIMEZONE = 'Europe/London'
+
+
+def dateparser_parse(value):
+    return dateparser.parse(value, settings={'TIMEZONE': TIMEZONE})
+
+
+class TimestampParserTest(TestCase):
+
+    @parameterized.expand([
+        ('month first', ['05/08/2019 11:54', '12/31/2019 23:59', '03/30/2019 01:30'], SLASHED),
+        ('day first', ['23/08/2019 21:22', '05/08/2019 11:54', '31/03/2019 01:30'], SLASHED),
+        ('utc', ['2019-03-01T02:40:40.1110000Z', '2019-06-01T03:30:30.2220000Z', '2019-10-27T01:30:00Z'], ISO_8601),
+        ('offset', ['2019-07-01T02:40:40+01:00', '2019-07-01T02:40:40-0500', '2019-01-20T18:30:15+00:00'], ISO_8601),
+        ('naive iso', ['2019-03-01 02:40:40', '2019-07-01T02:40:40', '2019-10-27 01:30:00'], ISO_8601),
+    ])
+    def test_parses_as_dateparser_does(self, _, values, expected_format):
+        timestamp_parser = TimestampParser(TIMEZONE)
+        values = (values * DETECTION_ROWS)[:DETECTION_ROWS] + values
+
+        for value in values:
+            parsed = timestamp_parser.parse(value)
+            self.assertEqual(parsed, dateparser_parse(value))
+            self.assertEqual(parsed.utcoffset(), dateparser_parse(value).utcoffset())
+
+        self.assertEqual(timestamp_parser.format, expected_format)
+        self.assertEqual(timestamp_parser.fallback_count, 0)
+
+    def test_counts_values_that_fall_back_to_dateparser(self):
+        timestamp_parser = TimestampParser(TIMEZONE)
+        for _ in range(DETECTION_ROWS):
+            timestamp_parser.parse('2019-03-01T02:40:40Z')
+
+        self.assertEqual(timestamp_parser.parse('1 March 2019 02:40'), dateparser_parse('1 March 2019 02:40'))
+        self.assertEqual(timestamp_parser.fallback_count, 1)
+        self.assertEqual(timestamp_parser.parsed_count, DETECTION_ROWS + 1)
+
+    def test_falls_back_to_dateparser_when_no_format_matches(self):
+        timestamp_parser = TimestampParser(TIMEZONE)
+        for _ in range(DETECTION_ROWS + 2):
+            self.assertEqual(timestamp_parser.parse('1 March 2019 02:40'), dateparser_parse('1 March 2019 02:40'))
+
+        self.assertEqual(timestamp_parser.format, '')
+        self.assertEqual(timestamp_parser.fallback_count, 2)
+
+    def test_parses_each_distinct_value_once_the_format_is_chosen(self):
+        timestamp_parser = TimestampParser(TIMEZONE)
+        for _ in range(DETECTION_ROWS):
+            timestamp_parser.parse('2019-03-01T02:40:40Z')
+
+        expected = dateparser_parse('1 March 2019 02:40')
+        with patch('src.timestamp_parser.dateparser.parse', wraps=dateparser.parse) as dateparser_spy:
+            for _ in range(3):
+                self.assertEqual(timestamp_parser.parse('1 March 2019 02:40'), expected)
+                timestamp_parser.parse('2019-03-01T02:40:40Z')
+
+        self.assertEqual(dateparser_spy.call_count, 1)
+        self.assertEqual(timestamp_parser.fallback_count, 3)
+        self.assertEqual(timestamp_parser.parsed_count, DETECTION_ROWS + 6)
@@ -0,0 +1,90 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from testfixtures import LogCapture
+
+from src.transaction_metrics import LatencyHistogram, TransactionMetrics
+
+
+class LatencyHistogramTest(TestCase):
+
+    def test_records_counts_totals_and_bucketed_percentiles(self):
+        histogram = LatencyHistogram(bounds=[0.01, 0.1, 1])
+
+        for seconds in [0.005, 0.005, 0.05, 0.5, 3]:
+            histogram.record(seconds)
+
+        self.assertEqual(histogram.bucket_counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertAlmostEqual(histogram.total_seconds, 3.56)
+        self.assertEqual(histogram.max_seconds, 3)
+        self.assertEqual(histogram.percentile(40), 0.01)
+        self.assertEqual(histogram.percentile(60), 0.1)
+        self.assertEqual(histogram.percentile(100), 3)
+
+    def test_percentile_of_an_empty_histogram_is_zero(self):
+        self.assertEqual(LatencyHistogram().percentile(95), 0.0)
+
+
+class TransactionMetricsTest(TestCase):
+
+    def test_keeps_statements_commits_and_rollbacks_per_label(self):
+        metrics = TransactionMetrics()
+
+        metrics.record_execute('write_events.insert_audit_event_if_new', 0.002, 2)
+        metrics.record_execute('write_events.insert_audit_event_if_new', 0.004, 1)
+        metrics.record_execute('write_events.SAVEPOINT', 0.001, -1)
+        metrics.record_commit('write_events', 0.01)
+        metrics.record_rollback('write_events')
+
+        self.assertEqual(metrics.execute_latencies['write_events.insert_audit_event_if_new'].count, 2)
+        self.assertEqual(metrics.rows_affected, {'write_events.insert_audit_event_if_new': 3})
+        self.assertEqual(metrics.commit_latencies['write_events'].count, 1)
+        self.assertEqual(metrics.rollback_counts, {'write_events': 1})
+        self.assertEqual(len(metrics.summary_lines()), 3)
+
+        metrics.clear()
+        self.assertEqual(metrics.summary_lines(), [])
+
+    def test_summarises_and_clears_while_other_threads_record(self):
+        metrics = TransactionMetrics()
+
+        def record(thread):
+            for label in range(2000):
+                metrics.record_flush('{}.{}'.format(thread, label), 1, 0.001)
+
+        # Switch threads often enough that a summary would see a flush half recorded
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, switch_interval)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            recorders = [executor.submit(record, thread) for thread in range(3)]
+            while not all(recorder.done() for recorder in recorders):
+                metrics.summary_lines()
+                metrics.clear()
+            for recorder in recorders:
+                recorder.result()
+
+    def test_summarises_write_behind_flushes(self):
+        metrics = TransactionMetrics()
+
+        metrics.record_flush('write_behind', 100, 0.02)
+        metrics.record_flush('write_behind', 40, 0.01)
+
+        self.assertEqual(metrics.summary_lines(), [
+            'write_behind flush: 2 timed, p50 0.010s, p95 0.020s, max 0.020s, total 0.030s, 140 events, largest 100'
+        ])
+
+    def test_logs_statements_and_commits_slower_than_the_threshold(self):
+        metrics = TransactionMetrics(slow_statement_seconds=0.5)
+
+        with LogCapture('transaction-metrics') as log_capture:
+            metrics.record_execute('write_event.WITH', 0.1, 1)
+            metrics.record_execute('write_event.WITH', 0.75, 1)
+            metrics.record_commit('write_event', 2)
+
+            log_capture.check(
+                ('transaction-metrics', 'WARNING', 'Slow statement write_event.WITH took 0.750s'),
+                ('transaction-metrics', 'WARNING', 'Slow commit write_event took 2.000s'),
+            )
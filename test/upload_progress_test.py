@@ -0,0 +1,83 @@
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from src.upload_progress import UploadProgress
+from src.upload_session import UploadSession
+
+
+@patch('src.upload_progress.monotonic')
+class UploadProgressTest(TestCase):
+
+    def test_counts_rows_and_times(self, monotonic):
+        monotonic.return_value = 100
+        progress = UploadProgress(UploadSession(id=7), MagicMock())
+
+        monotonic.return_value = 101.5
+        progress.parsed(3, since=100)
+        progress.wrote(3, 5, since=101)
+        progress.wrote(0, 2, since=101.25)
+        progress.committed()
+
+        self.assertEqual(progress.summary, {
+            'rows_parsed': 3,
+            'rows_written': 3,
+            'contraindicators_upserted': 7,
+            'parse_seconds': 1.5,
+            'write_seconds': 0.75,
+        })
+
+    def test_only_counts_rows_written_once_committed(self, monotonic):
+        monotonic.return_value = 100
+        progress = UploadProgress(UploadSession(id=7), MagicMock())
+
+        progress.wrote(2, 3, since=100)
+        self.assertEqual(progress.rows_written, 0)
+        progress.committed()
+        progress.wrote(4, 1, since=100)
+        progress.rolled_back()
+        progress.committed()
+
+        self.assertEqual(progress.rows_written, 2)
+        self.assertEqual(progress.contraindicators_upserted, 3)
+
+    def test_only_counts_rows_parsed_in_a_transaction_once_committed(self, monotonic):
+        monotonic.return_value = 100
+        progress = UploadProgress(UploadSession(id=7), MagicMock())
+
+        progress.parsed_in_transaction(2, since=100)
+        progress.rolled_back()
+        progress.parsed_in_transaction(2, since=100)
+        self.assertEqual(progress.rows_parsed, 0)
+        progress.committed()
+
+        self.assertEqual(progress.rows_parsed, 2)
+
+    def test_counts_rows_parsed_before_a_transaction_failed(self, monotonic):
+        monotonic.return_value = 100
+        progress = UploadProgress(UploadSession(id=7), MagicMock())
+
+        progress.parsed_in_transaction(2, since=100)
+        progress.wrote(2, 1, since=100)
+        progress.failed()
+
+        self.assertEqual((progress.rows_parsed, progress.rows_written), (2, 0))
+
+    def test_logs_progress_at_intervals_and_a_summary(self, monotonic):
+        logger = MagicMock()
+        monotonic.return_value = 100
+        progress = UploadProgress(UploadSession(id=7), logger, log_interval_seconds=30)
+        progress.parsed(1, since=100)
+
+        monotonic.return_value = 129
+        progress.log_if_due()
+        logger.info.assert_not_called()
+
+        monotonic.return_value = 130
+        progress.log_if_due()
+        progress.log_if_due()
+        progress.log_summary()
+
+        self.assertEqual([call[0][0] for call in logger.info.call_args_list], [
+            'Progress of upload session 7: parsed 1 rows in 0.00s, wrote 0 rows and 0 contraindicators in 0.00s',
+            'Processed upload session 7: parsed 1 rows in 0.00s, wrote 0 rows and 0 contraindicators in 0.00s',
+        ])
@@ -0,0 +1,65 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from psycopg2 import OperationalError
+
+from src.upload_session import UploadSession
+from src.validation_error_collector import ValidationErrorCollector, SUMMARY_FIELD
+
+
+class ValidationErrorCollectorTest(TestCase):
+
+    def setUp(self):
+        self.upload_session = UploadSession(id=7)
+
+    def test_buffers_errors_for_the_upload_session(self):
+        collector = ValidationErrorCollector(self.upload_session)
+
+        collector.add(2, 'Event Time', 'not a date')
+        collector.add(5, '**Row Exception**', 'list index out of range')
+
+        self.assertEqual(len(collector), 2)
+        self.assertEqual(collector.rows, [
+            (7, 2, 'Event Time', 'not a date'),
+            (7, 5, '**Row Exception**', 'list index out of range'),
+        ])
+
+    def test_stores_a_summary_row_instead_of_errors_beyond_the_cap(self):
+        collector = ValidationErrorCollector(self.upload_session, max_errors=2)
+
+        for row in range(2, 7):
+            collector.add(row, 'Event Time', 'not a date')
+
+        self.assertEqual(len(collector), 5)
+        self.assertEqual(collector.rows, [
+            (7, 2, 'Event Time', 'not a date'),
+            (7, 3, 'Event Time', 'not a date'),
+            (7, 4, SUMMARY_FIELD, '3 further validation errors from line 4 onwards were not stored'),
+        ])
+
+    @patch('src.validation_error_collector.write_upload_errors')
+    def test_writes_all_rows_in_one_call_and_empties_the_buffer(self, write_upload_errors):
+        collector = ValidationErrorCollector(self.upload_session, max_errors=1)
+        collector.add(2, 'Event Time', 'not a date')
+        collector.add(3, 'Event Time', 'not a date')
+
+        collector.write('db connection')
+
+        write_upload_errors.assert_called_once_with([
+            (7, 2, 'Event Time', 'not a date'),
+            (7, 3, SUMMARY_FIELD, '1 further validation errors from line 3 onwards were not stored'),
+        ], 'db connection')
+        self.assertEqual(len(collector), 0)
+
+    @patch('src.validation_error_collector.write_upload_errors')
+    def test_keeps_the_rows_if_they_fail_to_write(self, write_upload_errors):
+        collector = ValidationErrorCollector(self.upload_session)
+        collector.add(2, 'Event Time', 'not a date')
+        write_upload_errors.side_effect = [OperationalError('server closed the connection unexpectedly'), None]
+
+        with self.assertRaises(OperationalError):
+            collector.write('db connection')
+        collector.write('new db connection')
+
+        write_upload_errors.assert_called_with([(7, 2, 'Event Time', 'not a date')], 'new db connection')
+        self.assertEqual(len(collector), 0)
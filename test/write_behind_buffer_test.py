@@ -0,0 +1,95 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from src.event import Event
+from src.event_write_outcome import EventWriteOutcome
+from src.transaction_metrics import TransactionMetrics
+from src.write_behind_buffer import WriteBehindBuffer, RELAXED_AUDIT
+
+
+def audit_event(event_id):
+    return Event(event_id, 1518264452000, 'session_event', 'test service', 'session-id',
+                 {'session_event_type': 'other'})
+
+
+def billing_event(event_id):
+    return Event(event_id, 1518264452000, 'session_event', 'test service', 'session-id',
+                 {'session_event_type': 'idp_authn_succeeded'})
+
+
+class WriteBehindBufferTest(TestCase):
+
+    def setUp(self):
+        self.writes = []
+        self.written = []
+
+    def write_events(self, events, synchronous_commit):
+        self.writes.append(([event.event_id for event in events], synchronous_commit))
+        return [EventWriteOutcome(event) for event in events]
+
+    def on_written(self, outcome):
+        self.written.append(outcome.event.event_id)
+
+    def test_flushes_once_max_size_is_reached(self):
+        buffer = WriteBehindBuffer(self.write_events, max_size=2, max_age_seconds=60)
+
+        buffer.add(audit_event('1'), self.on_written)
+        self.assertEqual(self.written, [])
+        buffer.add(audit_event('2'), self.on_written)
+
+        self.assertEqual(self.writes, [(['1', '2'], True)])
+        self.assertEqual(self.written, ['1', '2'])
+        self.assertEqual(len(buffer), 0)
+
+    @patch('src.write_behind_buffer.time.monotonic')
+    def test_flushes_once_oldest_event_reaches_max_age(self, monotonic):
+        buffer = WriteBehindBuffer(self.write_events, max_size=100, max_age_seconds=5)
+        monotonic.return_value = 100
+        buffer.add(audit_event('1'), self.on_written)
+
+        monotonic.return_value = 104
+        buffer.flush_if_due()
+        self.assertEqual(self.written, [])
+
+        monotonic.return_value = 105
+        buffer.flush_if_due()
+        self.assertEqual(self.written, ['1'])
+
+    def test_reports_failed_outcomes_when_write_raises(self):
+        outcomes = []
+
+        def fail(events, synchronous_commit):
+            raise RuntimeError('database unavailable')
+        buffer = WriteBehindBuffer(fail, max_size=1)
+
+        buffer.add(audit_event('1'), outcomes.append)
+
+        self.assertFalse(outcomes[0].succeeded)
+        self.assertEqual(str(outcomes[0].error), 'database unavailable')
+
+    def test_relaxed_audit_durability_commits_audit_only_events_asynchronously(self):
+        buffer = WriteBehindBuffer(self.write_events, max_size=3, durability=RELAXED_AUDIT)
+
+        buffer.add(audit_event('1'), self.on_written)
+        buffer.add(billing_event('2'), self.on_written)
+        buffer.add(audit_event('3'), self.on_written)
+
+        self.assertEqual(self.writes, [(['1', '3'], False), (['2'], True)])
+        self.assertEqual(sorted(self.written), ['1', '2', '3'])
+
+    def test_records_flush_sizes_and_times(self):
+        metrics = TransactionMetrics()
+        buffer = WriteBehindBuffer(self.write_events, max_size=2, label='queue', metrics=metrics)
+
+        for event_id in ['1', '2', '3']:
+            buffer.add(audit_event(event_id), self.on_written)
+        buffer.flush()
+
+        self.assertEqual(metrics.flush_latencies['queue'].count, 2)
+        self.assertEqual(metrics.flushed_event_counts, {'queue': 3})
+        self.assertEqual(metrics.largest_flush_sizes, {'queue': 2})
+        self.assertEqual(len(metrics.summary_lines()), 1)
+
+    def test_rejects_unknown_durability_mode(self):
+        with self.assertRaises(ValueError):
+            WriteBehindBuffer(self.write_events, durability='sometimes')